@@ -7,46 +7,135 @@ Tiandra M Taylor
 
 # imports
 import streamlit as st
-from quiz_generator import generate_quiz
-from quiz_grader import validate_inputs, calculate_score, get_detailed_results
+from app_resources import (get_config, load_quiz_generator, get_shared_client, get_quiz_cache, get_coalescer,
+                           get_results_store, get_question_bank, get_quiz_snapshot, match_topic,
+                           get_prefetcher, get_hedger, get_rerun_totals)
+from metrics import METRICS
+from quiz_model import Quiz, QuizResult
 
-import os
-from dotenv import load_dotenv
+import time
+import uuid
 # page config
 st.set_page_config(
     page_title="AI Quiz Generator",
-    page_icon=":memo:",
+    page_icon="📝", # the emoji itself - a ":memo:" shortcode goes through streamlit's image loading (numpy + PIL) every run
     layout="centered"
 )
 
-# load api key from .env file
-load_dotenv()
-API_KEY = os.getenv("ANTHROPIC_API_KEY")
+# .env and settings are loaded once per process (app_resources.get_config), not on every rerun
+CONFIG = get_config()
+API_KEY = CONFIG.api_key
+NUM_QUESTIONS = CONFIG.num_questions # quiz length - over 5 is generated in parallel chunks
 
-if API_KEY == None or API_KEY.strip() == "":
+if API_KEY == None:
     st.error("API key not found. Please set ANTHROPIC_API_KEY in your .env file.")
     st.stop()
 
     
 # functions
+def prefetch_quiz(topic):
+    """ fresh quiz for the prefetcher - skips the cache so it's a new variant, not the one just taken """
+    return load_quiz_generator().generate_quiz(topic, API_KEY, client=get_shared_client(API_KEY), include_explanations=True, num_questions=NUM_QUESTIONS)
+
 def initialize_session_state():
     """ Transfer session state variables between reruns if applicable """
     
+    # quiz / results are compact quiz_model objects - the score and result rows are derived from them, not stored
     if "quiz" not in st.session_state:
-        st.session_state.quiz = None
-    if "user_answers" not in st.session_state:
-        st.session_state.user_answers = {}
+        st.session_state.quiz = None # Quiz
     if "results" not in st.session_state:
-        st.session_state.results = None
-    if "score" not in st.session_state:
-        st.session_state.score = None
+        st.session_state.results = None # QuizResult (references the quiz)
+    if "explanations" not in st.session_state:
+        st.session_state.explanations = {} # question hash -> explanation text
+    if "seen_bank_ids" not in st.session_state:
+        st.session_state.seen_bank_ids = set() # bank questions this session already got - kept across quizzes
+    if "seen_snapshot_ids" not in st.session_state:
+        st.session_state.seen_snapshot_ids = set() # same for pre-built snapshot quizzes
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex # prefetch slot owner
+    if "rerun_metrics" not in st.session_state:
+        st.session_state.rerun_metrics = {"reruns": 0, "cpu_seconds": 0.0, "reported": False}
 
 def reset_app():
     """ reset all session state variables for new quiz"""
     st.session_state.quiz = None
-    st.session_state.user_answers = {}
     st.session_state.results = None
-    st.session_state.score = None
+    st.session_state.explanations = {}
+    st.session_state.rerun_metrics = {"reruns": 0, "cpu_seconds": 0.0, "reported": False}
+
+def track_rerun(cpu_seconds, showed_results):
+    """
+    count one script run for this session's current quiz - reported on the first run that draws the results page
+    - cpu_seconds is the script thread's CPU time (time.thread_time) for this run
+    """
+    metrics = st.session_state.get("rerun_metrics")
+    if metrics == None:
+        return # stopped before session state was set up (e.g. missing API key)
+    metrics["reruns"] += 1
+    metrics["cpu_seconds"] += cpu_seconds
+    if showed_results and metrics["reported"] == False:
+        metrics["reported"] = True
+        totals = get_rerun_totals()
+        totals["quizzes"] += 1
+        totals["reruns"] += metrics["reruns"]
+        totals["cpu_seconds"] += metrics["cpu_seconds"]
+        if CONFIG.rerun_metrics:
+            print(f" Quiz completed in {metrics['reruns']} reruns, {metrics['cpu_seconds'] * 1000:.1f} ms CPU "
+                  f"(process average: {totals['reruns'] / totals['quizzes']:.1f} reruns, {totals['cpu_seconds'] * 1000 / totals['quizzes']:.1f} ms)")
+
+def session_quiz():
+    """ the session's quiz as a Quiz - a plain quiz dict put in session state (tests, benchmarks) is converted once """
+    quiz = st.session_state.quiz
+    if isinstance(quiz, dict):
+        quiz = st.session_state.quiz = Quiz.from_dict(quiz)
+    return quiz
+
+def build_quiz_view(quiz):
+    """ question labels + radio options for the form - cheap string formatting, so built per draw instead of stored per session """
+    quiz_view = []
+    for idx, question in enumerate(quiz.questions, 1):
+        quiz_view.append({
+            "label": f"**Question {idx}:** {question.text}",
+            "options": [f"{letter}. {text}" for letter, text in zip(["A", "B", "C", "D"], question.options)]
+        })
+    return quiz_view
+
+def build_results_view(result):
+    """
+    everything the results page shows, from the QuizResult - nothing but the answers is stored with the session
+    """
+    results_view = []
+    for idx, question, user_letter, is_correct in result.rows():
+        # get full text for user answer choice and correct answer choice
+        correct_letter = question.correct_letter
+        correct_answer_text = question.options[question.answer]
+        row = {
+            "is_correct": is_correct,
+            "title": f"**Question {idx}:** {question.text}",
+            "user_line": f"Your answer: **{user_letter}: {question.option_text(user_letter)}**",
+            "correct_line": f"Correct answer: **{correct_letter}: {correct_answer_text}**",
+            "explanation": question.explanation,
+            "explanation_request": None
+        }
+        # older / fallback quizzes: explanation fetched later, memoized by question hash
+        if is_correct == False and row["explanation"] == None:
+            key = load_quiz_generator().explanation_key(question.text, correct_letter, correct_answer_text)
+            row["explanation_request"] = (key, question.text, correct_letter, correct_answer_text)
+        results_view.append(row)
+    return results_view
+
+def show_explanation(placeholder, explanation):
+    """ fill an explanation placeholder - fallback text if generation failed """
+    if explanation != None:
+        placeholder.info(f"**Explanation:** {explanation}")
+    else:
+        placeholder.info(f"**Explanation:** Because that's just how it is. This is one of those 'You can tell it's an aspen because of the way it is.' - Neature Walk quotes.")
+
+def show_question_preview(idx, question_dict):
+    """ read-only view of a question while the rest of the quiz is still streaming in """
+    st.write(f"**Question {idx}:** {question_dict['question']}")
+    for letter in ["A", "B", "C", "D"]:
+        st.write(f"{letter}. {question_dict['options'][letter]}")
 
 def main():
     """ main app logic
@@ -57,13 +146,14 @@ def main():
 
     # reset session state variables 
     initialize_session_state()
+    get_prefetcher().touch(st.session_state.session_id) # keeps this session's prefetch alive
 
     # Front end UI things
     st.title(" AI Quiz Generator :memo: ")
 
     # state 1
     if st.session_state.quiz == None:
-        st.write(" Enter a topic to generate a 5-question multiple choice quiz")
+        st.write(f" Enter a topic to generate a {NUM_QUESTIONS}-question multiple choice quiz")
         topic = st.text_input(
             "Quiz Topic",
             placeholder = "e.g., Photosynthesis, Ancient Rome, Python Programming",
@@ -74,93 +164,117 @@ def main():
             if topic == None or topic.strip() == "":
                 st.error(" Please enter a topic.")
             else:
-                # loading spinner while generating quiz
-                with st.spinner(f"Generating quiz about '{topic}'..."):
-                    quiz = generate_quiz(topic, API_KEY)
+                topic = match_topic(topic) # a typo of a known topic becomes that topic (QUIZ_TOPIC_THRESHOLD)
+                # quiz prefetched while the last one was being answered? (waits if it's still finishing)
+                with st.spinner(f"Loading quiz about '{topic}'..."):
+                    quiz = get_prefetcher().take(st.session_state.session_id, topic)
+                if quiz != None:
+                    quiz["bank_ids"] = get_question_bank().add_quiz(quiz)
+                else:
+                    # enough questions this session hasn't seen in the bank? then no API call at all
+                    quiz = get_question_bank().assemble_quiz(topic, NUM_QUESTIONS, exclude_ids=st.session_state.seen_bank_ids)
+
+                if quiz == None and get_quiz_snapshot() is not None:
+                    # a pre-built quiz from the snapshot - banked like a generated one so the seen ids cover it
+                    quiz = get_quiz_snapshot().pick(topic, NUM_QUESTIONS, exclude_ids=st.session_state.seen_snapshot_ids)
+                    if quiz != None:
+                        st.session_state.seen_snapshot_ids.add(quiz["snapshot_id"])
+                        quiz["bank_ids"] = get_question_bank().add_quiz(quiz)
 
                 if quiz == None:
+                    # stream the quiz in - each question is shown as soon as it arrives
+                    quiz_generator = load_quiz_generator() # first API call of the process imports the SDK here
+                    questions = []
+                    try:
+                        with st.spinner(f"Generating quiz about '{topic}'..."):
+                            for question_dict in quiz_generator.generate_quiz_stream(topic, API_KEY, cache=get_quiz_cache(), client=get_shared_client(API_KEY), include_explanations=True, coalescer=get_coalescer(), num_questions=NUM_QUESTIONS):
+                                questions.append(question_dict)
+                                show_question_preview(len(questions), question_dict)
+                        quiz = {"topic": topic, "questions": questions}
+                    except Exception as e:
+                        # streaming has no retries - fall back to the normal generator which does
+                        print(f" Streaming failed ({e}), falling back to generate_quiz.")
+                        with st.spinner(f"Retrying quiz about '{topic}'..."):
+                            quiz = quiz_generator.generate_quiz(topic, API_KEY, cache=get_quiz_cache(), client=get_shared_client(API_KEY), include_explanations=True, coalescer=get_coalescer(), hedger=get_hedger(), num_questions=NUM_QUESTIONS)
+
+                    # bank the new questions (near-duplicates of ones already there are skipped)
+                    if quiz != None:
+                        quiz["bank_ids"] = get_question_bank().add_quiz(quiz)
+
+                if quiz != None:
+                    st.session_state.seen_bank_ids.update(quiz["bank_ids"])
+
+                session_quiz_model = None
+                if quiz != None:
+                    # store quiz in session state - compact model, the dict isn't kept
+                    try:
+                        session_quiz_model = Quiz.from_dict(quiz)
+                    except (KeyError, TypeError, ValueError, AttributeError) as e:
+                        print(f" Could not load quiz about '{topic}': {e}")
+
+                if session_quiz_model == None:
                     st.error("Failed to generate quiz. Please try again.")
                 else:
-                    # store quiz in session state
-                    st.session_state.quiz = quiz
+                    st.session_state.quiz = session_quiz_model
                     st.success(f" Quiz generated! {len(quiz['questions'])} questions ready")
                     st.rerun() # rerun to show quiz
 
     # state 2
     elif st.session_state.results == None:
-        quiz = st.session_state.quiz
-        st.write(f"Quiz: {quiz['topic']}")
-        st.write(f"Answer all {len(quiz['questions'])} questions, then click Submit.")
-
-        # display questions with radio buttons
-        for idx, question_dict in enumerate(quiz["questions"], 1):
-            st.write(f"**Question {idx}:** {question_dict['question']}")
-
-            # create radio button options
-            options = question_dict["options"]
-            option_list = [
-                f"A. {options['A']}",
-                f"B. {options['B']}",
-                f"C. {options['C']}",
-                f"D. {options['D']}"
-            ]
-
-            # key must be unique for each question - streamlit gets confused
-            selected = st.radio(
-                f"Select an answer for question {idx}:", # can't be empty
-                option_list,
-                key=f"question_{idx}",
-                label_visibility="collapsed" # hide label - don't need to repeat this
-            )
-
-            # store user answer - only the letter
-            if selected != None:
-                answer_letter = selected[0] # only the letter - leave period out
-                st.session_state.user_answers[idx] = answer_letter
-
-        # submit button
-        if st.button(" Submit Answers ", type="primary"):
+        quiz = session_quiz()
+        st.write(f"Quiz: {quiz.topic}")
+        st.write(f"Answer all {len(quiz)} questions, then click Submit.")
+
+        # most users retake the same topic - if the bank can't cover it, generate the next quiz now
+        if get_question_bank().can_assemble(quiz.topic, NUM_QUESTIONS, exclude_ids=st.session_state.seen_bank_ids) == False:
+            get_prefetcher().schedule(st.session_state.session_id, quiz.topic, prefetch_quiz, quiz.topic)
+
+        # the whole quiz is one form - answer clicks stay in the browser, the script only reruns on submit
+        with st.form("quiz_form"):
+            selections = []
+            for idx, question_view in enumerate(build_quiz_view(quiz), 1):
+                st.write(question_view["label"])
+
+                # key must be unique for each question - streamlit gets confused
+                selections.append(st.radio(
+                    f"Select an answer for question {idx}:", # can't be empty
+                    question_view["options"],
+                    index=None, # nothing picked until the user picks - so unanswered questions are caught
+                    key=f"question_{idx}",
+                    label_visibility="collapsed" # hide label - don't need to repeat this
+                ))
+            submitted = st.form_submit_button(" Submit Answers ", type="primary")
+
+        if submitted:
+            # user answers in question order - only the letter (leave period out)
+            user_answers_list = [selected[0] for selected in selections if selected != None]
+
             # all questions answered?
-            if len(st.session_state.user_answers) != len(quiz["questions"]):
+            if len(user_answers_list) != len(quiz):
                 st.error("Please answer all questions before submitting!")
             else:
-                # add user_answers dict to list in correct order
-                user_answers_list = []
-                for i in range(1, len(quiz["questions"]) + 1):
-                    user_answers_list.append(st.session_state.user_answers[i])
-            
                 # grade quiz 
                 with st.spinner("Grading your quiz..."):
-                    # validate inputs
-                    is_valid, error_msg, questions_list = validate_inputs(quiz, user_answers_list)
-                    
-                    if is_valid == False:
-                        st.error(f"Error: {error_msg}")
-                    else:
-                        # get correct answers
-                        correct_answers_list = []
-                        for q in questions_list:
-                            correct_answers_list.append(q["correct_answer"])
-                        
-                        # calculate score & detailed results
-                        score = calculate_score(user_answers_list, correct_answers_list)       
-                        details = get_detailed_results(questions_list, user_answers_list)
-
-                        # store results in session state
-                        st.session_state.score = score
-                        st.session_state.results = details
-
-                        # show results
-                        st.rerun()
+                    with METRICS.span("quiz_grade", source="app"):
+                        result = QuizResult.grade(quiz, user_answers_list)
+
+                    # store results in session state - just the answers, score and rows are derived when drawn
+                    st.session_state.results = result
+
+                    # save for item statistics - queued, written in the background
+                    get_results_store().record({"topic": quiz.topic}, result.details(), result.score())
+
+                    # show results
+                    st.rerun()
 
     # state 3
     else:   
-        score = st.session_state.score
-        results = st.session_state.results
-        quiz = st.session_state.quiz
+        result = st.session_state.results
+        quiz = result.quiz
+        score = result.score()
 
         # show overall score
-        st.subheader(f"Quiz Results: {quiz['topic']}")
+        st.subheader(f"Quiz Results: {quiz.topic}")
         # score, correct & incorrect side by side 
         st.write(f" Your Score: **{score['score_display']}** ({score['score_percentage']:.2f}%) ")
         col1, col2, col3 = st.columns(3)
@@ -174,43 +288,56 @@ def main():
         st.progress(score["score_percentage"] / 100)
         st.write(f"**{score['score_percentage']:.2f}%**")
 
-        # display each question's result 
-        for result in results:
-            # get full text for user answer choice and correct answer choice
-            user_answer_text = result["options"][result["user_answer"]]
-            correct_answer_text = result["options"][result["correct_answer"]]
-            
+        # display each question's result
+        pending_explanations = [] # explanations not generated yet - fetched all at once below
+        placeholders = {}
+        for row in build_results_view(result):
             # correct or incorrect?
-            if result["is_correct"] == True:
-                st.success(f"**Question {result['question_number']}:** {result['question_text']}") 
-                st.write(f"Your answer: **{result['user_answer']}: {user_answer_text}**")
+            if row["is_correct"] == True:
+                st.success(row["title"])
+                st.write(row["user_line"])
+                continue
 
+            st.error(row["title"])
+            st.write(row["user_line"])
+            st.write(row["correct_line"])
+
+            # BONUS ADDITION
+            # explanation generated with the quiz - no API call needed
+            placeholder = st.empty()
+            if row["explanation"] != None:
+                show_explanation(placeholder, row["explanation"])
+                continue
+
+            # older / fallback quizzes: explanations are memoized by question hash so reruns don't call the API again
+            key = row["explanation_request"][0]
+            if key in st.session_state.explanations:
+                show_explanation(placeholder, st.session_state.explanations[key])
             else:
-                st.error(f"**Question {result['question_number']}:** {result['question_text']}")
-                st.write(f"Your answer: **{result['user_answer']}: {user_answer_text}**")
-                st.write(f"Correct answer: **{result['correct_answer']}: {correct_answer_text}**")
-
-                # BONUS ADDITION
-                with st.spinner("Generating explanation..."):
-                    from quiz_generator import generate_explanation
-                    explanation = generate_explanation(
-                        result["question_text"],
-                        result["correct_answer"],
-                        correct_answer_text,
-                        API_KEY
-                    )
+                placeholder.info("Generating explanation...")
+                placeholders[key] = placeholder
+                pending_explanations.append(row["explanation_request"])
 
-                if explanation != None:
-                    st.info(f"**Explanation:** {explanation}")
-                else:
-                    st.info(f"**Explanation:** Because that's just how it is. This is one of those 'You can tell it's an aspen because of the way it is.' - Neature Walk quotes.")
         # take another quiz button
         if st.button(" Take Another Quiz ", type="primary"):
             reset_app()
             st.rerun()
 
+        # fetch missing explanations concurrently - each one shows up as soon as it arrives
+        if len(pending_explanations) > 0:
+            for key, explanation in load_quiz_generator().generate_explanations(pending_explanations, API_KEY, client=get_shared_client(API_KEY)):
+                if explanation != None:
+                    st.session_state.explanations[key] = explanation
+                show_explanation(placeholders[key], explanation)
+
 
 # run main app 
 if __name__ == "__main__":
-    main()
+    run_started = time.thread_time()
+    showed_results = st.session_state.get("results") != None # state 3 this run
+    try:
+        main()
+    finally:
+        # st.rerun() / st.stop() end the script with an exception - still count the run
+        track_rerun(time.thread_time() - run_started, showed_results)
                     
\ No newline at end of file
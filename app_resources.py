@@ -0,0 +1,153 @@
+"""
+App Resources Module
+- Handles everything the Streamlit app (app.py) sets up once per server process: configuration from
+  .env / environment variables, and the shared long-lived objects (client, caches, bank, prefetcher, ...).
+- Streamlit executes app.py again on every rerun, including its @st.cache_resource decorators - each one
+  reads the function's source to build its key. Defined here instead, they are built once when this module
+  is first imported, and a rerun only pays for the cache lookups.
+- Heavy imports are deferred until they are needed: quiz_generator / client_provider (and the anthropic SDK
+  behind them) on the first API call, question_bank (numpy) the first time the bank is used.
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import streamlit as st
+
+
+class AppConfig:
+    """
+    Settings read from .env / the environment - once per process (get_config), not on every rerun
+    """
+
+    __slots__ = ("api_key", "num_questions", "cache_max_entries", "cache_ttl_seconds", "cache_db", "cache_variants",
+                 "results_db", "bank_db", "snapshot_path", "topic_threshold", "prefetch_max_outstanding",
+                 "prefetch_ttl_seconds", "hedge", "hedge_percentile", "hedge_max_in_flight", "hedge_model",
+                 "rerun_metrics")
+
+    def __init__(self):
+        self.api_key = (os.getenv("ANTHROPIC_API_KEY") or "").strip() or None
+        self.num_questions = int(os.getenv("QUIZ_NUM_QUESTIONS", "5")) # quiz length - over 5 is generated in parallel chunks
+        self.cache_max_entries = int(os.getenv("QUIZ_CACHE_MAX_ENTRIES", "256"))
+        self.cache_ttl_seconds = int(os.getenv("QUIZ_CACHE_TTL_SECONDS", "3600"))
+        self.cache_db = os.getenv("QUIZ_CACHE_DB", "quiz_cache.db")
+        self.cache_variants = int(os.getenv("QUIZ_CACHE_VARIANTS", "3"))
+        self.results_db = os.getenv("QUIZ_RESULTS_DB", "results.db")
+        self.bank_db = os.getenv("QUIZ_BANK_DB", "question_bank.db")
+        self.snapshot_path = os.getenv("QUIZ_SNAPSHOT")
+        self.topic_threshold = float(os.getenv("QUIZ_TOPIC_THRESHOLD", "0") or "0") or None # None = no typo matching
+        self.prefetch_max_outstanding = int(os.getenv("QUIZ_PREFETCH_MAX_OUTSTANDING", "4"))
+        self.prefetch_ttl_seconds = int(os.getenv("QUIZ_PREFETCH_TTL_SECONDS", "900"))
+        self.hedge = os.getenv("QUIZ_HEDGE", "0") == "1"
+        self.hedge_percentile = float(os.getenv("QUIZ_HEDGE_PERCENTILE", "0.95"))
+        self.hedge_max_in_flight = int(os.getenv("QUIZ_HEDGE_MAX_IN_FLIGHT", "2"))
+        self.hedge_model = os.getenv("QUIZ_HEDGE_MODEL") or None
+        self.rerun_metrics = os.getenv("QUIZ_RERUN_METRICS", "0") == "1"
+
+
+# functions
+@st.cache_resource
+def get_config():
+    """
+    load .env and read the settings - first rerun of the process only
+    - also attaches the metric sinks from QUIZ_METRICS (QUIZ_METRICS_PORT serves the Prometheus text)
+    """
+    from dotenv import load_dotenv
+    from metrics import configure_from_env
+
+    load_dotenv()
+    configure_from_env()
+    return AppConfig()
+
+def load_quiz_generator():
+    """
+    quiz_generator - imported on the first API call instead of at startup, it brings in the anthropic SDK (~1 s)
+    after the first call this is just a sys.modules lookup
+    """
+    import quiz_generator
+    return quiz_generator
+
+@st.cache_resource
+def get_shared_client(api_key):
+    """ one pooled Anthropic client per API key for the whole server process (not per call or per session) """
+    from client_provider import get_client
+    return get_client(api_key)
+
+@st.cache_resource
+def get_quiz_cache():
+    """ one quiz cache shared by every session in this server process """
+    from quiz_cache import QuizCache
+    config = get_config()
+    return QuizCache(max_entries=config.cache_max_entries, ttl_seconds=config.cache_ttl_seconds,
+                     db_path=config.cache_db, variants=config.cache_variants)
+
+@st.cache_resource
+def get_coalescer():
+    """ shared across sessions - a class asking for the same topic at once only triggers one generation """
+    from singleflight import SingleFlight
+    return SingleFlight()
+
+@st.cache_resource
+def get_results_store():
+    """ one results store (and writer thread) per server process """
+    from results_store import ResultsStore
+    return ResultsStore(get_config().results_db)
+
+@st.cache_resource
+def get_question_bank():
+    """ every generated question is kept here - repeat topics are served from the bank, no API call """
+    from question_bank import QuestionBank
+    return QuestionBank(get_config().bank_db)
+
+@st.cache_resource
+def get_quiz_snapshot():
+    """ pre-built quizzes (QUIZ_SNAPSHOT=quizzes.qsnap) - memory-mapped once per process, None if not set """
+    from quiz_snapshot import open_snapshot
+    return open_snapshot(get_config().snapshot_path)
+
+@st.cache_resource
+def get_topic_normalizer():
+    """
+    optional typo matching for entered topics (QUIZ_TOPIC_THRESHOLD, e.g. 0.7) - seeded with the topics already
+    in the snapshot and bank, None when turned off (the default)
+    """
+    threshold = get_config().topic_threshold
+    if threshold is None:
+        return None
+    from topic_normalizer import TopicNormalizer
+
+    normalizer = TopicNormalizer(threshold=threshold)
+    if get_quiz_snapshot() is not None:
+        normalizer.seed(get_quiz_snapshot().topics())
+    normalizer.seed(get_question_bank().topics())
+    return normalizer
+
+def match_topic(topic):
+    """ the topic as entered, or the known topic it is a typo of (only with QUIZ_TOPIC_THRESHOLD set) """
+    normalizer = get_topic_normalizer()
+    if normalizer is None:
+        return topic
+    return normalizer.match_topic(topic)
+
+@st.cache_resource
+def get_prefetcher():
+    """ background generation of the next quiz - shared cap on speculative calls across sessions """
+    from prefetch import Prefetcher
+    config = get_config()
+    return Prefetcher(max_outstanding=config.prefetch_max_outstanding, ttl_seconds=config.prefetch_ttl_seconds)
+
+@st.cache_resource
+def get_hedger():
+    """ optional hedged requests (QUIZ_HEDGE=1) - one shared deadline / budget per server process """
+    config = get_config()
+    if config.hedge == False:
+        return None
+    from hedging import Hedger
+    return Hedger(percentile=config.hedge_percentile, max_in_flight=config.hedge_max_in_flight,
+                  hedge_model=config.hedge_model)
+
+@st.cache_resource
+def get_rerun_totals():
+    """ process wide reruns / CPU per completed quiz (QUIZ_RERUN_METRICS=1 prints them) """
+    return {"quizzes": 0, "reruns": 0, "cpu_seconds": 0.0}
@@ -0,0 +1,155 @@
+"""
+App Startup Benchmark
+- Measures what a Streamlit worker pays before it can draw the first page (cold start) and what every
+  later script run costs (per rerun), by driving app.py headlessly with streamlit's AppTest.
+- Cold start runs in a fresh interpreter with -X importtime, so the report lists the modules the first
+  run imported and how long each took (e.g. whether the anthropic SDK is loaded before any API call).
+- Per rerun: the topic page, the quiz page and the results page, each drawn again and again.
+- No API calls: the quiz is put straight into session state and prefetching is turned off.
+- Pass several --app files to compare versions, e.g. the current app.py against `git show <old>:app.py > old_app.py`
+  (copies must sit in the repo root so their imports resolve).
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import logging
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ANSWERS = ["B", "A", "C", "D", "B"]
+WATCHED_MODULES = ("anthropic", "httpx", "numpy", "quiz_generator", "client_provider", "question_bank", "dotenv")
+
+
+# functions
+def measure_in_child(app_path, reruns):
+    """
+    runs inside the fresh interpreter - first run (cold start), then reruns of each page
+    Needs to return:
+        dict of timings (ms) + the top level modules the first run imported
+    """
+    from streamlit.testing.v1 import AppTest
+
+    before = set(sys.modules)
+    started = time.perf_counter()
+    app_test = AppTest.from_file(app_path, default_timeout=60)
+    app_test.run()
+    first_run = time.perf_counter() - started
+    imported = sorted(name for name in set(sys.modules) - before if "." not in name)
+    anthropic_loaded = "anthropic" in sys.modules
+    from schema_size import SAMPLE_QUIZ # imports quiz_generator - only after the cold start was measured
+
+    def timed_runs():
+        # wall time includes AppTest's own harness (the same for every app version) and the script's module
+        # level code - the CPU figure is main() only, from the app's rerun_metrics
+        cpu_before = app_test.session_state["rerun_metrics"]["cpu_seconds"]
+        started = time.perf_counter()
+        for _ in range(reruns):
+            app_test.run()
+        wall = (time.perf_counter() - started) / reruns * 1000
+        return wall, (app_test.session_state["rerun_metrics"]["cpu_seconds"] - cpu_before) / reruns * 1000
+
+    topic_page = timed_runs()
+    app_test.session_state["quiz"] = dict(SAMPLE_QUIZ, topic="Photosynthesis", bank_ids=[])
+    quiz_page = timed_runs()
+    for idx, letter in enumerate(ANSWERS):
+        radio = app_test.radio[idx]
+        radio.set_value(next(option for option in radio.options if option.startswith(letter)))
+    next(button for button in app_test.button if "Submit" in button.label).click().run()
+    if app_test.session_state["results"] is None:
+        raise RuntimeError(f"{app_path}: quiz was not graded")
+    results_page = timed_runs()
+
+    return {"first_run_ms": first_run * 1000, "topic_page_ms": topic_page, "quiz_page_ms": quiz_page,
+            "results_page_ms": results_page, "imported": imported,
+            "anthropic_loaded": anthropic_loaded}
+
+
+def parse_importtime(stderr_text, names):
+    """ cumulative import time (ms) of each top level module in names, from -X importtime output """
+    times = {}
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split("|")
+        if len(parts) != 3 or parts[2].startswith("  "):
+            continue # header, or a nested import (counted in its parent's cumulative time)
+        name = parts[2].strip()
+        if name in names:
+            try:
+                times[name] = int(parts[1].strip()) / 1000
+            except ValueError:
+                continue
+    return times
+
+
+def cold_start(app_path, reruns):
+    """ one fresh interpreter - timings + import times of what the first run loaded """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child", app_path, "--reruns", str(reruns)],
+        capture_output=True, text=True, env=os.environ.copy()
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{app_path}: child run failed\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["import_ms"] = parse_importtime(completed.stderr, set(result["imported"]))
+    return result
+
+
+def print_report(app_path, samples):
+    """ medians over the cold starts """
+    def median(key):
+        return statistics.median(sample[key] for sample in samples)
+
+    import_ms = {}
+    for sample in samples:
+        for name, value in sample["import_ms"].items():
+            import_ms.setdefault(name, []).append(value)
+    import_ms = {name: statistics.median(values) for name, values in import_ms.items()}
+
+    print(f"\n{os.path.basename(app_path)} ({len(samples)} cold starts, medians)")
+    print(f"  first run (cold start):   {median('first_run_ms'):8.1f} ms")
+    print(f"  imports during first run: {sum(import_ms.values()):8.1f} ms")
+    for name in sorted(import_ms, key=import_ms.get, reverse=True)[:8]:
+        marker = " *" if name in WATCHED_MODULES else ""
+        print(f"    {name:<24}{import_ms[name]:8.1f} ms{marker}")
+    print(f"  anthropic loaded before any API call: {'yes' if samples[0]['anthropic_loaded'] else 'no'}")
+    print(f"  {'rerun':<26}{'wall (AppTest)':>14}{'main() CPU':>12}")
+    for page in ("topic", "quiz", "results"):
+        wall = statistics.median(sample[f"{page}_page_ms"][0] for sample in samples)
+        cpu = statistics.median(sample[f"{page}_page_ms"][1] for sample in samples)
+        print(f"    {page + ' page':<24}{wall:11.2f} ms{cpu:9.2f} ms")
+
+
+# run from the command line
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Cold start and per-rerun cost of the Streamlit app")
+    arg_parser.add_argument("--app", nargs="+", default=[os.path.join(ROOT, "app.py")], help="app file(s) to measure (default: app.py)")
+    arg_parser.add_argument("--starts", type=int, default=3, help="cold starts per app (default 3)")
+    arg_parser.add_argument("--reruns", type=int, default=50, help="reruns timed per page (default 50)")
+    arg_parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    # throwaway databases, a dummy key (nothing calls the API) and no prefetching
+    if args.child is None:
+        work_dir = tempfile.mkdtemp()
+        os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+        os.environ["QUIZ_BANK_DB"] = os.path.join(work_dir, "bank.db")
+        os.environ["QUIZ_RESULTS_DB"] = os.path.join(work_dir, "results.db")
+        os.environ["QUIZ_CACHE_DB"] = os.path.join(work_dir, "cache.db")
+        os.environ["QUIZ_PREFETCH_MAX_OUTSTANDING"] = "0"
+        for app_path in args.app:
+            print_report(app_path, [cold_start(os.path.abspath(app_path), args.reruns) for _ in range(args.starts)])
+    else:
+        logging.disable(logging.WARNING) # AppTest's "missing ScriptRunContext" noise
+        print(json.dumps(measure_in_child(args.child, args.reruns)))
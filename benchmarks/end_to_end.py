@@ -0,0 +1,325 @@
+"""
+End-to-End Benchmark
+- Runs the real generation, explanation, grading and Streamlit code paths against the local fake
+  Messages API (fake_anthropic.py) at several concurrency levels. No API key or network needed.
+- Reports throughput, p50 / p95 / p99 latency, success rate and API calls per completed quiz
+  (every HTTP request the fake server saw, SDK-level retries included).
+- Every run is appended to a results file with the git commit, and compared with the last stored run
+  that used the same fake server settings, so a regression shows up as a flagged line.
+
+Examples:
+    python benchmarks/end_to_end.py
+    python benchmarks/end_to_end.py --concurrency 1 8 32 --quizzes 64 --failure-rate 0.05 --malformed-rate 0.1
+    python benchmarks/end_to_end.py --scenarios quiz_sync grading --no-store
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import warnings
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_anthropic import FakeAnthropicServer
+
+SCENARIOS = ["quiz_sync", "quiz_async", "quiz_stream", "explanation", "grading", "streamlit"]
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+REGRESSION_THRESHOLD = 0.10 # flag anything 10% worse than the last stored run
+
+
+# functions
+def percentile(values, fraction):
+    """ nearest-rank percentile of a list of numbers (0.0 for an empty list) """
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(scenario, concurrency, latencies, failed, wall_seconds, api_calls):
+    """
+    one result row
+    Needs to return:
+        dict with throughput, latency percentiles (ms), success rate and API calls per completed item
+    """
+    completed = len(latencies)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "completed": completed,
+        "failed": failed,
+        "throughput_per_s": round(completed / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "success_rate": round(completed / (completed + failed), 3) if completed + failed else 0.0,
+        "api_calls_per_completed": round(api_calls / completed, 2) if completed else None
+    }
+
+
+def run_threaded(fn, count, concurrency):
+    """
+    call fn(idx) count times from `concurrency` threads
+    Needs to return:
+        tuple (latencies of the calls that returned something, number that returned None / raised, wall seconds)
+    """
+    def timed(idx):
+        started = time.perf_counter()
+        try:
+            result = fn(idx)
+        except Exception:
+            result = None
+        return result is not None, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, range(count)))
+    wall_seconds = time.perf_counter() - started
+    latencies = [seconds for ok, seconds in outcomes if ok]
+    return latencies, len(outcomes) - len(latencies), wall_seconds
+
+
+def bench_quiz_sync(server, concurrency, count, run_id, backoff_base, num_questions):
+    from quiz_generator import generate_quiz
+    return run_threaded(lambda idx: generate_quiz(f"Sync topic {run_id} {concurrency} {idx}", "benchmark", backoff_base=backoff_base,
+                                                  include_explanations=True, num_questions=num_questions), count, concurrency)
+
+
+def bench_quiz_stream(server, concurrency, count, run_id, backoff_base, num_questions):
+    from quiz_generator import generate_quiz_stream
+
+    def stream_one(idx):
+        questions = list(generate_quiz_stream(f"Stream topic {run_id} {concurrency} {idx}", "benchmark", include_explanations=True,
+                                              num_questions=num_questions))
+        return questions or None
+    return run_threaded(stream_one, count, concurrency)
+
+
+def bench_explanation(server, concurrency, count, run_id, backoff_base, num_questions):
+    from quiz_generator import generate_explanation
+    return run_threaded(lambda idx: generate_explanation(f"Question {run_id} {idx}?", "B", "Option B", "benchmark"), count, concurrency)
+
+
+def bench_quiz_async(server, concurrency, count, run_id, backoff_base, num_questions):
+    from quiz_generator import generate_quiz_async
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one(idx):
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    quiz = await generate_quiz_async(f"Async topic {run_id} {concurrency} {idx}", "benchmark",
+                                                     backoff_base=backoff_base, include_explanations=True, num_questions=num_questions)
+                except Exception:
+                    quiz = None
+                return quiz is not None, time.perf_counter() - started
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*[one(idx) for idx in range(count)])
+        return outcomes, time.perf_counter() - started
+
+    outcomes, wall_seconds = asyncio.run(main())
+    latencies = [seconds for ok, seconds in outcomes if ok]
+    return latencies, len(outcomes) - len(latencies), wall_seconds
+
+
+def bench_grading(count):
+    """ CPU only - single quiz grading (quiz_grader) and a whole course at once (bulk_grader) """
+    import random
+    from schema_size import SAMPLE_QUIZ
+    from quiz_grader import calculate_score, get_detailed_results
+    from bulk_grader import grade_batch
+
+    questions = SAMPLE_QUIZ["questions"]
+    correct = [q["correct_answer"] for q in questions]
+    answers = [[random.choice("ABCD") for _ in questions] for _ in range(count)]
+
+    latencies = []
+    started = time.perf_counter()
+    for row in answers:
+        one_started = time.perf_counter()
+        calculate_score(row, correct)
+        get_detailed_results(questions, row)
+        latencies.append(time.perf_counter() - one_started)
+    rows = [summarize("grading", 1, latencies, 0, time.perf_counter() - started, 0)]
+
+    batch = answers * max(1, 10000 // count) # ~10k submissions in one call
+    started = time.perf_counter()
+    results = grade_batch(SAMPLE_QUIZ, batch)
+    results.summary()
+    seconds = time.perf_counter() - started
+    rows.append(dict(summarize("grading_bulk", 1, [seconds], 0, seconds, 0), submissions=len(batch)))
+    return rows
+
+
+def bench_streamlit(server, count, run_id, timeout=60):
+    """
+    the whole user flow through app.py (sequential - AppTest runs one script at a time):
+    enter a topic, generate (streaming), answer every question, submit, see the results
+    """
+    from streamlit.testing.v1 import AppTest
+
+    latencies = []
+    failed = 0
+    started = time.perf_counter()
+    for idx in range(count):
+        one_started = time.perf_counter()
+        app_test = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+        app_test.run()
+        app_test.text_input[0].input(f"Streamlit topic {run_id} {idx}")
+        next(button for button in app_test.button if "Generate" in button.label).click().run()
+        if app_test.session_state["quiz"] is None:
+            failed += 1
+            continue
+        for radio in app_test.radio:
+            radio.set_value(radio.options[0])
+        next(button for button in app_test.button if "Submit" in button.label).click().run()
+        if app_test.session_state["results"] is None:
+            failed += 1
+            continue
+        latencies.append(time.perf_counter() - one_started)
+    return latencies, failed, time.perf_counter() - started
+
+
+def git_commit():
+    """ short commit hash (+ "-dirty" with uncommitted changes) so stored runs can be told apart """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except Exception:
+        return "unknown"
+
+
+def load_previous(store_path, server_config):
+    """ last stored run with the same fake server settings (None if there isn't one) """
+    if not os.path.exists(store_path):
+        return None
+    previous = None
+    with open(store_path, "r", encoding="utf-8") as store_file:
+        for line in store_file:
+            if line.strip() == "":
+                continue
+            run = json.loads(line)
+            if run.get("server") == server_config:
+                previous = run
+    return previous
+
+
+def compare(results, previous):
+    """
+    changes against a previous run - higher throughput is better, higher latency / calls are worse
+    Needs to return:
+        list of (scenario, concurrency, metric, old, new, change, is_regression)
+    """
+    old_rows = {(row["scenario"], row["concurrency"]): row for row in previous["results"]}
+    changes = []
+    for row in results:
+        old_row = old_rows.get((row["scenario"], row["concurrency"]))
+        if old_row is None:
+            continue
+        for metric, higher_is_better in (("throughput_per_s", True), ("p50_ms", False), ("p95_ms", False), ("api_calls_per_completed", False)):
+            old, new = old_row.get(metric), row.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            changes.append((row["scenario"], row["concurrency"], metric, old, new, change, worse > REGRESSION_THRESHOLD))
+    return changes
+
+
+def print_table(results):
+    print(f"{'scenario':<14} {'conc':>5} {'done':>6} {'fail':>5} {'per s':>9} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'calls/ok':>9}")
+    for row in results:
+        calls = "-" if row["api_calls_per_completed"] in (None, 0) else f"{row['api_calls_per_completed']:.2f}"
+        print(f"{row['scenario']:<14} {row['concurrency']:>5} {row['completed']:>6} {row['failed']:>5} {row['throughput_per_s']:>9.2f} "
+              f"{row['p50_ms']:>10.2f} {row['p95_ms']:>10.2f} {row['p99_ms']:>10.2f} {calls:>9}")
+
+
+# run from the command line
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="End-to-end benchmark against a local fake Anthropic API")
+    arg_parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    arg_parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32], help="concurrency levels (default 1 8 32)")
+    arg_parser.add_argument("--quizzes", type=int, default=32, help="quizzes / explanations per concurrency level (default 32)")
+    arg_parser.add_argument("--streamlit-quizzes", type=int, default=5, help="full app flows (default 5)")
+    arg_parser.add_argument("--latency", type=float, default=0.5, help="fake API median latency in seconds (default 0.5)")
+    arg_parser.add_argument("--sigma", type=float, default=0.4, help="log-normal latency spread (default 0.4)")
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0, help="share of calls answered with 529 (default 0)")
+    arg_parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of quiz calls with cut off JSON (default 0)")
+    arg_parser.add_argument("--questions", type=int, default=5, help="questions per quiz (default 5) - over 5 uses parallel chunks")
+    arg_parser.add_argument("--backoff-base", type=float, default=1.0, help="generate_quiz retry backoff base in seconds (default 1.0)")
+    arg_parser.add_argument("--seed", type=int, default=7)
+    arg_parser.add_argument("--store", default=DEFAULT_STORE, help=f"results file (default {os.path.relpath(DEFAULT_STORE, ROOT)})")
+    arg_parser.add_argument("--no-store", action="store_true", help="don't append this run to the results file")
+    arg_parser.add_argument("--verbose", action="store_true", help="keep the generator's progress prints")
+    args = arg_parser.parse_args()
+
+    server = FakeAnthropicServer(latency=args.latency, sigma=args.sigma, failure_rate=args.failure_rate,
+                                 malformed_rate=args.malformed_rate, seed=args.seed).start()
+    server_config = {"latency": args.latency, "sigma": args.sigma, "failure_rate": args.failure_rate,
+                     "malformed_rate": args.malformed_rate, "backoff_base": args.backoff_base, "questions": args.questions}
+
+    # every client the code under test creates talks to the fake server, databases are throwaway
+    work_dir = tempfile.mkdtemp()
+    os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+    os.environ["ANTHROPIC_API_KEY"] = "benchmark"
+    os.environ["QUIZ_BANK_DB"] = os.path.join(work_dir, "bank.db")
+    os.environ["QUIZ_RESULTS_DB"] = os.path.join(work_dir, "results.db")
+    os.environ["QUIZ_CACHE_DB"] = os.path.join(work_dir, "cache.db")
+    os.environ["QUIZ_PREFETCH_MAX_OUTSTANDING"] = "0" # background prefetches would add API calls to the flow being measured
+    warnings.filterwarnings("ignore", category=DeprecationWarning) # the SDK's model deprecation notice on every call
+    run_id = int(time.time()) # unique topics - nothing is served from a cache or the bank
+
+    network_benches = {"quiz_sync": bench_quiz_sync, "quiz_async": bench_quiz_async,
+                       "quiz_stream": bench_quiz_stream, "explanation": bench_explanation}
+    results = []
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        for scenario in args.scenarios:
+            if scenario == "grading":
+                results.extend(bench_grading(args.quizzes * 100))
+                continue
+            if scenario == "streamlit":
+                import logging
+                logging.disable(logging.WARNING) # AppTest's "missing ScriptRunContext" noise
+                server.reset_stats()
+                latencies, failed, wall_seconds = bench_streamlit(server, args.streamlit_quizzes, run_id)
+                results.append(summarize("streamlit", 1, latencies, failed, wall_seconds, server.stats()["calls"]))
+                continue
+            for concurrency in args.concurrency:
+                server.reset_stats()
+                latencies, failed, wall_seconds = network_benches[scenario](server, concurrency, args.quizzes, run_id, args.backoff_base, args.questions)
+                results.append(summarize(scenario, concurrency, latencies, failed, wall_seconds, server.stats()["calls"]))
+    server.stop()
+
+    print(f"Fake API: median {args.latency}s, sigma {args.sigma}, failures {args.failure_rate:.0%}, malformed {args.malformed_rate:.0%}")
+    print_table(results)
+
+    previous = load_previous(args.store, server_config)
+    if previous is not None:
+        changes = compare(results, previous)
+        regressions = [change for change in changes if change[6]]
+        print(f"\nCompared with {previous['commit']} ({previous['time']}): {len(regressions)} regression(s) over {REGRESSION_THRESHOLD:.0%}")
+        for scenario, concurrency, metric, old, new, change, is_regression in regressions:
+            print(f" REGRESSION {scenario} x{concurrency} {metric}: {old} -> {new} ({change:+.0%})")
+
+    if args.no_store == False:
+        run = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(), "server": server_config,
+               "quizzes": args.quizzes, "results": results}
+        with open(args.store, "a", encoding="utf-8") as store_file:
+            store_file.write(json.dumps(run) + "\n")
+        print(f"\nStored in {args.store}")
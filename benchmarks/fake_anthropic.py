@@ -0,0 +1,256 @@
+"""
+Fake Anthropic Server
+- Local stand-in for the Messages API (POST /v1/messages) so generation can be benchmarked without
+  an API key, cost or network noise. Point the SDK at it with ANTHROPIC_BASE_URL=http://127.0.0.1:<port>.
+- Answers quiz prompts (normal or compact format, with or without explanations, any question count)
+  and explanation prompts, with or without streaming (server-sent events like the real API).
+- Latency is drawn from a log-normal distribution (median + sigma), and a share of calls can be
+  turned into 529 overloaded errors or malformed (cut off) JSON to exercise the retry paths.
+
+Run on its own with:
+    python benchmarks/fake_anthropic.py --port 8765 --latency 0.8 --failure-rate 0.05
+
+Tiandra M Taylor
+"""
+
+# imports
+import re
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STREAM_CHUNK_CHARS = 40 # characters per text_delta event - roughly what the real API sends
+
+
+class FakeAnthropicServer:
+    """
+    Configurable fake Messages API
+    - latency: median seconds per call, sigma: log-normal spread (0 = always the median)
+    - failure_rate: share of calls answered with 529 overloaded_error (retry-after-ms header included)
+    - malformed_rate: share of quiz calls whose JSON is cut off part way (some complete questions survive)
+    - first_token_share: part of the latency spent before the first streamed chunk
+    - start() / stop(), base_url, stats() (calls / failures / malformed / streamed), reset_stats()
+    """
+
+    def __init__(self, port=0, latency=0.5, sigma=0.4, failure_rate=0.0, malformed_rate=0.0,
+                 first_token_share=0.2, retry_after_ms=50, seed=None):
+        self.latency = latency
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.first_token_share = first_token_share
+        self.retry_after_ms = retry_after_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._stats = {}
+        self.reset_stats()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-anthropic", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"calls": 0, "quiz_calls": 0, "explanation_calls": 0, "failures": 0, "malformed": 0, "streamed": 0}
+
+    # helpers
+    def _draw(self):
+        """ one call's fate - (latency seconds, fail?, malformed?) """
+        with self._lock:
+            latency = self.latency * math.exp(self._random.gauss(0, self.sigma)) if self.sigma > 0 else self.latency
+            fail = self._random.random() < self.failure_rate
+            malformed = self._random.random() < self.malformed_rate
+            self._counter += 1
+            return latency, fail, malformed, self._counter
+
+    def _count(self, *names):
+        with self._lock:
+            for name in names:
+                self._stats[name] += 1
+
+    def _handler_class(self):
+        fake = self
+
+        class MessagesHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, like the real API
+
+            def do_POST(self):
+                if self.path.split("?")[0] != "/v1/messages":
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": "Not found"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                latency, fail, malformed, call_id = fake._draw()
+                fake._count("calls")
+
+                if fail:
+                    fake._count("failures")
+                    time.sleep(latency * 0.1) # overloaded errors come back fast
+                    self._send_json(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+                                    {"retry-after-ms": str(fake.retry_after_ms)})
+                    return
+
+                text, is_quiz = fake_response_text(request, call_id)
+                fake._count("quiz_calls" if is_quiz else "explanation_calls")
+                stop_reason = "end_turn"
+                if is_quiz and malformed:
+                    fake._count("malformed")
+                    text = text[:int(len(text) * 0.6)] # cut off part way, like a max_tokens stop
+                    stop_reason = "max_tokens"
+                usage = {"input_tokens": prompt_chars(request) // 4, "output_tokens": max(1, len(text) // 4),
+                         "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+
+                if request.get("stream"):
+                    fake._count("streamed")
+                    self._send_stream(request, text, stop_reason, usage, latency, call_id)
+                    return
+                time.sleep(latency)
+                self._send_json(200, {
+                    "id": f"msg_fake_{call_id}", "type": "message", "role": "assistant", "model": request.get("model", ""),
+                    "content": [{"type": "text", "text": text}], "stop_reason": stop_reason, "stop_sequence": None,
+                    "usage": usage
+                })
+
+            def _send_json(self, status, data, headers=None):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, request, text, stop_reason, usage, latency, call_id):
+                # no Content-Length - the body ends when the connection closes
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                chunks = [text[idx:idx + STREAM_CHUNK_CHARS] for idx in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+                chunk_delay = latency * (1 - fake.first_token_share) / len(chunks)
+                message = {"id": f"msg_fake_{call_id}", "type": "message", "role": "assistant", "model": request.get("model", ""),
+                           "content": [], "stop_reason": None, "stop_sequence": None,
+                           "usage": dict(usage, output_tokens=1)}
+                try:
+                    self._event("message_start", {"type": "message_start", "message": message})
+                    self._event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+                    time.sleep(latency * fake.first_token_share)
+                    for chunk in chunks:
+                        self._event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+                        time.sleep(chunk_delay)
+                    self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+                    self._event("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                                                  "usage": {"output_tokens": usage["output_tokens"]}})
+                    self._event("message_stop", {"type": "message_stop"})
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # client hung up (hedge loser, abandoned stream) - same as the real API
+
+            def _event(self, name, data):
+                self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        return MessagesHandler
+
+
+# functions
+def request_texts(request):
+    """ system text + user text of a Messages API request body """
+    system = request.get("system", "")
+    if isinstance(system, list):
+        system = "".join(block.get("text", "") for block in system)
+    user = ""
+    for message in request.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+        user += content
+    return system, user
+
+
+def prompt_chars(request):
+    system, user = request_texts(request)
+    return len(system) + len(user)
+
+
+def fake_response_text(request, call_id):
+    """
+    the assistant text for one request - a quiz in whatever format the system prompt asks for, or an explanation
+    Needs to return:
+        tuple (text: str, is_quiz: bool)
+    """
+    system, user = request_texts(request)
+    if user.startswith("Question:"):
+        return "The correct answer follows directly from the definition covered in the question.", False
+
+    topic_match = re.search(r"topic: ([^\n]+)", user)
+    topic = topic_match.group(1).strip() if topic_match else "the topic"
+    count_match = re.search(r"(\d+) (?:more )?(?:multiple choice )?question", user)
+    num_questions = int(count_match.group(1)) if count_match else 5
+    compact = '"q":[[' in system
+    explanations = "explanation" in system.lower()
+
+    questions = []
+    for idx in range(num_questions):
+        question = f"Fake question {idx + 1} about {topic} (call {call_id})?"
+        options = [f"Option {letter} for question {idx + 1} of call {call_id}" for letter in "ABCD"]
+        answer = (call_id + idx) % 4
+        explanation = f"Option {'ABCD'[answer]} is correct by definition."
+        if compact:
+            item = [question] + options + [answer]
+            if explanations:
+                item.append(explanation)
+            questions.append(item)
+        else:
+            question_dict = {"question": question, "options": dict(zip("ABCD", options)), "correct_answer": "ABCD"[answer]}
+            if explanations:
+                question_dict["explanation"] = explanation
+            questions.append(question_dict)
+    if compact:
+        return json.dumps({"q": questions}, separators=(",", ":")), True
+    return json.dumps({"questions": questions}, indent=2), True
+
+
+# run from the command line
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Local fake Anthropic Messages API for benchmarks")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--latency", type=float, default=0.5, help="median seconds per call (default 0.5)")
+    arg_parser.add_argument("--sigma", type=float, default=0.4, help="log-normal spread of the latency (default 0.4)")
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0, help="share of calls answered with 529")
+    arg_parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of quiz calls with cut off JSON")
+    args = arg_parser.parse_args()
+
+    server = FakeAnthropicServer(args.port, args.latency, args.sigma, args.failure_rate, args.malformed_rate).start()
+    print(f"Fake Anthropic API on {server.base_url} - export ANTHROPIC_BASE_URL={server.base_url}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f" {server.stats()}")
+    except KeyboardInterrupt:
+        server.stop()
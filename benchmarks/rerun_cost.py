@@ -0,0 +1,101 @@
+"""
+Rerun Cost Benchmark
+- Measures Streamlit script reruns and server CPU per completed quiz (answer every question, submit, see results)
+  by driving app.py headlessly with streamlit's AppTest.
+- Script runs are counted from AppTest's own script runner (one SCRIPT_STARTED event per run, st.rerun() included),
+  so the count is what the app really did, for any app version.
+- No API calls: the quiz is put straight into session state and prefetching is turned off.
+- Pass several --app files to compare versions, e.g. the current app.py against `git show <old>:app.py > old_app.py`.
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import sys
+import time
+import argparse
+import tempfile
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repo root
+from schema_size import SAMPLE_QUIZ
+
+ANSWERS = ["B", "A", "C", "D", "B"] # mix of right and wrong
+SCRIPT_RUNS = [0] # script executions seen by count_script_runs()
+
+
+# functions
+def count_script_runs():
+    """ wrap AppTest's script runner so every script execution (including st.rerun()) adds to SCRIPT_RUNS """
+    from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    original_run = LocalScriptRunner.run
+
+    def run(self, *args, **kwargs):
+        try:
+            return original_run(self, *args, **kwargs)
+        finally:
+            SCRIPT_RUNS[0] += self.events.count(ScriptRunnerEvent.SCRIPT_STARTED)
+
+    LocalScriptRunner.run = run
+
+
+def complete_quiz(app_path, timeout=30):
+    """
+    answer and submit one quiz the way a user would
+    - radios outside a form rerun the script on every click, radios inside a form only on submit
+    Needs to return:
+        tuple (script runs, CPU seconds)
+    """
+    from streamlit.testing.v1 import AppTest
+
+    app_test = AppTest.from_file(app_path, default_timeout=timeout)
+    app_test.session_state["quiz"] = dict(SAMPLE_QUIZ, topic="Photosynthesis", bank_ids=[])
+
+    runs_start = SCRIPT_RUNS[0]
+    cpu_start = time.process_time()
+    app_test.run()
+    in_form = app_test.radio[0].form_id != ""
+    for idx, letter in enumerate(ANSWERS):
+        radio = app_test.radio[idx]
+        radio.set_value(next(option for option in radio.options if option.startswith(letter)))
+        if in_form == False:
+            app_test.run() # a click outside a form is a full rerun
+
+    submit = next(button for button in app_test.button if "Submit" in button.label)
+    submit.click().run()
+    if app_test.session_state["results"] is None:
+        raise RuntimeError(f"{app_path}: quiz was not graded")
+    return SCRIPT_RUNS[0] - runs_start, time.process_time() - cpu_start
+
+
+# run from the command line
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Script reruns and CPU per completed quiz in the Streamlit app")
+    arg_parser.add_argument("--app", nargs="+", default=[os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")],
+                            help="app file(s) to measure (default: app.py)")
+    arg_parser.add_argument("--quizzes", type=int, default=20, help="quizzes completed per app (default 20)")
+    args = arg_parser.parse_args()
+
+    # throwaway databases, a dummy key (nothing calls the API) and no prefetching
+    work_dir = tempfile.mkdtemp()
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    os.environ["QUIZ_BANK_DB"] = os.path.join(work_dir, "bank.db")
+    os.environ["QUIZ_RESULTS_DB"] = os.path.join(work_dir, "results.db")
+    os.environ["QUIZ_CACHE_DB"] = os.path.join(work_dir, "cache.db")
+    os.environ["QUIZ_PREFETCH_MAX_OUTSTANDING"] = "0"
+    logging.disable(logging.WARNING) # AppTest's "missing ScriptRunContext" noise
+    count_script_runs()
+
+    print(f"{'app':<30} {'reruns / quiz':>14} {'CPU ms / quiz':>14}")
+    for app_path in args.app:
+        complete_quiz(app_path) # warm up - imports and cached resources
+        total_runs = 0
+        total_cpu = 0.0
+        for _ in range(args.quizzes):
+            runs, cpu_seconds = complete_quiz(app_path)
+            total_runs += runs
+            total_cpu += cpu_seconds
+        print(f"{os.path.basename(app_path):<30} {total_runs / args.quizzes:>14.1f} {total_cpu / args.quizzes * 1000:>14.1f}")
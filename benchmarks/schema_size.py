@@ -0,0 +1,118 @@
+"""
+Schema Size Benchmark
+- Measures output tokens (and the generation time they cost) for the verbose vs compact quiz formats.
+- With ANTHROPIC_API_KEY set, token counts come from the API's count_tokens endpoint,
+  otherwise from a rough offline estimate (words + punctuation + line breaks / indentation).
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import re
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repo root
+from quiz_parser import encode_compact_question, decode_compact_question
+from quiz_generator import QUIZ_MODEL
+
+# realistic 5 question quiz - roughly what the model sends back
+SAMPLE_QUIZ = {
+    "questions": [
+        {
+            "question": "What is the primary pigment used by plants to capture light energy during photosynthesis?",
+            "options": {"A": "Carotene", "B": "Chlorophyll", "C": "Xanthophyll", "D": "Anthocyanin"},
+            "correct_answer": "B",
+            "explanation": "Chlorophyll absorbs mostly blue and red light and passes that energy into the light-dependent reactions."
+        },
+        {
+            "question": "In which part of the chloroplast do the light-dependent reactions take place?",
+            "options": {"A": "Stroma", "B": "Outer membrane", "C": "Thylakoid membrane", "D": "Intermembrane space"},
+            "correct_answer": "C",
+            "explanation": "The photosystems and electron transport chain sit in the thylakoid membranes, where light energy makes ATP and NADPH."
+        },
+        {
+            "question": "Which gas is released as a by-product of photosynthesis?",
+            "options": {"A": "Carbon dioxide", "B": "Nitrogen", "C": "Oxygen", "D": "Hydrogen"},
+            "correct_answer": "C",
+            "explanation": "Splitting water in photosystem II releases oxygen gas as a by-product."
+        },
+        {
+            "question": "What is the name of the enzyme that fixes carbon dioxide in the Calvin cycle?",
+            "options": {"A": "ATP synthase", "B": "RuBisCO", "C": "Hexokinase", "D": "DNA polymerase"},
+            "correct_answer": "B",
+            "explanation": "RuBisCO attaches CO2 to ribulose bisphosphate, the first step of carbon fixation in the Calvin cycle."
+        },
+        {
+            "question": "Why do C4 plants photosynthesize more efficiently than C3 plants in hot, dry conditions?",
+            "options": {
+                "A": "They have more chloroplasts per cell",
+                "B": "They concentrate CO2 around RuBisCO, reducing photorespiration",
+                "C": "They do not need sunlight",
+                "D": "They use nitrogen instead of carbon dioxide"
+            },
+            "correct_answer": "B",
+            "explanation": "C4 plants pre-fix CO2 into four-carbon compounds and release it near RuBisCO, so less oxygen is fixed by mistake."
+        }
+    ]
+}
+
+
+# functions
+def approx_tokens(text):
+    """
+    offline estimate - every word and every punctuation mark counts as a token, and so does every line break
+    (with its indentation) or longer run of spaces - pretty printing's layout is output tokens too, a single
+    space between words isn't (tokenizers merge it into the next word)
+    """
+    return len(re.findall(r"\w+|[^\w\s]|\n\s*| {2,}", text))
+
+
+def count_tokens(text, client):
+    """ real token count from the API (minus the count for an empty-ish message) """
+    def count(content):
+        return client.messages.count_tokens(model=QUIZ_MODEL, messages=[{"role": "user", "content": content}]).input_tokens
+    return count(text) - count(".")
+
+
+def format_variants(quiz_data):
+    """
+    the same quiz in each wire format
+    Needs to return:
+        dict of format name -> response text
+    """
+    compact = {"q": [encode_compact_question(question_dict) for question_dict in quiz_data["questions"]]}
+    # make sure the compact format is lossless before measuring it
+    assert [decode_compact_question(item) for item in compact["q"]] == quiz_data["questions"]
+    return {
+        "verbose (pretty, as in the old prompt)": json.dumps(quiz_data, indent=4),
+        "verbose (minified)": json.dumps(quiz_data, separators=(",", ":")),
+        "compact": json.dumps(compact, separators=(",", ":"), ensure_ascii=False),
+    }
+
+
+# test code - body
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compare output size of the quiz response formats")
+    arg_parser.add_argument("--tokens-per-second", type=float, default=50.0,
+                            help="output generation speed used to turn tokens into wall time (default 50)")
+    args = arg_parser.parse_args()
+
+    client = None
+    if os.getenv("ANTHROPIC_API_KEY"):
+        import anthropic as anth
+        client = anth.Anthropic()
+
+    baseline = None
+    print(f"{'format':<40} {'chars':>7} {'tokens':>7} {'est. seconds':>13} {'saved':>7}")
+    for name, text in format_variants(SAMPLE_QUIZ).items():
+        tokens = count_tokens(text, client) if client is not None else approx_tokens(text)
+        seconds = tokens / args.tokens_per_second
+        if baseline is None:
+            baseline = tokens
+        saved = 100 * (baseline - tokens) / baseline
+        print(f"{name:<40} {len(text):>7} {tokens:>7} {seconds:>13.2f} {saved:>6.1f}%")
+    print(f"\ntoken counts: {'API count_tokens' if client is not None else 'offline estimate'}, "
+          f"wall time at {args.tokens_per_second:.0f} output tokens/s")
@@ -0,0 +1,61 @@
+"""
+Topic Lookup Benchmark
+- Measures TopicNormalizer.resolve() time versus the number of known topics, for exact hits
+  (spelling seen before) and fuzzy lookups (a one letter typo, which goes through the trigram index).
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repo root
+from topic_normalizer import TopicNormalizer
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+# functions
+def random_topic(generator):
+    """ 1-3 random words - harder on the index than real topics (no common words to skip) """
+    return " ".join(
+        "".join(generator.choice(LETTERS) for _ in range(generator.randint(4, 10)))
+        for _ in range(generator.randint(1, 3))
+    )
+
+
+def time_lookups(normalizer, queries):
+    """ average microseconds per resolve() (not registering, so every query sees the same index) """
+    start = time.perf_counter()
+    for query in queries:
+        normalizer.resolve(query, register=False)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+# run from the command line
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="TopicNormalizer lookup time vs number of known topics")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="known topic counts to test")
+    arg_parser.add_argument("--queries", type=int, default=2000, help="lookups per measurement (default 2000)")
+    arg_parser.add_argument("--threshold", type=float, default=0.7, help="similarity threshold (default 0.7)")
+    args = arg_parser.parse_args()
+
+    generator = random.Random(1)
+    print(f"{'known topics':>12} | {'seed time':>10} | {'exact hit':>10} | {'fuzzy (typo)':>12} | {'matched':>7}")
+    for size in args.sizes:
+        known = [random_topic(generator) for _ in range(size)]
+        normalizer = TopicNormalizer(threshold=args.threshold, max_topics=size)
+        start = time.perf_counter()
+        normalizer.seed(known)
+        seed_seconds = time.perf_counter() - start
+
+        exact_queries = [generator.choice(known) for _ in range(args.queries)]
+        typo_queries = [topic[:-1] + ("x" if topic[-1] != "x" else "y") for topic in exact_queries]
+        exact_us = time_lookups(normalizer, exact_queries)
+        fuzzy_us = time_lookups(normalizer, typo_queries)
+        matched = sum(normalizer.resolve(query, register=False)[1] < 1.0 for query in typo_queries) / len(typo_queries)
+        print(f"{size:>12} | {seed_seconds:>8.1f} s | {exact_us:>7.1f} us | {fuzzy_us:>9.1f} us | {matched:>6.0%}")
@@ -0,0 +1,230 @@
+"""
+Bulk Quiz Generator
+- Command line tool for pre-building question banks: reads a file of topics and generates
+  a quiz for each one with a pool of workers.
+- A token bucket keeps the run under the account's requests/min and tokens/min limits,
+  and 429s (with retry-after) pause every worker, not just the one that hit it.
+- Quizzes are appended to a JSONL file as each one finishes. Re-running the same command
+  resumes: topics already in the output file are skipped.
+
+Usage:
+    python bulk_generate.py topics.txt --output quizzes.jsonl --workers 8 --rpm 50 --tpm 40000
+    python bulk_generate.py topics.txt --output quizzes.jsonl --snapshot quizzes.qsnap   # + a snapshot for QUIZ_SNAPSHOT
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+from quiz_generator import generate_quiz, NUM_QUESTIONS
+from quiz_cache import normalize_topic
+from topic_normalizer import TopicNormalizer
+from metrics import configure_from_env
+from quiz_snapshot import write_snapshot, read_jsonl
+
+
+class TokenBucket:
+    """
+    Rate limiter for requests/min and tokens/min at the same time
+    - both buckets refill continuously, acquire() blocks until there is room in both
+    - settle() gives back what a call didn't use (the estimate is the worst case)
+    - penalize() pauses everyone, e.g. after a 429 with retry-after
+    - thread safe, shared by every worker
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_second = requests_per_minute / 60.0
+        self.tokens_per_second = tokens_per_minute / 60.0
+        self.request_capacity = max(1.0, float(requests_per_minute))
+        self.token_capacity = max(1.0, float(tokens_per_minute))
+        # start with a small burst rather than a full minute's worth at once
+        self._requests = min(self.request_capacity, max(1.0, self.requests_per_second * 5))
+        self._tokens = min(self.token_capacity, self.tokens_per_second * 5)
+        self._paused_until = 0.0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """ wait until one request and `tokens` tokens are available, then take them """
+        tokens = min(float(tokens), self.token_capacity) # a single huge call still has to go through eventually
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    self._paused_until - now,
+                    (1 - self._requests) / self.requests_per_second,
+                    (tokens - self._tokens) / self.tokens_per_second,
+                )
+            time.sleep(min(max(wait, 0.01), 5.0))
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """ give back the part of the estimate the call didn't use """
+        unused = estimated_tokens - actual_tokens
+        if unused > 0:
+            with self._lock:
+                self._tokens = min(self.token_capacity, self._tokens + unused)
+
+    def penalize(self, seconds):
+        """ pause all callers for `seconds` (e.g. retry-after from a 429) """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._requests = min(self.request_capacity, self._requests + elapsed * self.requests_per_second)
+        self._tokens = min(self.token_capacity, self._tokens + elapsed * self.tokens_per_second)
+
+
+# functions
+def read_topics(path, normalizer=None):
+    """
+    topics file - one topic per line, blank lines and # comments ignored, duplicates dropped
+    - "Photosynthesis basics" and "photosynthesis" are one quiz, not two
+    - with a TopicNormalizer (--fuzzy-topics) a typo of an earlier topic ("photosynthsis") is dropped too
+    """
+    topics = []
+    seen = set()
+    with open(path, encoding="utf-8") as topics_file:
+        for line in topics_file:
+            topic = line.strip()
+            if topic == "" or topic.startswith("#"):
+                continue
+            if normalizer is not None:
+                topic = normalizer.match_topic(topic)
+            key = normalize_topic(topic)
+            if key not in seen:
+                seen.add(key)
+                topics.append(topic)
+    return topics
+
+
+def read_finished_topics(output_path):
+    """
+    normalized topics already in the output file (for resuming)
+    - a line cut off by an interrupted run isn't valid JSON and is ignored - that topic gets redone
+    """
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, encoding="utf-8") as output_file:
+        for line in output_file:
+            try:
+                quiz = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(quiz, dict) and "topic" in quiz:
+                finished.add(normalize_topic(quiz["topic"]))
+    return finished
+
+
+def open_output(output_path):
+    """ open for appending - makes sure a half written last line doesn't swallow the next quiz """
+    needs_newline = False
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, "rb") as existing:
+            existing.seek(-1, os.SEEK_END)
+            needs_newline = existing.read(1) != b"\n"
+    output_file = open(output_path, "a", encoding="utf-8")
+    if needs_newline:
+        output_file.write("\n")
+    return output_file
+
+
+def run(topics_path, output_path, api_key, workers=4, requests_per_minute=50, tokens_per_minute=40000,
+        include_explanations=False, max_retries=3, num_questions=NUM_QUESTIONS, topic_normalizer=None):
+    """
+    generate a quiz for every topic not already in the output file
+    Needs to return:
+        dict with counts - {"total": ..., "skipped": ..., "generated": ..., "failed": ...}
+    """
+    finished = read_finished_topics(output_path)
+    if topic_normalizer is not None:
+        topic_normalizer.seed(finished) # typos of topics a previous run already did are skipped as well
+    topics = read_topics(topics_path, topic_normalizer)
+    todo = [topic for topic in topics if normalize_topic(topic) not in finished]
+    counts = {"total": len(topics), "skipped": len(topics) - len(todo), "generated": 0, "failed": 0}
+    print(f" {counts['total']} topics, {counts['skipped']} already done, {len(todo)} to generate with {workers} workers.")
+
+    bucket = TokenBucket(requests_per_minute, tokens_per_minute)
+    started = time.monotonic()
+    output_file = open_output(output_path)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        for topic in todo:
+            future = pool.submit(generate_quiz, topic, api_key, max_retries=max_retries,
+                                 include_explanations=include_explanations, rate_limiter=bucket, num_questions=num_questions)
+            futures[future] = topic
+
+        # write each quiz as soon as it's done so an interrupted run keeps everything finished so far
+        for future in as_completed(futures):
+            quiz = future.result()
+            if quiz is None:
+                counts["failed"] += 1
+                print(f" FAILED: {futures[future]}")
+            else:
+                output_file.write(json.dumps(quiz) + "\n")
+                output_file.flush()
+                counts["generated"] += 1
+
+            done = counts["generated"] + counts["failed"]
+            if done % 10 == 0 or done == len(todo):
+                elapsed = time.monotonic() - started
+                print(f" Progress: {done}/{len(todo)} ({counts['failed']} failed) - {done / max(elapsed, 1e-9) * 60:.1f} quizzes/min")
+    except KeyboardInterrupt:
+        print(" Interrupted - finished quizzes are saved, run the same command again to resume.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+        output_file.close()
+
+    return counts
+
+
+# run from the command line
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Generate quizzes for a file of topics (one per line).")
+    arg_parser.add_argument("topics", help="text file with one topic per line")
+    arg_parser.add_argument("--output", default="quizzes.jsonl", help="JSONL file to append quizzes to (default quizzes.jsonl)")
+    arg_parser.add_argument("--workers", type=int, default=4, help="quizzes generated at the same time (default 4)")
+    arg_parser.add_argument("--rpm", type=int, default=50, help="requests per minute limit (default 50)")
+    arg_parser.add_argument("--tpm", type=int, default=40000, help="tokens per minute limit, input + output (default 40000)")
+    arg_parser.add_argument("--explanations", action="store_true", help="include an explanation with every question")
+    arg_parser.add_argument("--max-retries", type=int, default=3, help="attempts per topic (default 3)")
+    arg_parser.add_argument("--questions", type=int, default=NUM_QUESTIONS, help=f"questions per quiz (default {NUM_QUESTIONS}) - long quizzes are generated in parallel chunks")
+    arg_parser.add_argument("--fuzzy-topics", action="store_true", help="also merge typos of an earlier topic (\"photosynthsis\")")
+    arg_parser.add_argument("--snapshot", help="also write everything in the output file to this memory-mapped snapshot (QUIZ_SNAPSHOT)")
+    args = arg_parser.parse_args()
+
+    # load api key from .env file
+    load_dotenv()
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if api_key == None or api_key.strip() == "":
+        print("API key not found. Please set ANTHROPIC_API_KEY in your .env file.")
+        sys.exit(1)
+    configure_from_env() # QUIZ_METRICS=jsonl writes every span / retry / token count for the run
+
+    try:
+        counts = run(args.topics, args.output, api_key, args.workers, args.rpm, args.tpm, args.explanations, args.max_retries,
+                     args.questions, topic_normalizer=TopicNormalizer() if args.fuzzy_topics else None)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(f" Done: {counts}")
+    if args.snapshot:
+        print(f" Snapshot: {write_snapshot(read_jsonl(args.output), args.snapshot)} quizzes written to {args.snapshot}")
+    sys.exit(0 if counts["failed"] == 0 else 2)
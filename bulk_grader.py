@@ -0,0 +1,230 @@
+"""
+Bulk Grader Module
+- Handles grading many submissions for the same quiz at once (e.g. a whole course from a CSV/JSONL export).
+- Answers are stored as one compact uint8 NumPy matrix (submissions x questions) and every score,
+  per question correctness and per option distribution is computed with vectorized operations.
+- Per-submission dicts (same format as quiz_grader) are only built when asked for.
+
+Tiandra M Taylor
+"""
+
+# imports
+import csv
+import json
+import numpy as np
+
+from quiz_grader import calculate_score, get_detailed_results
+from metrics import METRICS
+
+OPTION_LETTERS = ["A", "B", "C", "D"]
+MISSING = 255 # code for a blank / invalid answer
+
+# byte -> answer code lookup table ("A" -> 0 ... "D" -> 3, anything else -> MISSING)
+# - lowercase is MISSING too, so a batch scores the same as quiz_grader.calculate_score
+_ANSWER_CODES = np.full(256, MISSING, dtype=np.uint8)
+for _code, _letter in enumerate(OPTION_LETTERS):
+    _ANSWER_CODES[ord(_letter)] = _code
+
+
+# functions
+def encode_answers(answer_rows, num_questions):
+    """
+    list of answer lists (letters) -> uint8 matrix, one row per submission
+    - blank / invalid (incl. lowercase) answers become MISSING (counted as wrong)
+    - raises ValueError if a submission doesn't have exactly num_questions answers
+    """
+    for idx, row in enumerate(answer_rows):
+        if len(row) != num_questions:
+            raise ValueError(f"Submission {idx} has {len(row)} answers, expected {num_questions}")
+
+    # one byte per answer, then a single table lookup converts them all
+    flat = "".join(
+        answer if isinstance(answer, str) and len(answer) == 1 else "?"
+        for row in answer_rows for answer in row
+    ).encode("ascii", errors="replace")
+    codes = _ANSWER_CODES[np.frombuffer(flat, dtype=np.uint8)]
+    return codes.reshape(len(answer_rows), num_questions)
+
+
+def encode_answer_key(quiz_data):
+    """
+    correct answers of the quiz as a uint8 vector
+    - raises ValueError if a question has no valid correct_answer (otherwise blank answers would match it)
+    """
+    key = encode_answers([[q.get("correct_answer") for q in quiz_data["questions"]]], len(quiz_data["questions"]))[0]
+    invalid = np.flatnonzero(key == MISSING)
+    if len(invalid) > 0:
+        raise ValueError(f"Question {invalid[0] + 1} has no valid correct_answer (expected one of {OPTION_LETTERS})")
+    return key
+
+
+def decode_answers(codes):
+    """ one row of codes back to letters (None for MISSING) """
+    return [OPTION_LETTERS[code] if code != MISSING else None for code in codes.tolist()]
+
+
+class BatchResults:
+    """
+    Grading results for a batch of submissions to one quiz
+    - answers: uint8 matrix (submissions x questions), key: uint8 vector
+    - everything aggregate is a NumPy array computed once, per-submission dicts are built on demand
+    """
+
+    def __init__(self, quiz_data, answers, submission_ids=None):
+        self.quiz_data = quiz_data
+        self.answers = answers
+        self.key = encode_answer_key(quiz_data)
+        self.submission_ids = submission_ids if submission_ids is not None else list(range(answers.shape[0]))
+
+        self.correct = self.answers == self.key[np.newaxis, :]      # bool (submissions x questions)
+        self.correct_counts = self.correct.sum(axis=1, dtype=np.int32)  # per submission
+        self.score_percentages = self.correct_counts * (100.0 / self.num_questions)
+
+    @property
+    def num_submissions(self):
+        return self.answers.shape[0]
+
+    @property
+    def num_questions(self):
+        return self.answers.shape[1]
+
+    def question_correct_rates(self):
+        """ fraction of submissions that got each question right """
+        if self.num_submissions == 0:
+            return np.zeros(self.num_questions)
+        return self.correct.mean(axis=0)
+
+    def option_distribution(self):
+        """
+        how many submissions picked each option for each question
+        Needs to return:
+            int array (questions x 5) - columns A, B, C, D, missing
+        """
+        codes = np.where(self.answers == MISSING, 4, self.answers).astype(np.int64)
+        offsets = np.arange(self.num_questions, dtype=np.int64) * 5
+        counts = np.bincount((codes + offsets[np.newaxis, :]).ravel(), minlength=5 * self.num_questions)
+        return counts.reshape(self.num_questions, 5)
+
+    def score_distribution(self):
+        """ number of submissions with 0, 1, ... num_questions correct """
+        return np.bincount(self.correct_counts, minlength=self.num_questions + 1)
+
+    def summary(self):
+        """
+        whole batch overview as plain Python types (JSON friendly)
+        """
+        distribution = self.option_distribution()
+        questions = []
+        for idx, rate in enumerate(self.question_correct_rates().tolist()):
+            questions.append({
+                "question_number": idx + 1,
+                "correct_answer": OPTION_LETTERS[self.key[idx]],
+                "percent_correct": rate * 100,
+                "option_counts": dict(zip(OPTION_LETTERS + ["missing"], distribution[idx].tolist()))
+            })
+        return {
+            "submissions": self.num_submissions,
+            "mean_score_percentage": float(self.score_percentages.mean()) if self.num_submissions else 0.0,
+            "median_score_percentage": float(np.median(self.score_percentages)) if self.num_submissions else 0.0,
+            "score_distribution": self.score_distribution().tolist(),
+            "questions": questions
+        }
+
+    def score(self, idx):
+        """ quiz_grader.calculate_score style dict for one submission """
+        return calculate_score(decode_answers(self.answers[idx]), [OPTION_LETTERS[code] for code in self.key.tolist()])
+
+    def detailed_results(self, idx):
+        """ quiz_grader.get_detailed_results style list for one submission """
+        return get_detailed_results(self.quiz_data["questions"], decode_answers(self.answers[idx]))
+
+
+def grade_batch(quiz_data, answer_rows, submission_ids=None):
+    """
+    grade many submissions for the same quiz
+    - answer_rows: list of answer lists (["A", "C", ...]) or an already encoded matrix (0-3, anything else is
+      MISSING - checked before the uint8 cast, so e.g. 260 or -1 can't wrap around into a real option)
+    """
+    num_questions = len(quiz_data["questions"])
+    with METRICS.span("quiz_grade", source="bulk"):
+        if isinstance(answer_rows, np.ndarray):
+            if answer_rows.ndim != 2 or answer_rows.shape[1] != num_questions:
+                raise ValueError(f"Answer matrix must have {num_questions} columns")
+            answers = np.where((answer_rows < 0) | (answer_rows > 3), MISSING, answer_rows).astype(np.uint8)
+        else:
+            answers = encode_answers(answer_rows, num_questions)
+        return BatchResults(quiz_data, answers, submission_ids)
+
+
+def load_submissions_csv(path, num_questions):
+    """
+    CSV export - first column is the submission id, then one column per question (header row expected)
+    Needs to return:
+        tuple (submission_ids: list, answers: uint8 matrix)
+    """
+    ids = []
+    rows = []
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader, None) # header
+        for record in reader:
+            if len(record) == 0:
+                continue
+            ids.append(record[0])
+            rows.append([answer.strip() for answer in record[1:]])
+    return ids, encode_answers(rows, num_questions)
+
+
+def load_submissions_jsonl(path, num_questions):
+    """
+    JSONL export - one {"submission_id": ..., "user_answers": [...]} per line
+    Needs to return:
+        tuple (submission_ids: list, answers: uint8 matrix)
+    """
+    ids = []
+    rows = []
+    with open(path, encoding="utf-8") as jsonl_file:
+        for line in jsonl_file:
+            if line.strip() == "":
+                continue
+            record = json.loads(line)
+            ids.append(record.get("submission_id", len(ids)))
+            rows.append(record["user_answers"])
+    return ids, encode_answers(rows, num_questions)
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    import time
+
+    fake_quiz = {
+        "topic": "Test Topic",
+        "questions": [
+            {"question": "What is 2 + 2?", "options": {"A": "3", "B": "4", "C": "5", "D": "6"}, "correct_answer": "B"},
+            {"question": "What is the capital of France?", "options": {"A": "London", "B": "Berlin", "C": "Paris", "D": "Madrid"}, "correct_answer": "C"},
+            {"question": "How many days in a week?", "options": {"A": "5", "B": "6", "C": "7", "D": "8"}, "correct_answer": "C"},
+            {"question": "What color is the sky?", "options": {"A": "Blue", "B": "Green", "C": "Red", "D": "Yellow"}, "correct_answer": "A"},
+            {"question": "What is 10 / 2?", "options": {"A": "3", "B": "4", "C": "5", "D": "6"}, "correct_answer": "C"}
+        ]
+    }
+
+    # small batch from letter lists
+    results = grade_batch(fake_quiz, [["A", "C", "B", "D", "A"], ["B", "C", "C", "A", "C"], ["B", "", "C", "A", "D"]])
+    print(f"Scores: {results.correct_counts.tolist()}")
+    print(f"Submission 0 (same as calculate_score): {results.score(0)}")
+    lowercase = grade_batch(fake_quiz, [["b", "c", "c", "a", "c"]])
+    assert lowercase.score(0)["correct_count"] == lowercase.correct_counts[0] == 0
+    try:
+        grade_batch(dict(fake_quiz, questions=fake_quiz["questions"][:4] + [{"question": "?", "options": {}}]), [[""] * 5])
+        raise AssertionError("a missing correct_answer should be refused")
+    except ValueError as e:
+        print(f"Bad answer key refused: {e}")
+
+    # 100k submissions - already encoded, so this times just the grading
+    random_answers = np.random.randint(0, 4, size=(100_000, 5), dtype=np.uint8)
+    start = time.perf_counter()
+    big = grade_batch(fake_quiz, random_answers)
+    summary = big.summary()
+    print(f"Graded {big.num_submissions} submissions + summary in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"Mean score: {summary['mean_score_percentage']:.1f}%, Q1 option counts: {summary['questions'][0]['option_counts']}")
@@ -0,0 +1,138 @@
+"""
+Client Provider Module
+- Handles creating and sharing the Anthropic API clients.
+- One long lived sync client and one async client per API key and process, so the
+  HTTP connection pool (and TLS sessions) get reused instead of a new handshake per call.
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import asyncio
+import threading
+
+import anthropic as anth
+import httpx
+
+# connection pool + timeout settings - change with configure_pool() before the first client is made
+POOL_SETTINGS = {
+    "max_connections": 100,          # total open connections per client
+    "max_keepalive_connections": 20, # idle connections kept around for reuse
+    "keepalive_expiry": 30.0,        # seconds an idle connection stays open
+    "connect_timeout": 5.0,
+    "read_timeout": 60.0,            # quiz generation can take a while
+    "write_timeout": 10.0,
+    "pool_timeout": 10.0,            # wait for a free connection when the pool is full
+    "max_retries": 0,                # no SDK retries - 429 / 529 go straight to the app's retry loop and limiter
+}
+
+_sync_clients = {}  # (pid, api_key) -> Anthropic
+_async_clients = {} # (pid, api_key) -> (event loop, AsyncAnthropic)
+_lock = threading.Lock()
+
+
+# functions
+def configure_pool(**settings):
+    """
+    update POOL_SETTINGS - only affects clients created after this call
+    """
+    for name, value in settings.items():
+        if name not in POOL_SETTINGS:
+            raise ValueError(f"Unknown pool setting '{name}'")
+        POOL_SETTINGS[name] = value
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=POOL_SETTINGS["max_connections"],
+        max_keepalive_connections=POOL_SETTINGS["max_keepalive_connections"],
+        keepalive_expiry=POOL_SETTINGS["keepalive_expiry"]
+    )
+
+
+def _timeout():
+    return httpx.Timeout(
+        connect=POOL_SETTINGS["connect_timeout"],
+        read=POOL_SETTINGS["read_timeout"],
+        write=POOL_SETTINGS["write_timeout"],
+        pool=POOL_SETTINGS["pool_timeout"]
+    )
+
+
+def get_client(api_key):
+    """
+    shared sync client for this API key
+    - keyed by process id too, so a forked worker never reuses its parent's sockets
+    """
+    key = (os.getpid(), api_key)
+    with _lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            client = anth.Anthropic(
+                api_key=api_key,
+                http_client=anth.DefaultHttpxClient(limits=_limits(), timeout=_timeout()),
+                timeout=_timeout(),
+                max_retries=POOL_SETTINGS["max_retries"]
+            )
+            _sync_clients[key] = client
+        return client
+
+
+def get_async_client(api_key):
+    """
+    shared async client for this API key
+    - httpx async connections belong to the event loop they were opened on, so if this is
+      called from a different running loop (e.g. a second asyncio.run) a new client is made for it
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None # not in a loop yet - client binds to whichever loop uses it first
+
+    key = (os.getpid(), api_key)
+    with _lock:
+        entry = _async_clients.get(key)
+        if entry is not None and (entry[0] is loop or entry[0] is None):
+            if entry[0] is None and loop is not None:
+                _async_clients[key] = (loop, entry[1])
+            return entry[1]
+
+        client = anth.AsyncAnthropic(
+            api_key=api_key,
+            http_client=anth.DefaultAsyncHttpxClient(limits=_limits(), timeout=_timeout()),
+            timeout=_timeout(),
+            max_retries=POOL_SETTINGS["max_retries"]
+        )
+        _async_clients[key] = (loop, client)
+        return client
+
+
+def close_clients():
+    """
+    close the sync clients owned by this process (async ones are closed with aclose_clients)
+    """
+    with _lock:
+        for key in list(_sync_clients):
+            if key[0] == os.getpid():
+                _sync_clients.pop(key).close()
+
+
+async def aclose_clients():
+    """ close the async clients owned by this process - call from the loop that used them """
+    with _lock:
+        clients = [entry[1] for key, entry in _async_clients.items() if key[0] == os.getpid()]
+        for key in [key for key in _async_clients if key[0] == os.getpid()]:
+            del _async_clients[key]
+    for client in clients:
+        await client.close()
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    first = get_client("test-key")
+    second = get_client("test-key")
+    print(f"Same sync client reused: {first is second}")
+    print(f"Different key gets its own client: {get_client('other-key') is not first}")
+    close_clients()
@@ -0,0 +1,403 @@
+"""
+Concurrency Limiter Module
+- Handles one process-wide cap on Anthropic calls in flight, shared by every session, thread and event loop.
+- The cap adapts (AIMD): doubles per round of calls until the first sign of trouble (slow start), then
+  +1 per limit's worth of successful calls; halved when calls come back 429 / 529 or much slower than usual - at most once per "window", so one burst of errors is one cut, not a collapse.
+- Callers over the cap wait in a priority queue (quiz generation ahead of explanations), each with a
+  deadline, and get LimiterTimeout if it passes before a slot frees up. A caller that no longer needs the
+  call (e.g. a hedge whose first call already won) can give up its place with a cancel event.
+
+Use:
+    with API_LIMITER.acquire(PRIORITY_QUIZ):                 # threads
+        message = client.messages.create(...)
+    with await API_LIMITER.acquire_async(PRIORITY_QUIZ):     # asyncio
+        message = await client.messages.create(...)
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque
+
+PRIORITY_QUIZ = 0        # lower runs first
+PRIORITY_EXPLANATION = 1
+PRIORITY_NAMES = {PRIORITY_QUIZ: "quiz", PRIORITY_EXPLANATION: "explanation"}
+QUEUE_TIMEOUTS = {PRIORITY_QUIZ: 60.0, PRIORITY_EXPLANATION: 30.0} # default seconds a caller may wait for a slot
+OVERLOAD_STATUSES = (429, 529) # rate limited / overloaded
+CANCEL_POLL_SECONDS = 0.05 # how often a queued thread checks its cancel event
+
+
+class LimiterTimeout(TimeoutError):
+    """ the request's deadline passed while it was still queued for a slot """
+
+
+class LimiterCancelled(Exception):
+    """ the caller's cancel event was set while it was still queued - no slot taken, nothing sent """
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit + priority wait queue
+    - acquire(priority, timeout, cancel_event, tokens) / acquire_async(...) return a permit - use it as a `with`
+      block around the call, leaving the block reports the outcome (success + latency, 429 / 529, or other error);
+      permit.discard() hands back a slot that was never used
+    - limit: starts at initial_limit, stays within [min_limit, max_limit]
+    - latency_tolerance: a success slower than this many times the usual (10th percentile) latency
+      for its priority counts as congestion too (None = only 429 / 529 shrink the limit)
+    - tokens: the call's requested output tokens (max_tokens) - latency is compared per requested token, so a
+      50 question chunk isn't "slow" next to a 1 question repair; calls without it are compared per call
+    - stats(): limit, in_flight, queue_depth (per priority too), granted / timeouts / overloads / decreases, wait times
+    """
+
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=64, decrease_factor=0.5, latency_tolerance=3.0,
+                 latency_window=100, min_latency_samples=20):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.min_latency_samples = min_latency_samples
+        self._limit = float(max(min_limit, min(max_limit, initial_limit)))
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._epoch = 0          # bumped on every decrease - permits from an older epoch can't cut again
+        self._waiters = []       # heap of (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._queued = {priority: 0 for priority in PRIORITY_NAMES}
+        # (priority, sized) -> recent latencies - seconds per requested output token for sized calls, per call otherwise
+        self._latencies = {(priority, sized): deque(maxlen=latency_window) for priority in PRIORITY_NAMES for sized in (False, True)}
+        self._counters = {"granted": 0, "queued": 0, "timeouts": 0, "cancelled": 0, "overloads": 0, "slow_calls": 0,
+                          "decreases": 0, "errors": 0}
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self, priority=PRIORITY_QUIZ, timeout=None, cancel_event=None, tokens=None):
+        """
+        wait for a slot (threads)
+        - cancel_event: optional threading.Event - once set, a caller still in the queue leaves it
+        - tokens: requested output tokens (max_tokens) - what the call's latency is measured against
+        Needs to return:
+            a permit (context manager) - raises LimiterTimeout if the deadline passes first,
+            LimiterCancelled if cancel_event is set first
+        """
+        timeout = QUEUE_TIMEOUTS.get(priority, 60.0) if timeout is None else timeout
+        with self._lock:
+            permit = self._try_grant(priority, tokens)
+            if permit is not None:
+                return permit
+            waiter = _ThreadWaiter()
+            self._enqueue(priority, waiter)
+        if cancel_event is None:
+            waiter.event.wait(timeout)
+        else:
+            deadline = time.monotonic() + timeout
+            while waiter.event.wait(min(CANCEL_POLL_SECONDS, max(0.0, deadline - time.monotonic()))) == False:
+                if cancel_event.is_set():
+                    permit = self._claim(priority, waiter, tokens, raise_timeout=False, reason="cancelled")
+                    if permit is not None:
+                        permit.discard() # granted just as we gave up - hand it back unused
+                    raise LimiterCancelled()
+                if time.monotonic() >= deadline:
+                    break
+        return self._claim(priority, waiter, tokens)
+
+    async def acquire_async(self, priority=PRIORITY_QUIZ, timeout=None, tokens=None):
+        """ wait for a slot without blocking the event loop - same result as acquire() """
+        timeout = QUEUE_TIMEOUTS.get(priority, 60.0) if timeout is None else timeout
+        with self._lock:
+            permit = self._try_grant(priority, tokens)
+            if permit is not None:
+                return permit
+            waiter = _AsyncWaiter(asyncio.get_running_loop())
+            self._enqueue(priority, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            permit = self._claim(priority, waiter, tokens, raise_timeout=False, reason="cancelled")
+            if permit is not None:
+                permit.discard() # granted just as we were cancelled - hand it back unused
+            raise
+        return self._claim(priority, waiter, tokens)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["limit"] = self.limit
+            stats["limit_exact"] = round(self._limit, 2)
+            stats["in_flight"] = self._in_flight
+            stats["queue_depth"] = sum(self._queued.values())
+            for priority, name in PRIORITY_NAMES.items():
+                stats[f"queued_{name}"] = self._queued[priority]
+            stats["avg_wait_seconds"] = round(self._wait_seconds / stats["queued"], 3) if stats["queued"] else 0.0
+            stats["max_wait_seconds"] = round(self._max_wait_seconds, 3)
+        return stats
+
+    # helpers - everything below that touches state runs with the lock held unless it takes it itself
+    def _try_grant(self, priority, tokens):
+        if len(self._waiters) == 0 and self._in_flight < int(self._limit):
+            self._in_flight += 1
+            self._counters["granted"] += 1
+            return _Permit(self, priority, self._epoch, 0.0, tokens)
+        return None
+
+    def _enqueue(self, priority, waiter):
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        self._queued[priority] += 1
+        self._counters["queued"] += 1
+
+    def _grant_waiters(self):
+        while len(self._waiters) > 0 and self._in_flight < int(self._limit):
+            priority, _, waiter = heapq.heappop(self._waiters)
+            if waiter.state != "waiting":
+                continue # gave up (deadline / cancelled) - already taken off the counts
+            waiter.state = "granted"
+            waiter.epoch = self._epoch
+            self._queued[priority] -= 1
+            self._in_flight += 1
+            self._counters["granted"] += 1
+            waiter.wake()
+
+    def _claim(self, priority, waiter, tokens=None, raise_timeout=True, reason="timeouts"):
+        """ after waking up / timing out / cancelling - the permit if the slot was granted, otherwise give up the place in line """
+        waited = time.monotonic() - waiter.queued_at
+        with self._lock:
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+            if waiter.state == "granted":
+                return _Permit(self, priority, waiter.epoch, waited, tokens)
+            waiter.state = "abandoned"
+            self._queued[priority] -= 1
+            self._counters[reason] += 1
+        if raise_timeout:
+            raise LimiterTimeout(f"No API slot within {waited:.1f}s ({PRIORITY_NAMES.get(priority, priority)} request)")
+        return None
+
+    def _release(self, permit, error, latency):
+        with self._lock:
+            self._in_flight -= 1
+            if error is None:
+                samples = self._latencies[(permit.priority, permit.tokens is not None)]
+                latency = latency / permit.tokens if permit.tokens else latency
+                if self._is_slow(samples, latency):
+                    self._counters["slow_calls"] += 1
+                    self._decrease(permit)
+                else:
+                    samples.append(latency)
+                    # only grows while the limit is actually in the way, so quiet periods don't inflate it
+                    # - slow start (+1 per success) until the first cut, then additive: +1 per limit's worth of successes
+                    if len(self._waiters) > 0 or self._in_flight + 1 >= int(self._limit):
+                        step = 1.0 if self._epoch == 0 else 1.0 / self._limit
+                        self._limit = min(self.max_limit, self._limit + step)
+            elif getattr(error, "status_code", None) in OVERLOAD_STATUSES:
+                self._counters["overloads"] += 1
+                self._decrease(permit)
+            elif isinstance(error, Exception):
+                self._counters["errors"] += 1 # bad JSON, network error, ... - says nothing about capacity
+            self._grant_waiters()
+
+    def _release_unused(self):
+        # a permit that never made a call - frees the slot, no latency or outcome to learn from
+        with self._lock:
+            self._in_flight -= 1
+            self._grant_waiters()
+
+    def _is_slow(self, samples, latency):
+        # samples: recent latencies of the same kind of call (same priority, both per token or both per call)
+        if self.latency_tolerance is None or len(samples) < self.min_latency_samples:
+            return False
+        usual = sorted(samples)[len(samples) // 10]
+        return latency > usual * self.latency_tolerance
+
+    def _decrease(self, permit):
+        # multiplicative decrease - once per window: calls started before the last cut were already counted in it
+        if permit.epoch != self._epoch:
+            return
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        self._epoch += 1
+        self._counters["decreases"] += 1
+
+
+class _Permit:
+    """ one granted slot - released (with the call's outcome) when the `with` block ends """
+
+    __slots__ = ("limiter", "priority", "epoch", "waited", "tokens", "started", "released")
+
+    def __init__(self, limiter, priority, epoch, waited, tokens=None):
+        self.limiter = limiter
+        self.priority = priority
+        self.epoch = epoch
+        self.waited = waited
+        self.tokens = tokens if tokens and tokens > 0 else None
+        self.started = time.monotonic()
+        self.released = False
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.released == False:
+            self.released = True
+            self.limiter._release(self, exc_value, time.monotonic() - self.started)
+        return False
+
+    def discard(self):
+        """ give the slot back without a call (e.g. the caller was cancelled right after it was granted) """
+        if self.released == False:
+            self.released = True
+            self.limiter._release_unused()
+
+
+class _ThreadWaiter:
+    __slots__ = ("state", "epoch", "queued_at", "event")
+
+    def __init__(self):
+        self.state = "waiting"
+        self.epoch = 0
+        self.queued_at = time.monotonic()
+        self.event = threading.Event()
+
+    def wake(self):
+        self.event.set()
+
+
+class _AsyncWaiter:
+    __slots__ = ("state", "epoch", "queued_at", "loop", "future")
+
+    def __init__(self, loop):
+        self.state = "waiting"
+        self.epoch = 0
+        self.queued_at = time.monotonic()
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def wake(self):
+        # may be called from another thread or loop
+        self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class _NoLimit:
+    """ stand-in permit when the limiter is turned off """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def discard(self):
+        pass
+
+
+_NO_LIMIT = _NoLimit()
+_api_limiter = None
+_api_limiter_lock = threading.Lock()
+
+
+# functions
+def get_api_limiter():
+    """
+    the process-wide limiter for Anthropic calls, created on first use from environment variables
+    - QUIZ_LIMITER=0 turns it off, QUIZ_LIMITER_INITIAL (8), QUIZ_LIMITER_MIN (1), QUIZ_LIMITER_MAX (64),
+      QUIZ_LIMITER_LATENCY_TOLERANCE (3.0, 0 = ignore latency)
+    Needs to return:
+        the AdaptiveLimiter, or None when turned off
+    """
+    global _api_limiter
+    if _api_limiter is None:
+        with _api_limiter_lock:
+            if _api_limiter is None and os.getenv("QUIZ_LIMITER", "1") != "0":
+                tolerance = float(os.getenv("QUIZ_LIMITER_LATENCY_TOLERANCE", "3.0"))
+                _api_limiter = AdaptiveLimiter(
+                    initial_limit=int(os.getenv("QUIZ_LIMITER_INITIAL", "8")),
+                    min_limit=int(os.getenv("QUIZ_LIMITER_MIN", "1")),
+                    max_limit=int(os.getenv("QUIZ_LIMITER_MAX", "64")),
+                    latency_tolerance=tolerance if tolerance > 0 else None
+                )
+    return _api_limiter
+
+
+def api_slot(priority, cancel_event=None, tokens=None):
+    """ permit for one API call (threads) - a no-op when the limiter is off - tokens: the call's max_tokens """
+    limiter = get_api_limiter()
+    if limiter is None:
+        return _NO_LIMIT
+    return limiter.acquire(priority, cancel_event=cancel_event, tokens=tokens)
+
+
+async def api_slot_async(priority, tokens=None):
+    """ permit for one API call (asyncio) - a no-op when the limiter is off - tokens: the call's max_tokens """
+    limiter = get_api_limiter()
+    if limiter is None:
+        return _NO_LIMIT
+    return await limiter.acquire_async(priority, tokens=tokens)
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    # fake API that can serve 12 calls at once and answers 429 to anything over that
+    from concurrent.futures import ThreadPoolExecutor
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    capacity = 12
+    in_flight = [0]
+    in_flight_lock = threading.Lock()
+
+    def fake_call():
+        with in_flight_lock:
+            in_flight[0] += 1
+            over = in_flight[0] > capacity
+        try:
+            time.sleep(0.01 if over else 0.1)
+            if over:
+                raise RateLimited()
+        finally:
+            with in_flight_lock:
+                in_flight[0] -= 1
+
+    def run(limiter, callers=48, seconds=3.0):
+        done = [0, 0] # successes, 429s
+        stop = time.monotonic() + seconds
+
+        def worker(idx):
+            priority = PRIORITY_QUIZ if idx % 3 else PRIORITY_EXPLANATION
+            while time.monotonic() < stop:
+                try:
+                    if limiter is None:
+                        fake_call()
+                    else:
+                        with limiter.acquire(priority, timeout=5):
+                            fake_call()
+                    done[0] += 1
+                except RateLimited:
+                    done[1] += 1
+                    time.sleep(0.05) # what a retry would wait
+        with ThreadPoolExecutor(max_workers=callers) as pool:
+            list(pool.map(worker, range(callers)))
+        return done[0] / seconds, done[1] / seconds
+
+    ok, errors = run(None)
+    print(f"No limiter:       {ok:6.1f} calls/s, {errors:6.1f} 429s/s (ceiling {capacity / 0.1:.0f} calls/s)")
+    limiter = AdaptiveLimiter(initial_limit=4, latency_tolerance=None)
+    ok, errors = run(limiter)
+    print(f"Adaptive limiter: {ok:6.1f} calls/s, {errors:6.1f} 429s/s")
+    print(f"Stats: {limiter.stats()}")
@@ -0,0 +1,264 @@
+"""
+Hedging Module
+- Handles hedged requests: if an API call hasn't answered by the time most calls have
+  (a percentile of recent latencies), a second identical call is started - optionally on a
+  faster model - and whichever returns a valid quiz first wins. The other one is cancelled.
+- A global budget caps how many hedges can be in flight, so a slow API doesn't get twice the load.
+- Works for threads (generate_quiz) and asyncio (generate_quiz_async).
+
+Tiandra M Taylor
+"""
+
+# imports
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+
+
+class HedgeCancelled(Exception):
+    """ raised inside the losing attempt once the other one has won """
+
+
+class Hedger:
+    """
+    Hedged request runner + stats
+    - deadline(): percentile of the last `window` first-call latencies (default_deadline until min_samples are seen)
+    - run(attempt) / run_async(attempt): attempt(model, cancel_event, is_hedge) does one API call and returns
+      the result or raises - it should check cancel_event while streaming and raise HedgeCancelled;
+      is_hedge says which of the two calls it is (e.g. only the hedge takes its own rate limit tokens)
+    - hedge_model: model for the second call (None = same model as the first)
+    - max_in_flight: hedges allowed at the same time across the whole process
+    - stats(): calls / hedged / hedge_wins / budget_skips, hedge rate and (conservative) estimated seconds saved
+    """
+
+    def __init__(self, percentile=0.95, window=200, min_samples=20, default_deadline=20.0,
+                 max_in_flight=2, hedge_model=None):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_deadline = default_deadline
+        self.max_in_flight = max_in_flight
+        self.hedge_model = hedge_model
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "budget_skips": 0, "failures": 0}
+        self._seconds_saved = 0.0
+
+    def deadline(self):
+        """ seconds to wait for the first call before hedging """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.default_deadline
+        return samples[min(len(samples) - 1, int(len(samples) * self.percentile))]
+
+    def run(self, attempt, model):
+        """
+        hedged call for threads
+        Needs to return:
+            the first successful attempt's result - raises the first call's error if every attempt failed
+        """
+        self._count_call()
+        started = time.monotonic()
+        deadline = self.deadline()
+        results = queue.Queue()
+        cancels = []
+
+        def launch(attempt_model, is_hedge):
+            cancel_event = threading.Event()
+            cancels.append(cancel_event)
+            thread = threading.Thread(target=self._run_one, args=(attempt, attempt_model, cancel_event, is_hedge, results),
+                                      name="hedge" if is_hedge else "hedge-primary", daemon=True)
+            thread.start()
+
+        launch(model, False)
+        pending = 1
+        try:
+            outcome = results.get(timeout=deadline)
+        except queue.Empty:
+            outcome = None
+            if self._reserve_hedge():
+                launch(self.hedge_model or model, True)
+                pending += 1
+
+        first_error = None
+        while True:
+            if outcome is None:
+                outcome = results.get()
+            is_hedge, result, error, elapsed = outcome
+            pending -= 1
+            if error is None:
+                for cancel_event in cancels:
+                    cancel_event.set() # the loser stops at its next chunk and closes its connection
+                self._record_win(is_hedge, elapsed, time.monotonic() - started)
+                return result
+            if first_error is None or is_hedge == False:
+                first_error = error
+            if pending == 0:
+                self._record_failure()
+                raise first_error
+            outcome = None
+
+    async def run_async(self, attempt, model):
+        """
+        hedged call for asyncio - attempt(model, cancel_event, is_hedge) is a coroutine function,
+        the loser task is cancelled outright
+        - the hedge reservation is released here, not in the task - a task cancelled before it started
+          never runs its own finally
+        """
+        self._count_call()
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._run_one_async(attempt, model, False))
+        tasks = {primary}
+        hedge_reserved = False
+        first_error = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.deadline())
+            if len(done) == 0 and self._reserve_hedge():
+                hedge_reserved = True
+                tasks.add(asyncio.ensure_future(self._run_one_async(attempt, self.hedge_model or model, True)))
+
+            while len(tasks) > 0:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    is_hedge, result, error, elapsed = task.result()
+                    if error is None:
+                        self._record_win(is_hedge, elapsed, time.monotonic() - started)
+                        return result
+                    if first_error is None or is_hedge == False:
+                        first_error = error
+            self._record_failure()
+            raise first_error
+        finally:
+            # also covers the caller being cancelled while waiting - neither call is left running
+            for task in tasks:
+                task.cancel()
+            if hedge_reserved:
+                self._release_hedge()
+
+    def stats(self):
+        """ counters + hedge rate, hedge win rate and estimated latency saved """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight_hedges"] = self._in_flight
+            stats["seconds_saved"] = round(self._seconds_saved, 3)
+        stats["hedge_rate"] = stats["hedged"] / stats["calls"] if stats["calls"] else 0.0
+        stats["hedge_win_rate"] = stats["hedge_wins"] / stats["hedged"] if stats["hedged"] else 0.0
+        stats["deadline_seconds"] = round(self.deadline(), 3)
+        return stats
+
+    # helpers
+    def _count_call(self):
+        with self._lock:
+            self._counters["calls"] += 1
+
+    def _reserve_hedge(self):
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                self._counters["budget_skips"] += 1
+                return False
+            self._in_flight += 1
+            self._counters["hedged"] += 1
+            return True
+
+    def _release_hedge(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _run_one(self, attempt, model, cancel_event, is_hedge, results):
+        started = time.monotonic()
+        try:
+            result = attempt(model, cancel_event, is_hedge)
+            results.put((is_hedge, result, None, time.monotonic() - started))
+        except BaseException as e:
+            results.put((is_hedge, None, e, time.monotonic() - started))
+        finally:
+            if is_hedge:
+                self._release_hedge()
+
+    async def _run_one_async(self, attempt, model, is_hedge):
+        # the hedge reservation is released by run_async
+        started = time.monotonic()
+        try:
+            result = await attempt(model, asyncio.Event(), is_hedge)
+            return is_hedge, result, None, time.monotonic() - started
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return is_hedge, None, e, time.monotonic() - started
+
+    def _record_win(self, is_hedge, attempt_seconds, total_seconds):
+        # the deadline is based on first-call latencies - a first call that lost is recorded with the time
+        # it had run so far (it would have taken at least that long), so cancelled slow calls still count
+        with self._lock:
+            if is_hedge == False:
+                self._latencies.append(attempt_seconds)
+                return
+            self._counters["hedge_wins"] += 1
+            # estimated saving: average first-call latency among the ones slower than this, minus what we waited
+            # (conservative - the slowest first calls are exactly the ones that got cancelled)
+            slower = [latency for latency in self._latencies if latency > total_seconds]
+            if len(slower) > 0:
+                self._seconds_saved += sum(slower) / len(slower) - total_seconds
+            self._latencies.append(total_seconds)
+
+    def _record_failure(self):
+        with self._lock:
+            self._counters["failures"] += 1
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    import random
+
+    hedger = Hedger(default_deadline=0.15, min_samples=5, max_in_flight=1, percentile=0.9)
+
+    def fake_attempt(model, cancel_event, is_hedge):
+        # mostly fast, sometimes very slow - the slow ones check for cancellation like a stream would
+        latency = 0.05 if random.random() < 0.8 else 1.0
+        end = time.monotonic() + latency
+        while time.monotonic() < end:
+            if cancel_event.is_set():
+                raise HedgeCancelled()
+            time.sleep(0.01)
+        return f"quiz from {model}"
+
+    random.seed(3)
+    start = time.perf_counter()
+    for _ in range(30):
+        hedger.run(fake_attempt, "sonnet")
+    print(f"30 sync calls in {time.perf_counter() - start:.2f}s: {hedger.stats()}")
+
+    async def fake_attempt_async(model, cancel_event, is_hedge):
+        await asyncio.sleep(0.05 if random.random() < 0.8 else 1.0)
+        return f"quiz from {model}"
+
+    async def main():
+        return await asyncio.gather(*[hedger.run_async(fake_attempt_async, "sonnet") for _ in range(10)])
+
+    asyncio.run(main())
+    print(f"+10 async calls: {hedger.stats()}")
+
+    # a caller that gives up mid-call - both calls are cancelled and the hedge slot is given back
+    started_calls = []
+
+    async def slow_attempt_async(model, cancel_event, is_hedge):
+        started_calls.append(is_hedge)
+        await asyncio.sleep(10)
+
+    async def give_up(after):
+        try:
+            await asyncio.wait_for(hedger.run_async(slow_attempt_async, "sonnet"), timeout=after)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0) # let the cancelled tasks finish
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    for after in (hedger.deadline() / 2, hedger.deadline() + 0.05): # before / after the hedge is sent
+        started_calls.clear()
+        leftover = asyncio.run(give_up(after))
+        assert hedger.stats()["in_flight_hedges"] == 0 and leftover == [], (hedger.stats(), leftover)
+        print(f"caller cancelled after {after:.2f}s: calls started {started_calls}, nothing left running")
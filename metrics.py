@@ -0,0 +1,275 @@
+"""
+Metrics Module
+- Handles timing spans, counters and histograms for the generation and grading hot paths.
+- Events go to pluggable sinks: PrometheusSink keeps aggregates and renders the Prometheus text
+  format (served on /metrics by quiz_service.py, or on its own port for the Streamlit app),
+  JsonlSink appends one JSON line per event for offline analysis.
+- With no sinks attached (the default) span() hands back a shared no-op object and count() returns
+  right away, so leaving the instrumentation in costs next to nothing.
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# latency buckets in seconds - API calls take seconds, parsing / grading take micro to milliseconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+class Metrics:
+    """
+    Instrumentation front end - every module uses the shared METRICS instance
+    - span(name, **labels): `with` block timer, emits "<name>_seconds" with a status label (ok / error)
+    - count(name, amount, **labels): counter increment
+    - add_sink() / remove_sink(): sinks get every event as a dict
+      {"type": "span" | "counter", "name", "labels", "value", "time"}
+    """
+
+    def __init__(self):
+        self._sinks = ()
+
+    @property
+    def enabled(self):
+        return len(self._sinks) > 0
+
+    def add_sink(self, sink):
+        self._sinks = self._sinks + (sink,) # replaced, never mutated - emitters can iterate without a lock
+
+    def remove_sink(self, sink):
+        self._sinks = tuple(existing for existing in self._sinks if existing is not sink)
+
+    def span(self, name, **labels):
+        """ time a block of code """
+        if not self._sinks:
+            return _NOOP_SPAN
+        return _Span(self, name, labels)
+
+    def count(self, name, amount=1, **labels):
+        """ add to a counter """
+        if not self._sinks or amount == 0:
+            return
+        self._emit({"type": "counter", "name": name, "labels": labels, "value": amount, "time": time.time()})
+
+    def _emit(self, event):
+        for sink in self._sinks:
+            try:
+                sink.emit(event)
+            except Exception as e:
+                print(f" Metrics sink {type(sink).__name__} failed: {e}")
+
+
+class _Span:
+    """ one timed block - emits its duration on exit """
+
+    __slots__ = ("metrics", "name", "labels", "started")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        labels = dict(self.labels, status="ok" if exc_type is None else "error")
+        self.metrics._emit({"type": "span", "name": f"{self.name}_seconds", "labels": labels,
+                            "value": time.perf_counter() - self.started, "time": time.time()})
+        return False
+
+
+class _NoopSpan:
+    """ what span() returns while metrics are off - nothing to time, nothing to emit """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class PrometheusSink:
+    """
+    In-memory aggregation rendered as Prometheus text (exposition format 0.0.4)
+    - spans become histograms (buckets / sum / count), counters become counters
+    - render() for an existing HTTP server, serve(port) to start a small one in a background thread
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, label items) -> value
+        self._histograms = {}  # (name, label items) -> [bucket counts..., +Inf count, sum]
+        self._server = None
+
+    def emit(self, event):
+        key = (event["name"], tuple(sorted(event["labels"].items())))
+        value = event["value"]
+        with self._lock:
+            if event["type"] == "counter":
+                self._counters[key] = self._counters.get(key, 0) + value
+                return
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[idx] += 1
+                    break
+            else:
+                histogram[len(self.buckets)] += 1
+            histogram[-1] += value
+
+    def render(self):
+        """ current state in the Prometheus text format """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        lines = []
+        for name in sorted(set(key[0] for key in counters)):
+            lines.append(f"# TYPE {name} counter")
+            for (metric_name, labels), value in sorted(counters.items()):
+                if metric_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name in sorted(set(key[0] for key in histograms)):
+            lines.append(f"# TYPE {name} histogram")
+            for (metric_name, labels), values in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), values[:-1]):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """ expose render() on http://host:port/metrics from a daemon thread (no-op if already serving) """
+        if self._server is not None:
+            return self._server
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass # scrapes every few seconds would flood the console
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f" Metrics on http://{host}:{port}/metrics")
+        return self._server
+
+
+class JsonlSink:
+    """
+    Appends every event as one JSON line - line buffered, so a crash loses at most the current line
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def emit(self, event):
+        line = json.dumps(event, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def _format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    escaped = ",".join(f'{name}="{str(value)}"'.replace("\n", " ") for name, value in labels)
+    return "{" + escaped + "}"
+
+
+def configure_from_env():
+    """
+    attach sinks from environment variables (safe to call more than once - only configures the first time)
+    - QUIZ_METRICS=prometheus,jsonl   which sinks to use (default: none - metrics off)
+    - QUIZ_METRICS_JSONL=metrics.jsonl   file for the JSONL sink
+    - QUIZ_METRICS_PORT=9100   also serve the Prometheus text on its own port (for the Streamlit app)
+    Needs to return:
+        the PrometheusSink if one was configured (so a server can expose it), otherwise None
+    """
+    global _configured_prometheus
+    with _configure_lock:
+        if _configured:
+            return _configured_prometheus
+        _configured.append(True)
+        names = [name.strip() for name in os.getenv("QUIZ_METRICS", "").split(",") if name.strip() != ""]
+        if "prometheus" in names:
+            _configured_prometheus = PrometheusSink()
+            METRICS.add_sink(_configured_prometheus)
+            if os.getenv("QUIZ_METRICS_PORT"):
+                _configured_prometheus.serve(int(os.getenv("QUIZ_METRICS_PORT")))
+        if "jsonl" in names:
+            METRICS.add_sink(JsonlSink(os.getenv("QUIZ_METRICS_JSONL", "metrics.jsonl")))
+        return _configured_prometheus
+
+
+# shared by every module in this process
+METRICS = Metrics()
+_configure_lock = threading.Lock()
+_configured = []
+_configured_prometheus = None
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    iterations = 200000
+
+    # overhead while disabled - what every instrumented call pays by default
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with METRICS.span("noop", call="quiz"):
+            pass
+        METRICS.count("noop_total", call="quiz")
+    disabled_ns = (time.perf_counter() - start) / iterations * 1e9
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    baseline_ns = (time.perf_counter() - start) / iterations * 1e9
+    print(f"Disabled: {disabled_ns - baseline_ns:.0f} ns per span + counter")
+
+    prometheus = PrometheusSink()
+    METRICS.add_sink(prometheus)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with METRICS.span("noop", call="quiz"):
+            pass
+        METRICS.count("noop_total", call="quiz")
+    print(f"Prometheus sink: {(time.perf_counter() - start) / iterations * 1e9:.0f} ns per span + counter")
+
+    with METRICS.span("api_call", call="quiz", model="claude-sonnet-4-20250514"):
+        time.sleep(0.02)
+    METRICS.count("attempt_failures_total", failure="json_error")
+    print(prometheus.render()[-600:])
@@ -0,0 +1,152 @@
+"""
+Prefetch Module
+- Handles speculative generation of the next quiz while the user is still answering the current one.
+  Most users retake the same topic, so by the time they click "Take Another Quiz" a fresh quiz is ready.
+- One slot per session, a cap on how much speculative work runs at once, and sessions that go
+  quiet (closed tab) are expired so their prefetches are dropped.
+- Every prefetch that is never served is counted as wasted, so max_outstanding / ttl can be tuned.
+
+Tiandra M Taylor
+"""
+
+# imports
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from quiz_cache import normalize_topic
+
+
+class Prefetcher:
+    """
+    Per-session speculative quiz slots
+    - schedule(session_id, topic, fn, ...) runs fn in the background unless the session already has
+      a prefetch for that topic or max_outstanding prefetches are already running
+    - take(session_id, topic) hands over the prefetched quiz (waits for it if it's still running -
+      it's already paid for and further along than a new call would be)
+    - touch(session_id) on every rerun, sessions not touched for ttl_seconds are cancelled
+    - stats(): scheduled / used / wasted / skipped / failed / outstanding
+    """
+
+    def __init__(self, max_outstanding=4, max_workers=2, ttl_seconds=900):
+        self.max_outstanding = max_outstanding
+        self.ttl_seconds = ttl_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._slots = {}      # session id -> (topic key, future)
+        self._last_seen = {}  # session id -> monotonic time of the last touch()
+        self._counters = {"scheduled": 0, "used": 0, "wasted": 0, "skipped": 0, "failed": 0}
+
+    def touch(self, session_id):
+        """ session is still alive - also expires sessions that aren't """
+        now = time.monotonic()
+        with self._lock:
+            self._last_seen[session_id] = now
+            expired = [sid for sid, seen in self._last_seen.items() if now - seen > self.ttl_seconds]
+        for sid in expired:
+            self.cancel(sid)
+
+    def schedule(self, session_id, topic, fn, *args, **kwargs):
+        """
+        start fn(*args, **kwargs) in the background for this session + topic
+        Needs to return:
+            True if a prefetch was started, False if one already exists or the cap was hit
+        """
+        topic_key = normalize_topic(topic)
+        with self._lock:
+            slot = self._slots.get(session_id)
+            if slot is not None and slot[0] == topic_key:
+                return False
+            outstanding = sum(1 for _, future in self._slots.values() if not future.done())
+            if outstanding >= self.max_outstanding:
+                self._counters["skipped"] += 1
+                return False
+            if slot is not None:
+                self._drop(slot) # user moved on to another topic - old prefetch is wasted
+            future = self._pool.submit(fn, *args, **kwargs)
+            self._slots[session_id] = (topic_key, future)
+            self._last_seen.setdefault(session_id, time.monotonic())
+            self._counters["scheduled"] += 1
+        future.add_done_callback(self._on_done)
+        return True
+
+    def take(self, session_id, topic, timeout=None):
+        """
+        prefetched quiz for this session + topic
+        Needs to return:
+            the quiz, or None if there is none (or it failed)
+        """
+        topic_key = normalize_topic(topic)
+        with self._lock:
+            slot = self._slots.get(session_id)
+            if slot is None or slot[0] != topic_key:
+                return None
+            del self._slots[session_id]
+
+        try:
+            quiz = slot[1].result(timeout)
+        except Exception as e:
+            print(f" Prefetch for '{topic}' failed: {e}")
+            return None
+        if quiz is None:
+            return None
+        with self._lock:
+            self._counters["used"] += 1
+        return quiz
+
+    def cancel(self, session_id):
+        """ session ended - drop its prefetch (cancelled if it hasn't started yet) """
+        with self._lock:
+            self._last_seen.pop(session_id, None)
+            slot = self._slots.pop(session_id, None)
+            if slot is not None:
+                self._drop(slot)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["outstanding"] = sum(1 for _, future in self._slots.values() if not future.done())
+            stats["sessions"] = len(self._last_seen)
+            return stats
+
+    def shutdown(self):
+        """ cancel everything queued, don't wait for running calls """
+        with self._lock:
+            for slot in self._slots.values():
+                self._drop(slot)
+            self._slots = {}
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # helpers
+    def _drop(self, slot):
+        # caller holds the lock - a queued prefetch is cancelled for free, anything else was wasted work
+        if slot[1].cancel() == False:
+            self._counters["wasted"] += 1
+
+    def _on_done(self, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None or future.result() is None:
+            with self._lock:
+                self._counters["failed"] += 1
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    def slow_generate(topic):
+        time.sleep(0.2) # pretend this is the API call
+        return {"topic": topic, "questions": []}
+
+    prefetcher = Prefetcher(max_outstanding=2, ttl_seconds=0.5)
+    prefetcher.touch("alice")
+    print(f"Schedule alice: {prefetcher.schedule('alice', 'Photosynthesis', slow_generate, 'Photosynthesis')}")
+    print(f"Schedule again: {prefetcher.schedule('alice', 'photosynthesis ', slow_generate, 'Photosynthesis')}")
+    print(f"Schedule bob: {prefetcher.schedule('bob', 'Ancient Rome', slow_generate, 'Ancient Rome')}")
+    print(f"Schedule carol (cap of 2): {prefetcher.schedule('carol', 'Python', slow_generate, 'Python')}")
+    print(f"Alice takes: {prefetcher.take('alice', 'Photosynthesis')}")
+
+    time.sleep(0.6) # bob never comes back
+    prefetcher.touch("alice")
+    print(f"Stats: {prefetcher.stats()}")
+    prefetcher.shutdown()
@@ -0,0 +1,305 @@
+"""
+Question Bank Module
+- Handles keeping every validated question we've paid to generate, so quizzes can be assembled
+  from the bank instead of calling the API again.
+- Questions are indexed by normalized topic. Near-duplicates are rejected at insert time with a
+  MinHash signature + LSH band index (both stored in SQLite with indexes), so a duplicate check is a
+  handful of indexed lookups no matter how big the bank gets.
+
+Tiandra M Taylor
+"""
+
+# imports
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+from quiz_cache import normalize_topic
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+# functions
+def shingles(question_dict, size=3):
+    """
+    word shingles of the question + its correct answer (normalized) - what near-duplicate means here
+    """
+    correct_text = question_dict["options"].get(question_dict["correct_answer"], "")
+    words = re.findall(r"[a-z0-9]+", f"{question_dict['question']} {correct_text}".lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def stable_hash(text, size=8):
+    """ hash that is the same in every process (python's hash() isn't) """
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=size).digest(), "little", signed=True)
+
+
+class MinHasher:
+    """
+    MinHash signatures with num_perm universal hash functions (a*x + b mod p), fixed seed so
+    signatures stored on disk stay comparable between runs
+    """
+
+    def __init__(self, num_perm=64, seed=7):
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = generator.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        """ uint32 signature vector for a set of shingles """
+        values = np.array([stable_hash(shingle, 4) & MAX_HASH for shingle in shingle_set], dtype=np.uint64)
+        # (num_perm x shingles) hashes - 32 bit inputs keep a*x + b inside uint64
+        hashed = (self._a[:, np.newaxis] * values[np.newaxis, :] + self._b[:, np.newaxis]) % MERSENNE_PRIME
+        return (hashed.min(axis=1) & MAX_HASH).astype(np.uint32)
+
+
+class QuestionBank:
+    """
+    SQLite backed question bank
+    - add_quiz() / add_question() store validated questions, rejecting near-duplicates in the same topic
+      (estimated Jaccard similarity >= threshold)
+    - assemble_quiz() builds a quiz for a topic from the least served questions, or returns None
+      if there aren't enough fresh ones (then generate a new quiz and add it)
+    """
+
+    def __init__(self, db_path="question_bank.db", num_perm=64, bands=16, threshold=0.7):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        self._counters = {"added": 0, "duplicates": 0, "assembled": 0, "not_enough": 0}
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                question_json TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                served_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_questions_topic_served ON questions (topic, served_count);
+            CREATE TABLE IF NOT EXISTS lsh_bands (
+                band_key INTEGER NOT NULL,
+                question_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_lsh_bands_key ON lsh_bands (band_key);
+            """
+        )
+        self._db.commit()
+
+    def add_question(self, topic, question_dict):
+        """
+        store one validated question
+        Needs to return:
+            tuple (added: bool, question id - the new one, or the id of the near-duplicate that blocked it)
+        """
+        return self._add_questions(topic, [question_dict])[0]
+
+    def add_quiz(self, quiz_data):
+        """
+        store every question of a generated quiz - in one transaction, committed once
+        Needs to return:
+            list of bank ids, one per question (the existing id for near-duplicates)
+        """
+        return [question_id for _, question_id in self._add_questions(quiz_data["topic"], quiz_data["questions"])]
+
+    def is_duplicate(self, topic, question_dict):
+        """ would this question be rejected as a near-duplicate? """
+        signature = self._hasher.signature(shingles(question_dict))
+        with self._lock:
+            return self._find_duplicate(self._band_keys(normalize_topic(topic), signature), signature) is not None
+
+    def count(self, topic=None):
+        """ questions in the bank (for one topic or all) """
+        with self._lock:
+            if topic is None:
+                return self._db.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM questions WHERE topic = ?", (normalize_topic(topic),)).fetchone()[0]
+
+    def topics(self):
+        """ every topic key in the bank (e.g. to seed a TopicNormalizer) """
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT topic FROM questions")]
+
+    def assemble_quiz(self, topic, num_questions=5, exclude_ids=None, require_explanations=False):
+        """
+        build a quiz for the topic straight from the bank
+        - picks at random among the least served questions, skipping exclude_ids (e.g. ones this user already saw)
+        - require_explanations: only questions stored with an explanation (e.g. /generate with include_explanations)
+        - quiz["bank_ids"] lists the ids used so the caller can exclude them next time
+        Needs to return:
+            quiz dict in the usual format, or None if there aren't num_questions fresh questions
+        """
+        with self._lock:
+            rows = self._fresh_rows(topic, num_questions, exclude_ids, require_explanations)
+            if len(rows) < num_questions:
+                self._counters["not_enough"] += 1
+                return None
+
+            chosen = random.sample(rows[:num_questions * 4], num_questions)
+            self._db.executemany("UPDATE questions SET served_count = served_count + 1 WHERE id = ?",
+                                 [(row[0],) for row in chosen])
+            self._db.commit()
+            self._counters["assembled"] += 1
+
+        return {
+            "topic": topic,
+            "questions": [json.loads(row[1]) for row in chosen],
+            "bank_ids": [row[0] for row in chosen]
+        }
+
+    def can_assemble(self, topic, num_questions=5, exclude_ids=None, require_explanations=False):
+        """ would assemble_quiz() succeed? (doesn't serve anything or touch the counters) """
+        with self._lock:
+            return len(self._fresh_rows(topic, num_questions, exclude_ids, require_explanations)) >= num_questions
+
+    def import_jsonl(self, path):
+        """ load quizzes from a JSONL file (e.g. bulk_generate.py output) - returns questions added """
+        added_before = self.stats()["added"]
+        with open(path, encoding="utf-8") as jsonl_file:
+            for line in jsonl_file:
+                try:
+                    quiz_data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(quiz_data, dict) and "topic" in quiz_data and "questions" in quiz_data:
+                    self.add_quiz(quiz_data)
+        return self.stats()["added"] - added_before
+
+    def stats(self):
+        """ added / duplicate / assembled counters """
+        with self._lock:
+            return dict(self._counters)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # helpers
+    def _band_keys(self, topic_key, signature):
+        # one key per band, scoped to the topic so the same question in two topics isn't a duplicate
+        keys = []
+        for band in range(self.bands):
+            band_bytes = signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()
+            keys.append(stable_hash(f"{topic_key}|{band}|{band_bytes.hex()}"))
+        return keys
+
+    def _fresh_rows(self, topic, num_questions, exclude_ids, require_explanations=False):
+        # caller holds the lock - uses the (topic, served_count) index, only reads a small window of the least served rows
+        exclude_ids = set(exclude_ids or ())
+        explained = " AND json_extract(question_json, '$.explanation') IS NOT NULL" if require_explanations else ""
+        rows = self._db.execute(
+            f"SELECT id, question_json FROM questions WHERE topic = ?{explained} ORDER BY served_count LIMIT ?",
+            (normalize_topic(topic), num_questions * 4 + len(exclude_ids))
+        ).fetchall()
+        return [row for row in rows if row[0] not in exclude_ids]
+
+    def _add_questions(self, topic, question_dicts):
+        # near-duplicates within the batch are caught too - uncommitted rows are visible on this connection
+        topic_key = normalize_topic(topic)
+        prepared = []
+        for question_dict in question_dicts:
+            signature = self._hasher.signature(shingles(question_dict))
+            prepared.append((signature, self._band_keys(topic_key, signature), json.dumps(question_dict)))
+
+        with self._lock:
+            results = []
+            try:
+                for signature, band_keys, question_json in prepared:
+                    duplicate_id = self._find_duplicate(band_keys, signature)
+                    if duplicate_id is not None:
+                        results.append((False, duplicate_id))
+                        continue
+                    cursor = self._db.execute(
+                        "INSERT INTO questions (topic, question_json, signature, created_at) VALUES (?, ?, ?, ?)",
+                        (topic_key, question_json, signature.tobytes(), time.time())
+                    )
+                    question_id = cursor.lastrowid
+                    self._db.executemany("INSERT INTO lsh_bands (band_key, question_id) VALUES (?, ?)",
+                                         [(band_key, question_id) for band_key in band_keys])
+                    results.append((True, question_id))
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+            added = sum(1 for was_added, _ in results if was_added)
+            self._counters["added"] += added
+            self._counters["duplicates"] += len(results) - added
+            return results
+
+    def _find_duplicate(self, band_keys, signature):
+        # caller holds the lock - candidates share at least one band, then check the real similarity
+        placeholders = ",".join("?" * len(band_keys))
+        candidate_rows = self._db.execute(
+            f"SELECT DISTINCT question_id FROM lsh_bands WHERE band_key IN ({placeholders})", band_keys
+        ).fetchall()
+        if len(candidate_rows) == 0:
+            return None
+        candidate_ids = [row[0] for row in candidate_rows]
+        placeholders = ",".join("?" * len(candidate_ids))
+        for question_id, blob in self._db.execute(f"SELECT id, signature FROM questions WHERE id IN ({placeholders})", candidate_ids):
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            if similarity >= self.threshold:
+                return question_id
+        return None
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    import os
+    import tempfile
+
+    bank = QuestionBank(os.path.join(tempfile.mkdtemp(), "bank.db"))
+    question = {"question": "What is the primary pigment used by plants in photosynthesis?",
+                "options": {"A": "Carotene", "B": "Chlorophyll", "C": "Xanthophyll", "D": "Anthocyanin"},
+                "correct_answer": "B"}
+    near_duplicate = dict(question, question="What is the primary pigment used by plants during photosynthesis?")
+    print(f"Add: {bank.add_question('Photosynthesis', question)}")
+    print(f"Near-duplicate rejected: {bank.add_question('photosynthesis ', near_duplicate)}")
+
+    # grow the bank and time the hot paths
+    words = ["cell", "energy", "light", "plant", "water", "carbon", "oxygen", "sugar", "leaf", "root", "sun", "gas"]
+    generator = random.Random(1)
+    start = time.perf_counter()
+    for i in range(20000):
+        text = " ".join(generator.choice(words) for _ in range(10)) + f" number {i}?"
+        bank.add_question(f"topic {i % 200}", {"question": text, "options": {"A": "a", "B": "b", "C": "c", "D": "d"}, "correct_answer": "A"})
+    print(f"Inserted 20000 questions in {time.perf_counter() - start:.1f}s ({bank.count()} kept, {bank.stats()['duplicates']} duplicates)")
+
+    # the same again as 4000 quizzes of 5 - one commit per quiz instead of per question
+    start = time.perf_counter()
+    for i in range(4000):
+        questions = [{"question": " ".join(generator.choice(words) for _ in range(10)) + f" quiz {i} number {j}?",
+                      "options": {"A": "a", "B": "b", "C": "c", "D": "d"}, "correct_answer": "A"} for j in range(5)]
+        bank.add_quiz({"topic": f"quiz topic {i % 200}", "questions": questions})
+    print(f"Inserted 4000 quizzes of 5 in {time.perf_counter() - start:.1f}s ({bank.count()} kept)")
+    quiz_ids = bank.add_quiz({"topic": "Photosynthesis", "questions": [question, near_duplicate]})
+    print(f"Quiz of two near-duplicates: {quiz_ids}")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        bank.is_duplicate("topic 5", near_duplicate)
+    print(f"Duplicate check: {(time.perf_counter() - start):.3f} ms average")
+
+    start = time.perf_counter()
+    for i in range(1000):
+        bank.assemble_quiz(f"topic {i % 200}")
+    print(f"Assemble quiz: {(time.perf_counter() - start):.3f} ms average")
+    bank.close()
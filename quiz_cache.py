@@ -0,0 +1,239 @@
+"""
+Quiz Cache Module
+- Handles caching of generated quizzes so popular topics don't need a new API call every time.
+
+Tiandra M Taylor
+"""
+
+# imports
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from topic_normalizer import canonical_form
+
+
+# functions
+def normalize_topic(topic):
+    """
+    fold a topic into the form used for cache keys (and bank, results, snapshot keys)
+    - "Photosynthesis", "photosynthesis basics" and "PHOTOSYNTHESIS!" are all the same key
+    - a pure function of the topic: same key in every process, whatever was seen before
+      (typo matching is TopicNormalizer.match_topic's job, on the topic before it gets here)
+    """
+    return canonical_form(topic)
+
+
+def make_cache_key(topic, model, temperature, num_questions, include_explanations=False):
+    """
+    build the cache key from the normalized topic + everything that changes what the model generates
+    """
+    key = f"{normalize_topic(topic)}|{model}|{float(temperature)}|{int(num_questions)}"
+    if include_explanations:
+        key += "|explained"
+    return key
+
+
+class QuizCache:
+    """
+    Two tier quiz cache
+    - memory tier: LRU with a TTL, lives for the life of the process (fast - no disk or parsing of the db)
+    - disk tier: SQLite file, survives Streamlit restarts
+    - variants: keep up to K different quizzes per key and serve a random one,
+      so repeat users don't always get the exact same quiz. Until K variants exist the
+      lookup counts as a miss so the caller generates (and stores) another one.
+    - counters for hits / misses / evictions are in stats() so the cache can be sized
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, db_path="quiz_cache.db",
+                 disk_ttl_seconds=7 * 24 * 3600, max_disk_entries=10000, variants=1):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_ttl_seconds = disk_ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.variants = max(1, int(variants))
+
+        # key -> (expires_at, {variant slot: quiz json string}) - most recently used at the end
+        # slots are the disk rows' variant numbers, so a put always writes back to the slot it replaced in memory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "memory_expirations": 0,
+            "disk_evictions": 0,
+            "stores": 0,
+        }
+
+        # db_path=None turns off the disk tier (memory only)
+        self._db = None
+        if db_path is not None:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS quiz_cache (
+                    cache_key TEXT NOT NULL,
+                    variant INTEGER NOT NULL,
+                    quiz_json TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (cache_key, variant)
+                )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_quiz_cache_created ON quiz_cache (created_at)")
+            self._db.commit()
+
+    def get(self, key):
+        """
+        look up a quiz for the key
+        Needs to return:
+            a fresh copy of one of the cached quiz dicts, or None on a miss
+        """
+        with self._lock:
+            now = time.time()
+            entry = self._memory.get(key)
+
+            if entry is not None and entry[0] <= now:
+                # expired in memory - drop it and fall through to disk
+                del self._memory[key]
+                self._counters["memory_expirations"] += 1
+                entry = None
+
+            if entry is not None:
+                variants = entry[1]
+                if len(variants) >= self.variants:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return json.loads(random.choice(list(variants.values())))
+                self._counters["misses"] += 1
+                return None
+
+            # memory miss - try the disk tier and promote what's there
+            variants = self._load_from_disk(key, now)
+            if len(variants) > 0:
+                self._remember(key, variants, now)
+            if len(variants) >= self.variants:
+                self._counters["disk_hits"] += 1
+                return json.loads(random.choice(list(variants.values())))
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key, quiz_data):
+        """
+        store a newly generated quiz under the key
+        - adds a variant until K exist, after that replaces a random one so the pool keeps rotating
+        - a new variant takes the lowest free slot (e.g. one whose disk row expired), never one in use
+        """
+        quiz_json = json.dumps(quiz_data)
+        with self._lock:
+            now = time.time()
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                variants = dict(entry[1])
+            else:
+                variants = self._load_from_disk(key, now)
+
+            if len(variants) < self.variants:
+                slot = min(slot for slot in range(self.variants) if slot not in variants)
+            else:
+                slot = random.randrange(self.variants)
+            variants[slot] = quiz_json
+
+            self._remember(key, variants, now)
+            self._counters["stores"] += 1
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO quiz_cache (cache_key, variant, quiz_json, created_at) VALUES (?, ?, ?, ?)",
+                    (key, slot, quiz_json, now)
+                )
+                self._trim_disk()
+                self._db.commit()
+
+    def stats(self):
+        """
+        hit / miss / eviction counters plus current sizes
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._count_disk()
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            if lookups > 0:
+                stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups
+            else:
+                stats["hit_rate"] = 0.0
+            return stats
+
+    def clear(self):
+        """ empty both tiers (counters are kept) """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM quiz_cache")
+                self._db.commit()
+
+    def close(self):
+        """ close the disk tier """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # helpers - caller must hold the lock
+    def _remember(self, key, variants, now):
+        self._memory[key] = (now + self.ttl_seconds, variants)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False) # least recently used is at the front
+            self._counters["memory_evictions"] += 1
+
+    def _load_from_disk(self, key, now):
+        # {slot: quiz json} - slots at or above self.variants (a run with a bigger K) are ignored
+        if self._db is None:
+            return {}
+        query = "SELECT variant, quiz_json FROM quiz_cache WHERE cache_key = ? AND variant < ?"
+        params = [key, self.variants]
+        if self.disk_ttl_seconds is not None:
+            query += " AND created_at > ?"
+            params.append(now - self.disk_ttl_seconds)
+        return dict(self._db.execute(query, params).fetchall())
+
+    def _trim_disk(self):
+        if self.disk_ttl_seconds is not None:
+            self._db.execute("DELETE FROM quiz_cache WHERE created_at <= ?", (time.time() - self.disk_ttl_seconds,))
+        overflow = self._count_disk() - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM quiz_cache WHERE rowid IN (SELECT rowid FROM quiz_cache ORDER BY created_at LIMIT ?)",
+                (overflow,)
+            )
+            self._counters["disk_evictions"] += overflow
+
+    def _count_disk(self):
+        if self._db is None:
+            return 0
+        return self._db.execute("SELECT COUNT(*) FROM quiz_cache").fetchone()[0]
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    cache = QuizCache(max_entries=2, db_path=None, variants=2)
+    fake_quiz = {"topic": "Test Topic", "questions": []}
+
+    key = make_cache_key("  Photosynthesis ", "claude-sonnet-4-20250514", 0.8, 5)
+    print(f"Key: {key}")
+    print(f"First lookup (expect None): {cache.get(key)}")
+    cache.put(key, fake_quiz)
+    print(f"Only 1 of 2 variants stored (expect None): {cache.get(key)}")
+    cache.put(key, {"topic": "Test Topic", "questions": [], "variant": 2})
+    print(f"Lookup with 2 variants: {cache.get(key)}")
+
+    cache.put("other-1", fake_quiz)
+    cache.put("other-2", fake_quiz) # pushes the first key out of the 2 entry memory tier
+    print(f"Stats: {cache.stats()}")
@@ -7,34 +7,80 @@ Tiandra M Taylor
 
 # Imports
 import anthropic as anth
+import asyncio
+import functools
 import json
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from quiz_cache import make_cache_key
+from quiz_parser import strip_code_fences, salvage_questions, decode_compact_question, QuestionStreamParser
+from client_provider import get_client, get_async_client
+from hedging import HedgeCancelled
+from metrics import METRICS
+from concurrency_limiter import api_slot, api_slot_async, LimiterTimeout, PRIORITY_QUIZ, PRIORITY_EXPLANATION
+
+# generation settings - also part of the quiz cache key
+QUIZ_MODEL = "claude-sonnet-4-20250514"  # Latest Sonnet model
+QUIZ_TEMPERATURE = 0.8
+NUM_QUESTIONS = 5 # default quiz length
+CHUNK_SIZE = 5 # most questions asked for in one API call - longer quizzes are split into chunks generated at the same time
+MAX_PARALLEL_CHUNKS = 10 # chunks in flight at once for one quiz (50 questions = 10 chunks = about one call's wall time)
+CHUNK_ROUNDS = 2 # rounds for chunks that still failed / came up short after their own retries
+# per chunk hints so chunks of one long quiz don't all ask the same questions
+CHUNK_FOCUS = (
+    "definitions and key terms",
+    "core concepts and how they work",
+    "history, origins and key people",
+    "real world applications and examples",
+    "common misconceptions",
+    "comparisons and relationships between ideas",
+    "causes and effects",
+    "problem solving and applying the ideas",
+    "important details and facts",
+    "advanced and less well known aspects"
+)
+CHUNK_DIFFICULTY = ("easy", "medium", "hard")
+DEFAULT_TOKENS_PER_QUESTION = 400 # max_tokens per question until real output lengths have been seen (5 x 400 = 2000)
+EXPLANATION_MAX_TOKENS = 200 # only short explanations
+BACKOFF_CAP = 10.0 # longest wait between retries in seconds
 
 # Functions
-def generate_quiz(topic, api_key, max_retries=3):
+def build_quiz_system_prompt(include_explanations=False, compact=False):
     """
-    Generate mulitple choice quz about user given topic using Claude
-    Function needs to handle
-    - create specific prompt for quiz generation
-    - call API
-    - parse through and validate response
-    - auto retry if quiz generation fails
-    - Notes:
-        - return quiz data in JSON
-        - model? probably claude-sonnet-4 (speed and accuracy balance)
-        - max_toxens? 2000 - enough for 5 questions per quiz but not wasteful 
-        - temperature? 0.7 - 1? balance for creativity and coherence
+    static quiz instructions + output format - the same text for every topic, so it goes in the
+    system prompt (see quiz_system_blocks) and the per-topic user message stays small
+    - include_explanations adds a short explanation per question so no separate explanation calls are needed later
+    - compact asks for the short positional format (see quiz_parser.decode_compact_question) - far fewer output tokens
     """
-    connection = anth.Anthropic(api_key=api_key)
-
-    # specify all prompt requirements
-    prompt = f"""Generate a multiple choice quiz about the topic: {topic}
+    explanation_requirement = ""
+    if include_explanations:
+        explanation_requirement = "\n    - Each question MUST have a short explanation (1-2 sentences) of why the correct answer is correct"
+    requirements = f"""You write multiple choice quizzes about the topic the user gives you.
     Requirements:
-    - Create EXACTLY 5 questions
+    - Create EXACTLY 5 questions, unless the user asks for a different number
     - Each question MUST have EXACTLY 4 answer options labeled A, B, C, D
     - Each question MUST have ONLY 1 correct answer
     - Questions should be educational and factually accurate
     - Vary difficulty from easier to hard questions
+    - Never repeat a question the user lists as already existing{explanation_requirement}
+"""
+    if compact:
+        return requirements + "\n" + compact_format_rules(include_explanations)
 
+    answer_comma = ""
+    explanation_field = ""
+    only_json_rule = "no explanations, just the JSON"
+    if include_explanations:
+        only_json_rule = "no text outside the JSON" # explanations go inside the JSON now
+        answer_comma = ","
+        explanation_field = '\n                "explanation": "Why the correct answer is correct"'
+    return requirements + f"""
     Return your response as VALID JSON with this EXACT structure (no extra text):
     {{
         "questions":[
@@ -46,92 +92,766 @@ def generate_quiz(topic, api_key, max_retries=3):
                     "C": "Option C text",
                     "D": "Option D text"
                 }},
-                "correct_answer": "A"  # Correct option label
+                "correct_answer": "A"{answer_comma}  # Correct option label{explanation_field}
             }},
             ...
         ]
     }}
-    Return ONLY the JSON. No markdown code blocks, no explanations, just the JSON."""
+    Return ONLY the JSON. No markdown code blocks, {only_json_rule}."""
+
+
+@functools.lru_cache(maxsize=None)
+def quiz_system_blocks(include_explanations=False, compact=False):
+    """
+    system prompt blocks for a quiz call - one text block with the static instructions
+    - built once per format, the same list object is passed on every call
+    - no cache_control: the API only caches prefixes of 1024+ tokens and this one is a few hundred
+    """
+    return [{
+        "type": "text",
+        "text": build_quiz_system_prompt(include_explanations, compact)
+    }]
+
+
+def build_quiz_prompt(topic, include_explanations=False, compact=False, num_questions=NUM_QUESTIONS, focus=None):
+    """
+    the per-call (user) part of the quiz prompt - just the topic, everything else is in the system prompt
+    - include_explanations / compact pick the system prompt, kept here so callers pass the same arguments to both
+    - num_questions other than the default and a chunk's focus hint are added to the user part
+    """
+    if num_questions == NUM_QUESTIONS:
+        prompt = f"Generate a multiple choice quiz about the topic: {topic}"
+    else:
+        prompt = f"Generate {num_questions} multiple choice questions about the topic: {topic}"
+    if focus is not None:
+        prompt += f"\nFocus on {focus}."
+    return prompt
+
+
+def compact_format_rules(include_explanations=False):
+    """
+    output format instructions for the compact schema - one array per question, integer answer index
+    """
+    explanation_item = ""
+    explanation_rule = ""
+    if include_explanations:
+        explanation_item = ',"Why the correct answer is correct"'
+        explanation_rule = ", then the explanation"
+    return f"""    Return your response as VALID compact JSON (no extra text, no indentation or line breaks):
+    {{"q":[["Question text","Option A text","Option B text","Option C text","Option D text",0{explanation_item}],...]}}
+    Each question is one array: the question, the 4 options in order A, B, C, D, then the index of the correct option (0=A, 1=B, 2=C, 3=D){explanation_rule}.
+    Return ONLY the JSON. No markdown code blocks, no text outside the JSON."""
+
+
+def build_repair_prompt(topic, needed, kept_questions, include_explanations=False, compact=False, focus=None):
+    """
+    small (user) prompt asking only for the questions still missing - the kept ones are listed so they aren't repeated
+    - same system prompt as the full quiz, so the format rules aren't repeated here
+    """
+    existing = "\n".join(f"    - {question_dict['question']}" for question_dict in kept_questions)
+    focus_line = f"\nFocus on {focus}." if focus is not None else ""
+    return f"""Generate {needed} more multiple choice question(s) about the topic: {topic}{focus_line}
+    Do NOT repeat any of these existing questions:
+{existing}"""
+
+
+def record_usage(usage, call):
+    """ input / output token counters for one response (call: "quiz" or "explanation") """
+    METRICS.count("quiz_tokens_total", getattr(usage, "input_tokens", 0) or 0, call=call, direction="input")
+    METRICS.count("quiz_tokens_total", getattr(usage, "output_tokens", 0) or 0, call=call, direction="output")
+
+
+class OutputTokenBudget:
+    """
+    sizes max_tokens from the output lengths actually seen instead of a fixed 2000
+    - keeps the last `window` output-tokens-per-question samples for each response format
+    - budget = 95th percentile per question * number of questions * headroom (capped at the default)
+    - until min_samples are seen the fixed default (DEFAULT_TOKENS_PER_QUESTION per question) is used
+    - a truncated response (stop_reason "max_tokens") throws the samples away so it goes back to the default
+    """
+
+    def __init__(self, window=50, min_samples=5, headroom=1.3, floor_per_question=64):
+        self.window = window
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.floor_per_question = floor_per_question
+        self._samples = {} # response format -> deque of tokens per question
+        self._lock = threading.Lock()
+
+    def record(self, response_format, output_tokens, num_questions, truncated=False):
+        """ add one observed response """
+        with self._lock:
+            if truncated:
+                self._samples.pop(response_format, None)
+                return
+            if num_questions <= 0:
+                return
+            samples = self._samples.setdefault(response_format, deque(maxlen=self.window))
+            samples.append(output_tokens / num_questions)
+
+    def max_tokens(self, response_format, num_questions):
+        """ max_tokens to ask for when generating num_questions questions """
+        default = DEFAULT_TOKENS_PER_QUESTION * num_questions
+        with self._lock:
+            samples = sorted(self._samples.get(response_format, ()))
+        if len(samples) < self.min_samples:
+            return default
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        budget = math.ceil(p95 * self.headroom * num_questions)
+        return max(self.floor_per_question * num_questions, min(default, budget))
+
+
+# shared by every call in this process
+OUTPUT_TOKEN_BUDGET = OutputTokenBudget()
+
+
+def backoff_delay(attempt, base=1.0, cap=BACKOFF_CAP):
+    """
+    exponential backoff with full jitter - random wait between 0 and base * 2^attempt (capped)
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def is_rate_limit_error(err):
+    """ 429 rate limited or 529 overloaded """
+    return isinstance(err, anth.APIStatusError) and err.status_code in (429, 529)
+
+
+def retry_after_seconds(err):
+    """
+    seconds the API asked us to wait (retry-after header), or None if it didn't say
+    """
+    if not isinstance(err, anth.APIStatusError) or err.response is None:
+        return None
+    retry_after = err.response.headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        return None # HTTP date form - just use the normal backoff
+
+
+def retry_delay(last_error, attempt, base=1.0):
+    """
+    how long to wait before retry number `attempt` (1 = first retry)
+    - honors retry-after on rate limit / overloaded errors, otherwise exponential backoff with jitter
+    """
+    retry_after = retry_after_seconds(last_error)
+    if retry_after is not None:
+        return retry_after
+    return backoff_delay(attempt - 1, base)
+
+
+def keep_valid_questions(kept_questions, questions, require_explanation=False, num_questions=NUM_QUESTIONS):
+    """
+    add valid, non duplicate questions to kept_questions (in place) until the quiz is full
+    Needs to return:
+        list of problems found (strings) - for the retry log
+    """
+    problems = []
+    seen = set(question_dict["question"] for question_dict in kept_questions)
+    for idx, question_dict in enumerate(questions, 1):
+        if len(kept_questions) == num_questions:
+            break # extra questions - ignore
+        is_valid, validation_message = validate_question(question_dict, idx, require_explanation)
+        if is_valid == False:
+            problems.append(validation_message)
+        elif question_dict["question"] in seen:
+            problems.append(f"Duplicate question: {question_dict['question'][:50]}")
+        else:
+            seen.add(question_dict["question"])
+            kept_questions.append(question_dict)
+    return problems
+
+
+def generate_quiz(topic, api_key, max_retries=3, model=QUIZ_MODEL, temperature=QUIZ_TEMPERATURE, cache=None, client=None, backoff_base=1.0, include_explanations=False, compact=True, coalescer=None, rate_limiter=None, hedger=None, num_questions=NUM_QUESTIONS, focus=None):
+    """
+    Generate mulitple choice quz about user given topic using Claude
+    Function needs to handle
+    - create specific prompt for quiz generation
+    - call API
+    - parse through and validate response
+    - auto retry if quiz generation fails
+    - Notes:
+        - return quiz data in JSON
+        - model? probably claude-sonnet-4 (speed and accuracy balance)
+        - max_toxens? 2000 - enough for 5 questions per quiz but not wasteful 
+        - temperature? 0.7 - 1? balance for creativity and coherence
+        - cache? optional QuizCache (quiz_cache.py) - checked before calling the API, filled after a valid quiz
+        - client? optional Anthropic client to use - defaults to the shared pooled one from client_provider
+        - retries only ask for the questions that are still missing/invalid, valid ones are kept
+        - backoff_base? seconds for the first retry wait, doubles each retry (with jitter)
+        - include_explanations? each question also gets an "explanation" in the same response (no extra API calls)
+        - compact? ask for the compact positional format (fewer output tokens) - decoded back to the normal dicts
+        - max_tokens is sized from previously observed output lengths (OUTPUT_TOKEN_BUDGET) instead of a fixed 2000
+        - coalescer? optional SingleFlight (singleflight.py) - identical requests already in flight share one generation
+        - rate_limiter? optional object with acquire(tokens) / settle(estimated, actual) / penalize(seconds),
+          e.g. bulk_generate.TokenBucket - waited on before every API attempt, told about 429s
+        - a 429 / 529 with a retry-after header waits that long instead of the normal backoff
+        - hedger? optional Hedger (hedging.py) - a call slower than the hedger's deadline gets a second call
+          (maybe on a faster model), first valid quiz wins and the other is cancelled
+        - num_questions? quiz length - more than CHUNK_SIZE is split into chunks generated at the same time
+          (generate_quiz_chunked), each chunk retried on its own
+        - focus? extra hint for the prompt (used for the chunks of a long quiz) - not part of the cache key
+    """
+    cache_key = make_cache_key(topic, model, temperature, num_questions, include_explanations)
+
+    # check the cache first - a hit skips the API call entirely
+    if cache is not None:
+        cached_quiz = cache.get(cache_key)
+        if cached_quiz is not None:
+            cached_quiz["topic"] = topic
+            print(f" Quiz about {topic} served from cache.")
+            return cached_quiz
+
+    # same quiz already being generated for someone else? wait for that one instead of starting another
+    if coalescer is not None:
+        quiz_data = coalescer.do(cache_key, generate_quiz, topic, api_key, max_retries=max_retries, model=model,
+                                 temperature=temperature, cache=cache, client=client, backoff_base=backoff_base,
+                                 include_explanations=include_explanations, compact=compact, rate_limiter=rate_limiter,
+                                 hedger=hedger, num_questions=num_questions, focus=focus)
+        if quiz_data is not None:
+            quiz_data["topic"] = topic
+        return quiz_data
+
+    # reuse the pooled client instead of a new connection (and TLS handshake) per call
+    connection = client if client is not None else get_client(api_key)
+
+    # long quiz - chunks generated at the same time, each one through this function
+    if num_questions > CHUNK_SIZE:
+        quiz_data = generate_quiz_chunked(topic, api_key, num_questions, max_retries=max_retries, model=model, temperature=temperature,
+                                          client=connection, backoff_base=backoff_base, include_explanations=include_explanations,
+                                          compact=compact, rate_limiter=rate_limiter, hedger=hedger)
+        if quiz_data is not None and cache is not None:
+            cache.put(cache_key, quiz_data)
+        return quiz_data
+
+    # valid questions carried over between attempts - a retry only regenerates the missing / invalid ones
+    kept_questions = []
+    last_error = None
+
     # through this in a try loop to handle quiz generation failures
     for attempt in range(max_retries):
+        response_text = ""
         try:
-            print(f" Attempt {attempt + 1} of {max_retries} to generate quiz about '{topic}'.")
+            if attempt > 0:
+                # exponential backoff with jitter so retries don't pile onto a struggling API
+                delay = retry_delay(last_error, attempt, backoff_base)
+                print(f" Waiting {delay:.2f}s before retrying.")
+                time.sleep(delay)
 
-            # Call Claude API
-            message = connection.messages.create(
-                model = "claude-sonnet-4-20250514",  # Latest Sonnet model
-                max_tokens = 2000,
-                temperature = 0.8,
-                messages = [
-                    {
-                        "role": "user", # we're the user
-                        "content": prompt # needs to use our prompt
-                    }
-                ]
-            )
-            response_text = message.content[0].text # only need text from object
+            prompt, max_tokens = build_attempt_prompt(topic, kept_questions, attempt, max_retries, include_explanations, compact, num_questions, focus)
 
-            # remove markdown code blocks if any - just in case
-            response_text = response_text.strip()
-            if response_text.startswith("```json"):
-                    response_text = response_text[7:]  # Remove ```json
-            if response_text.startswith("```"):
-                    response_text = response_text[3:]  # Remove ```
-            if response_text.endswith("```"):
-                    response_text = response_text[:-3]  # Remove trailing ```
-            response_text = response_text.strip()
+            # wait for rate limit room - rough estimate (4 chars per input token + the whole output budget)
+            if rate_limiter is not None:
+                estimated_tokens = (len(prompt) + len(quiz_system_blocks(include_explanations, compact)[0]["text"])) // 4 + max_tokens
+                rate_limiter.acquire(estimated_tokens)
 
-            # Parse JSON into dict - if nothing is returned it will fail and kick to except
-            quiz_data = json.loads(response_text) 
+            if hedger is not None:
+                quiz_data = hedged_quiz_attempt(hedger, connection, prompt, max_tokens, model, temperature, kept_questions, topic, include_explanations, compact, num_questions,
+                                                rate_limiter=rate_limiter, estimated_tokens=estimated_tokens if rate_limiter is not None else 0)
+                if cache is not None:
+                    cache.put(cache_key, quiz_data)
+                return quiz_data
 
-            # Validate quiz data structure - reference tuple returned
-            is_valid, validation_message = validate_quiz(quiz_data)
+            # Call Claude API
+            # shared process-wide limit on calls in flight - waits in line (quiz priority) when it's full
+            with api_slot(PRIORITY_QUIZ, tokens=max_tokens), METRICS.span("quiz_api_call", call="quiz", model=model):
+                message = connection.messages.create(
+                    model = model,
+                    max_tokens = max_tokens,
+                    temperature = temperature,
+                    system = quiz_system_blocks(include_explanations, compact), # static instructions
+                    messages = [
+                        {
+                            "role": "user", # we're the user
+                            "content": prompt # needs to use our prompt
+                        }
+                    ]
+                )
+            response_text = message.content[0].text # only need text from object
+            if rate_limiter is not None:
+                rate_limiter.settle(estimated_tokens, message.usage.input_tokens + message.usage.output_tokens)
 
-            if is_valid == False:
-                raise ValueError(f" Quiz validation failed: {validation_message}")
+            quiz_data = process_quiz_response(message, response_text, kept_questions, topic, include_explanations, compact, num_questions)
 
-            quiz_data["topic"] = topic
-            print(f" Quiz about {topic} has been successfully generated with {len(quiz_data['questions'])} questions!") 
+            if cache is not None:
+                cache.put(cache_key, quiz_data)
             # return the quiz data
             return quiz_data   
 
-        except json.JSONDecodeError as json_err:
-            # no valid JSON was returned
-            print(f" Attempt {attempt + 1} failed.")
-            print(f" JSON parsing error: {json_err}.")
-            print(f" Response text preview: {response_text[:100]}...")  # Show first 100 chars for debugging - will get way too long 
+        except Exception as err:
+            last_error = err
+            report_failed_attempt(err, attempt, response_text)
+            if rate_limiter is not None and is_rate_limit_error(err):
+                # everyone sharing the limiter backs off, not just this call
+                rate_limiter.penalize(retry_delay(err, attempt + 1, backoff_base))
+            if isinstance(err, LimiterTimeout):
+                print(" Timed out waiting for an API slot. Quiz generation failed.")
+                return None # its deadline has passed - retrying would only queue again
             if attempt == max_retries -1: # count starts at zero
                 print(" Max retries reached. Quiz generation failed.")
                 return None
-        
-        except ValueError as val_err:
-            # valid JSON returned but failed validation
-            print(f" Attempt {attempt + 1} failed.")
-            print(f" Error: {val_err}.")
-            if attempt == max_retries -1: 
-                print(" Max retries reached. Quiz generation failed.")
-                return None
 
-        except anth.APIError as api_err:
-            # API errors
-            print(f" Attempt {attempt + 1} failed.")
-            print(f" API error: {api_err}.")
-            if attempt == max_retries -1:
-                print(" Max retries reached. Quiz generation failed.")
-                return None
 
-        except Exception as e:
-            # catch all for any other errors
-            print(f"Attempt {attempt + 1} failed.")
-            print(f" Error type: {type(e)}, Error message: {e}.")
+async def generate_quiz_async(topic, api_key, max_retries=3, model=QUIZ_MODEL, temperature=QUIZ_TEMPERATURE, cache=None, client=None, backoff_base=1.0, include_explanations=False, compact=True, coalescer=None, hedger=None, num_questions=NUM_QUESTIONS, focus=None):
+    """
+    async version of generate_quiz - same arguments and same result (quiz dict or None)
+    - uses the shared AsyncAnthropic client so one process can run hundreds of generations at once
+    - backoff waits use asyncio.sleep so they don't block the event loop
+    - long quizzes run their chunks as concurrent tasks (generate_quiz_chunked_async)
+    """
+    cache_key = make_cache_key(topic, model, temperature, num_questions, include_explanations)
+    if cache is not None:
+        cached_quiz = await asyncio.to_thread(cache.get, cache_key) # sqlite - off the event loop
+        if cached_quiz is not None:
+            cached_quiz["topic"] = topic
+            print(f" Quiz about {topic} served from cache.")
+            return cached_quiz
+
+    if coalescer is not None:
+        quiz_data = await coalescer.do_async(cache_key, generate_quiz_async, topic, api_key, max_retries=max_retries,
+                                             model=model, temperature=temperature, cache=cache, client=client,
+                                             backoff_base=backoff_base, include_explanations=include_explanations, compact=compact,
+                                             hedger=hedger, num_questions=num_questions, focus=focus)
+        if quiz_data is not None:
+            quiz_data["topic"] = topic
+        return quiz_data
+
+    connection = client if client is not None else get_async_client(api_key)
+    if num_questions > CHUNK_SIZE:
+        quiz_data = await generate_quiz_chunked_async(topic, api_key, num_questions, max_retries=max_retries, model=model,
+                                                      temperature=temperature, client=connection, backoff_base=backoff_base,
+                                                      include_explanations=include_explanations, compact=compact, hedger=hedger)
+        if quiz_data is not None and cache is not None:
+            await asyncio.to_thread(cache.put, cache_key, quiz_data)
+        return quiz_data
+
+    kept_questions = []
+    last_error = None
+
+    for attempt in range(max_retries):
+        response_text = ""
+        try:
+            if attempt > 0:
+                delay = retry_delay(last_error, attempt, backoff_base)
+                print(f" Waiting {delay:.2f}s before retrying.")
+                await asyncio.sleep(delay)
+
+            prompt, max_tokens = build_attempt_prompt(topic, kept_questions, attempt, max_retries, include_explanations, compact, num_questions, focus)
+            if hedger is not None:
+                quiz_data = await hedged_quiz_attempt_async(hedger, connection, prompt, max_tokens, model, temperature, kept_questions, topic, include_explanations, compact, num_questions)
+                if cache is not None:
+                    await asyncio.to_thread(cache.put, cache_key, quiz_data)
+                return quiz_data
+
+            with await api_slot_async(PRIORITY_QUIZ, tokens=max_tokens), METRICS.span("quiz_api_call", call="quiz", model=model):
+                message = await connection.messages.create(
+                    model = model,
+                    max_tokens = max_tokens,
+                    temperature = temperature,
+                    system = quiz_system_blocks(include_explanations, compact),
+                    messages = [{"role": "user", "content": prompt}]
+                )
+            response_text = message.content[0].text
+
+            quiz_data = process_quiz_response(message, response_text, kept_questions, topic, include_explanations, compact, num_questions)
+
+            if cache is not None:
+                await asyncio.to_thread(cache.put, cache_key, quiz_data)
+            return quiz_data
+
+        except Exception as err:
+            last_error = err
+            report_failed_attempt(err, attempt, response_text)
+            if isinstance(err, LimiterTimeout):
+                print(" Timed out waiting for an API slot. Quiz generation failed.")
+                return None
             if attempt == max_retries -1:
                 print(" Max retries reached. Quiz generation failed.")
                 return None
-    
 
-def validate_quiz(quiz_data):
+
+def build_attempt_prompt(topic, kept_questions, attempt, max_retries, include_explanations, compact, num_questions=NUM_QUESTIONS, focus=None):
+    """
+    prompt + max_tokens for one attempt - full quiz the first time, only what's missing after that
+    Needs to return:
+        tuple (prompt: str, max_tokens: int)
+    """
+    needed = num_questions - len(kept_questions)
+    if len(kept_questions) == 0:
+        print(f" Attempt {attempt + 1} of {max_retries} to generate quiz about '{topic}'.")
+        prompt = build_quiz_prompt(topic, include_explanations, compact, num_questions, focus)
+    else:
+        print(f" Attempt {attempt + 1} of {max_retries}: repairing {needed} missing question(s) about '{topic}'.")
+        prompt = build_repair_prompt(topic, needed, kept_questions, include_explanations, compact, focus)
+    return prompt, OUTPUT_TOKEN_BUDGET.max_tokens((compact, include_explanations), needed)
+
+
+def split_into_chunks(num_questions, chunk_size=CHUNK_SIZE):
+    """
+    chunk sizes for a long quiz - as even as possible, none bigger than chunk_size (e.g. 12 -> [4, 4, 4])
+    """
+    num_chunks = math.ceil(num_questions / chunk_size)
+    base, extra = divmod(num_questions, num_chunks)
+    return [base + 1 if idx < extra else base for idx in range(num_chunks)]
+
+
+def chunk_focus(idx):
+    """ focus hint for chunk idx - a different angle (and difficulty) per chunk so chunks don't overlap """
+    return f"{CHUNK_FOCUS[idx % len(CHUNK_FOCUS)]} ({CHUNK_DIFFICULTY[idx % len(CHUNK_DIFFICULTY)]} questions)"
+
+
+def question_key(question_dict):
+    """ question text without case, punctuation or extra spaces - catches the same question from two chunks """
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", question_dict["question"].lower()).split())
+
+
+def merge_chunks(chunks, results, merged, seen, next_hint):
+    """
+    add each finished chunk's questions to merged (in place), skipping questions another chunk already asked
+    - chunks: list of (hint index, size), results: the quiz (or None) for each chunk
+    Needs to return:
+        tuple (chunks to run again: list of (hint index, size), next unused hint index)
+        - a failed chunk runs again with its own hint, a chunk that lost questions to duplicates gets a fresh hint
+    """
+    retry = []
+    for (hint, size), quiz_data in zip(chunks, results):
+        if quiz_data is None:
+            retry.append((hint, size))
+            continue
+        added = 0
+        for question_dict in quiz_data["questions"]:
+            key = question_key(question_dict)
+            if key not in seen:
+                seen.add(key)
+                merged.append(question_dict)
+                added += 1
+        if added < size:
+            retry.append((next_hint, size - added))
+            next_hint += 1
+    return retry, next_hint
+
+
+def finish_chunked_quiz(topic, merged, num_questions, include_explanations):
+    """ merged chunks -> validated quiz dict, or None if there still aren't enough questions """
+    quiz_data = {"questions": merged[:num_questions]}
+    is_valid, validation_message = validate_quiz(quiz_data, include_explanations, num_questions)
+    if is_valid == False:
+        print(f" Chunked quiz about '{topic}' failed: {validation_message}")
+        return None
+    quiz_data["topic"] = topic
+    print(f" Quiz about {topic} has been successfully generated with {num_questions} questions in chunks!")
+    return quiz_data
+
+
+def generate_quiz_chunked(topic, api_key, num_questions, max_retries=3, model=QUIZ_MODEL, temperature=QUIZ_TEMPERATURE, client=None, backoff_base=1.0, include_explanations=False, compact=True, rate_limiter=None, hedger=None, max_parallel=MAX_PARALLEL_CHUNKS):
+    """
+    long quiz as several small generate_quiz calls running at the same time
+    - each chunk gets its own focus hint, validates on its own and retries on its own (a failed chunk never
+      redoes the ones that worked)
+    - chunks are merged in order and questions repeated across chunks are dropped - whatever is still
+      missing is asked for in another round (CHUNK_ROUNDS)
+    Needs to return:
+        the validated quiz dict with num_questions questions, or None
+    """
+    chunks = list(enumerate(split_into_chunks(num_questions)))
+    print(f" Generating {num_questions} questions about '{topic}' in {len(chunks)} chunks.")
+    merged = []
+    seen = set()
+    next_hint = len(chunks)
+    for _ in range(CHUNK_ROUNDS):
+        with ThreadPoolExecutor(max_workers=min(max_parallel, len(chunks))) as pool:
+            futures = [pool.submit(generate_quiz, topic, api_key, max_retries=max_retries, model=model, temperature=temperature,
+                                   client=client, backoff_base=backoff_base, include_explanations=include_explanations, compact=compact,
+                                   rate_limiter=rate_limiter, hedger=hedger, num_questions=size, focus=chunk_focus(hint))
+                       for hint, size in chunks]
+            results = [future.result() for future in futures]
+        chunks, next_hint = merge_chunks(chunks, results, merged, seen, next_hint)
+        if len(chunks) == 0:
+            break
+    return finish_chunked_quiz(topic, merged, num_questions, include_explanations)
+
+
+async def generate_quiz_chunked_async(topic, api_key, num_questions, max_retries=3, model=QUIZ_MODEL, temperature=QUIZ_TEMPERATURE, client=None, backoff_base=1.0, include_explanations=False, compact=True, hedger=None, max_parallel=MAX_PARALLEL_CHUNKS):
+    """
+    async version of generate_quiz_chunked - chunks are concurrent generate_quiz_async tasks
+    """
+    chunks = list(enumerate(split_into_chunks(num_questions)))
+    print(f" Generating {num_questions} questions about '{topic}' in {len(chunks)} chunks.")
+    limit = asyncio.Semaphore(max_parallel)
+
+    async def run_chunk(hint, size):
+        async with limit:
+            return await generate_quiz_async(topic, api_key, max_retries=max_retries, model=model, temperature=temperature,
+                                             client=client, backoff_base=backoff_base, include_explanations=include_explanations,
+                                             compact=compact, hedger=hedger, num_questions=size, focus=chunk_focus(hint))
+
+    merged = []
+    seen = set()
+    next_hint = len(chunks)
+    for _ in range(CHUNK_ROUNDS):
+        results = await asyncio.gather(*[run_chunk(hint, size) for hint, size in chunks])
+        chunks, next_hint = merge_chunks(chunks, results, merged, seen, next_hint)
+        if len(chunks) == 0:
+            break
+    return finish_chunked_quiz(topic, merged, num_questions, include_explanations)
+
+
+def process_quiz_response(message, response_text, kept_questions, topic, include_explanations, compact, num_questions=NUM_QUESTIONS):
+    """
+    turn one API response into the finished quiz - shared by the sync and async generators
+    - salvages and keeps every valid question (kept_questions is updated in place for the next attempt)
+    - raises json.JSONDecodeError / ValueError when the quiz still isn't complete so the caller retries
+    Needs to return:
+        the validated quiz dict (with "topic")
+    """
+    with METRICS.span("quiz_parse"):
+        # remove markdown code blocks if any - just in case
+        response_text = strip_code_fences(response_text)
+
+        # salvage every complete question, even from broken / cut off JSON (compact ones get expanded to dicts)
+        questions = [decode_compact_question(item) for item in salvage_questions(response_text)]
+    record_usage(message.usage, "quiz")
+    OUTPUT_TOKEN_BUDGET.record((compact, include_explanations), message.usage.output_tokens, len(questions), message.stop_reason == "max_tokens")
+    if len(questions) == 0:
+        json.loads(response_text) # nothing usable - if the JSON itself is bad this kicks to except
+        raise ValueError(" Quiz validation failed: Response has no questions")
+
+    with METRICS.span("quiz_validate"):
+        # keep the valid ones, drop the rest
+        problems = keep_valid_questions(kept_questions, questions, include_explanations, num_questions)
+        if len(problems) == 0:
+            problems.append("the rest were missing or cut off")
+        if len(kept_questions) < num_questions:
+            raise ValueError(f" Quiz validation failed: only {len(kept_questions)} of {num_questions} questions are valid ({'; '.join(problems)})")
+
+        quiz_data = {"questions": list(kept_questions)}
+
+        # Validate quiz data structure - reference tuple returned
+        is_valid, validation_message = validate_quiz(quiz_data, include_explanations, num_questions)
+
+    if is_valid == False:
+        raise ValueError(f" Quiz validation failed: {validation_message}")
+
+    quiz_data["topic"] = topic
+    print(f" Quiz about {topic} has been successfully generated with {len(quiz_data['questions'])} questions!") 
+    return quiz_data
+
+
+def hedged_quiz_attempt(hedger, connection, prompt, max_tokens, model, temperature, kept_questions, topic, include_explanations, compact, num_questions=NUM_QUESTIONS, rate_limiter=None, estimated_tokens=0):
+    """
+    one generate_quiz attempt through a Hedger
+    - each call streams so the loser can be stopped mid-response (leaving the `with` block closes its connection)
+    - a hedge still waiting for an API slot when the first call wins leaves the queue and never sends its request
+    - each call works on its own copy of kept_questions, if both fail the copy with the most valid questions
+      is kept for the repair attempt
+    - rate_limiter: the caller acquired estimated_tokens for the first call - the hedge acquires its own, and
+      both are settled with what they really used (nothing if never sent, the whole estimate if cut off)
+    Needs to return:
+        the validated quiz dict - raises like process_quiz_response when no call produced one
+    """
+    attempt_kept = []
+
+    def attempt(attempt_model, cancel_event, is_hedge):
+        kept = list(kept_questions)
+        attempt_kept.append(kept)
+        if rate_limiter is not None and is_hedge:
+            rate_limiter.acquire(estimated_tokens)
+        used_tokens = 0
+        try:
+            permit = api_slot(PRIORITY_QUIZ, cancel_event=cancel_event, tokens=max_tokens) # LimiterCancelled if the first call wins meanwhile
+            if cancel_event.is_set():
+                permit.discard()
+                raise HedgeCancelled()
+            used_tokens = estimated_tokens # sent - until the final usage is known, assume all of it
+            with permit, METRICS.span("quiz_api_call", call="quiz", model=attempt_model), connection.messages.stream(
+                model = attempt_model,
+                max_tokens = max_tokens,
+                temperature = temperature,
+                system = quiz_system_blocks(include_explanations, compact),
+                messages = [{"role": "user", "content": prompt}]
+            ) as stream:
+                for _ in stream.text_stream:
+                    if cancel_event.is_set():
+                        raise HedgeCancelled()
+                message = stream.get_final_message()
+            used_tokens = message.usage.input_tokens + message.usage.output_tokens
+            return process_quiz_response(message, message.content[0].text, kept, topic, include_explanations, compact, num_questions)
+        finally:
+            if rate_limiter is not None:
+                rate_limiter.settle(estimated_tokens, used_tokens)
+
+    try:
+        return hedger.run(attempt, model)
+    except Exception:
+        if len(attempt_kept) > 0:
+            kept_questions[:] = max(attempt_kept, key=len)
+        raise
+
+
+async def hedged_quiz_attempt_async(hedger, connection, prompt, max_tokens, model, temperature, kept_questions, topic, include_explanations, compact, num_questions=NUM_QUESTIONS):
+    """
+    async version of hedged_quiz_attempt - the losing call's task is cancelled, which aborts its request
+    """
+    attempt_kept = []
+
+    async def attempt(attempt_model, cancel_event, is_hedge):
+        kept = list(kept_questions)
+        attempt_kept.append(kept)
+        with await api_slot_async(PRIORITY_QUIZ, tokens=max_tokens), METRICS.span("quiz_api_call", call="quiz", model=attempt_model):
+            message = await connection.messages.create(
+                model = attempt_model,
+                max_tokens = max_tokens,
+                temperature = temperature,
+                system = quiz_system_blocks(include_explanations, compact),
+                messages = [{"role": "user", "content": prompt}]
+            )
+        return process_quiz_response(message, message.content[0].text, kept, topic, include_explanations, compact, num_questions)
+
+    try:
+        return await hedger.run_async(attempt, model)
+    except Exception:
+        if len(attempt_kept) > 0:
+            kept_questions[:] = max(attempt_kept, key=len)
+        raise
+
+
+def report_failed_attempt(err, attempt, response_text):
+    """
+    print why an attempt failed - different detail for each kind of failure
+    """
+    print(f" Attempt {attempt + 1} failed.")
+    METRICS.count("quiz_attempt_failures_total", failure=failure_class(err))
+    if isinstance(err, json.JSONDecodeError):
+        # no valid JSON was returned
+        print(f" JSON parsing error: {err}.")
+        print(f" Response text preview: {response_text[:100]}...")  # Show first 100 chars for debugging - will get way too long 
+    elif isinstance(err, ValueError):
+        # valid JSON returned but failed validation
+        print(f" Error: {err}.")
+    elif isinstance(err, anth.APIError):
+        # API errors
+        print(f" API error: {err}.")
+    else:
+        # catch all for any other errors
+        print(f" Error type: {type(err)}, Error message: {err}.")
+
+
+def failure_class(err):
+    """ metric label for a failed attempt - same split as report_failed_attempt """
+    if isinstance(err, json.JSONDecodeError):
+        return "json_error"
+    if isinstance(err, ValueError):
+        return "validation_error"
+    if isinstance(err, anth.APIError):
+        return "api_error"
+    if isinstance(err, LimiterTimeout):
+        return "queue_timeout"
+    return "other"
+
+
+def generate_quiz_stream(topic, api_key, model=QUIZ_MODEL, temperature=QUIZ_TEMPERATURE, cache=None, client=None, include_explanations=False, compact=True, coalescer=None, num_questions=NUM_QUESTIONS):
+    """
+    Streaming version of generate_quiz - yields each question dict as soon as it is complete
+    so the first question can be shown while the rest are still being generated
+    - each question is checked with validate_question as it arrives
+    - no retries here: raises ValueError (bad question / wrong count), json.JSONDecodeError or anth.APIError,
+      callers can fall back to generate_quiz which does retry
+    - a cache hit yields the cached questions straight away, a complete valid quiz gets stored in the cache
+    - coalescer? if the same quiz is already being generated, wait for it and yield its questions
+      (a failed shared generation raises ValueError so the caller falls back like any other failure)
+    - num_questions over CHUNK_SIZE: the chunks are generated at the same time (generate_quiz) and yielded once merged
+    """
+    if num_questions > CHUNK_SIZE:
+        quiz_data = generate_quiz(topic, api_key, model=model, temperature=temperature, cache=cache, client=client,
+                                  include_explanations=include_explanations, compact=compact, coalescer=coalescer, num_questions=num_questions)
+        if quiz_data is None:
+            raise ValueError(f" Quiz validation failed: could not generate {num_questions} questions")
+        for question_dict in quiz_data["questions"]:
+            yield question_dict
+        return
+
+    cache_key = make_cache_key(topic, model, temperature, num_questions, include_explanations)
+    if cache is not None:
+        cached_quiz = cache.get(cache_key)
+        if cached_quiz is not None:
+            print(f" Quiz about {topic} served from cache.")
+            for question_dict in cached_quiz["questions"]:
+                yield question_dict
+            return
+
+    if coalescer is not None:
+        is_leader, future = coalescer.lead_or_join(cache_key)
+        if is_leader == False:
+            print(f" Quiz about {topic} is already being generated - waiting for it.")
+            quiz_data = coalescer.wait(future)
+            if quiz_data is None:
+                raise ValueError(" Quiz validation failed: shared generation failed")
+            for question_dict in quiz_data["questions"]:
+                yield question_dict
+            return
+
+    quiz_data = None # what followers get - stays None if streaming fails or is abandoned
+    try:
+        questions = []
+        for question_dict in stream_quiz_questions(topic, api_key, model, temperature, client, include_explanations, compact, num_questions):
+            questions.append(question_dict)
+            yield question_dict
+
+        quiz_data = {"topic": topic, "questions": questions}
+        if cache is not None:
+            cache.put(cache_key, quiz_data)
+    finally:
+        if coalescer is not None:
+            coalescer.finish(cache_key, future, result=quiz_data)
+
+
+def stream_quiz_questions(topic, api_key, model, temperature, client, include_explanations, compact, num_questions=NUM_QUESTIONS):
+    """
+    the actual streaming API call behind generate_quiz_stream - yields validated question dicts
+    """
+    connection = client if client is not None else get_client(api_key)
+    parser = QuestionStreamParser()
+    questions = []
+    response_format = (compact, include_explanations)
+
+    max_tokens = OUTPUT_TOKEN_BUDGET.max_tokens(response_format, num_questions)
+
+    print(f" Streaming quiz about '{topic}'.")
+    # the span covers the whole stream - time to first question is when the caller gets the first yield
+    with api_slot(PRIORITY_QUIZ, tokens=max_tokens), METRICS.span("quiz_api_call", call="quiz_stream", model=model), connection.messages.stream(
+        model = model,
+        max_tokens = max_tokens,
+        temperature = temperature,
+        system = quiz_system_blocks(include_explanations, compact),
+        messages = [{"role": "user", "content": build_quiz_prompt(topic, include_explanations, compact, num_questions)}]
+    ) as stream:
+        for text in stream.text_stream:
+            for item in parser.feed(text):
+                question_dict = decode_compact_question(item)
+                is_valid, validation_message = validate_question(question_dict, len(questions) + 1, include_explanations)
+                if is_valid == False:
+                    raise ValueError(f" Quiz validation failed: {validation_message}")
+                questions.append(question_dict)
+                yield question_dict
+
+        final_message = stream.get_final_message()
+        record_usage(final_message.usage, "quiz")
+        OUTPUT_TOKEN_BUDGET.record(response_format, final_message.usage.output_tokens, len(questions), final_message.stop_reason == "max_tokens")
+
+    if len(questions) != num_questions:
+        raise ValueError(f" Quiz validation failed: Expected exactly {num_questions} questions, got {len(questions)}")
+
+    print(f" Quiz about {topic} has been successfully streamed with {len(questions)} questions!")
+
+
+def validate_quiz(quiz_data, require_explanation=False, num_questions=NUM_QUESTIONS):
     """
     Make sure the quiz is actually valid and legit before showing it to user (requirements specified in prompt need to be met)
+    - require_explanation: every question must also have a non empty "explanation" (inline explanation mode)
+    - num_questions: exact number of questions expected (None = any number, at least 1)
     """
      # check for 'questions' overall 
     if "questions" not in quiz_data:
@@ -140,35 +860,58 @@ def validate_quiz(quiz_data):
     if not isinstance(quiz_data["questions"], list):
         return False, "'questions' field is not a list"
             
-    if len(quiz_data["questions"]) != 5:
-        return False, f"Expected exactly 5 questions, got {len(quiz_data['questions'])}"
+    if num_questions is not None and len(quiz_data["questions"]) != num_questions:
+        return False, f"Expected exactly {num_questions} questions, got {len(quiz_data['questions'])}"
+
+    if len(quiz_data["questions"]) == 0:
+        return False, "Quiz has no questions"
         
     # check each specific question dictionary - force start at 1 not 0
     for idx, question_dict in enumerate(quiz_data["questions"], 1):
-        # check for fields - must exist
-        if "question" not in question_dict:
-            return False, f"Question {idx} is missing the 'question' field"
-        if "options" not in question_dict:
-            return False, f"Question {idx} is missing the 'options' field"
-        if "correct_answer" not in question_dict:
-            return False, f"Question {idx} is missing the 'correct_answer' field"
-        
-        # check options structure & choices
-        options = question_dict["options"]
-        if not isinstance(options, dict):
-            return False, f"'options' in question {idx} is not a dictionary"
-        required_letters = ["A", "B", "C", "D"]
-        for letter in required_letters:
-            if letter not in options:
-                return False, f"Option '{letter}' is missing in question {idx}"
-            
-        # check correct answer is valid - must be one of A, B, C, D
-        if question_dict["correct_answer"] not in required_letters:
-            return False, f"'correct_answer' in question {idx} is not one of {required_letters}"
+        is_valid, validation_message = validate_question(question_dict, idx, require_explanation)
+        if is_valid == False:
+            return False, validation_message
         
     return True, "Quiz data is valid!!"
 
 
+def validate_question(question_dict, idx, require_explanation=False):
+    """
+    checks for a single question - used by validate_quiz and on each question as it streams in
+    """
+    if not isinstance(question_dict, dict):
+        return False, f"Question {idx} is not a dictionary"
+
+    # check for fields - must exist
+    if "question" not in question_dict:
+        return False, f"Question {idx} is missing the 'question' field"
+    if "options" not in question_dict:
+        return False, f"Question {idx} is missing the 'options' field"
+    if "correct_answer" not in question_dict:
+        return False, f"Question {idx} is missing the 'correct_answer' field"
+    
+    # check options structure & choices
+    options = question_dict["options"]
+    if not isinstance(options, dict):
+        return False, f"'options' in question {idx} is not a dictionary"
+    required_letters = ["A", "B", "C", "D"]
+    for letter in required_letters:
+        if letter not in options:
+            return False, f"Option '{letter}' is missing in question {idx}"
+        
+    # check correct answer is valid - must be one of A, B, C, D
+    if question_dict["correct_answer"] not in required_letters:
+        return False, f"'correct_answer' in question {idx} is not one of {required_letters}"
+
+    # explanation only required when it was asked for in the prompt
+    if require_explanation:
+        explanation = question_dict.get("explanation")
+        if not isinstance(explanation, str) or explanation.strip() == "":
+            return False, f"Question {idx} is missing the 'explanation' field"
+
+    return True, "Question is valid"
+
+
 def display_quiz(quiz_data):
     """
     print out quiz - for testing & debugging
@@ -184,28 +927,46 @@ def display_quiz(quiz_data):
         for letter in ["A", "B", "C", "D"]:
             print(f"  {letter}. {question_dict['options'][letter]}")
         print(f"  ✓ Correct Answer: {question_dict['correct_answer']}")
+        if "explanation" in question_dict:
+            print(f"  Explanation: {question_dict['explanation']}")
         print()
 
 # BONUS ADDITION 
-def generate_explanation(question, correct_answer, correct_option_text, api_key):
+# static explanation instructions - system prompt
+EXPLANATION_SYSTEM_BLOCKS = [{
+    "type": "text",
+    "text": """You explain quiz answers to students. When given a multiple choice question and its correct answer,
+    explain why this answer is correct in 2-3 sentences. Be educational, factual, and concise.
+    Reply with the explanation only."""
+}]
+
+
+def build_explanation_prompt(question, correct_answer, correct_option_text):
+    """ explanation prompt (user part) - shared by the sync and async versions """
+    return f"""Question: {question}
+    Correct Answer: {correct_answer}. {correct_option_text}"""
+
+
+def generate_explanation(question, correct_answer, correct_option_text, api_key, client=None):
     """
     generate an explanation for why an answer is correct 
     - should only show on answers that were answered incorrectly
+    - client? optional Anthropic client to use - defaults to the shared pooled one from client_provider
     """
-    connection = anth.Anthropic(api_key=api_key)
+    connection = client if client is not None else get_client(api_key)
 
-    prompt = f"""Explain why this answer is correct in 2-3 sentences. Be educational, factual, and concise.
-    Question: {question}
-    Correct Answer: {correct_answer}. {correct_option_text}
-    provide a brief explanation of why this is the correct answer."""
+    prompt = build_explanation_prompt(question, correct_answer, correct_option_text)
 
     try:
-        message = connection.messages.create(
-            model = "claude-sonnet-4-20250514",  # Latest Sonnet model
-            max_tokens = 200, # only short explanations
-            temperature = 0.7,
-            messages = [{"role": "user", "content": prompt}]    
-        )
+        with api_slot(PRIORITY_EXPLANATION, tokens=EXPLANATION_MAX_TOKENS), METRICS.span("quiz_api_call", call="explanation", model=QUIZ_MODEL):
+            message = connection.messages.create(
+                model = QUIZ_MODEL,
+                max_tokens = EXPLANATION_MAX_TOKENS,
+                temperature = 0.7,
+                system = EXPLANATION_SYSTEM_BLOCKS,
+                messages = [{"role": "user", "content": prompt}]    
+            )
+        record_usage(message.usage, "explanation")
 
         explanation = message.content[0].text.strip()
         return explanation
@@ -214,6 +975,57 @@ def generate_explanation(question, correct_answer, correct_option_text, api_key)
         print(f" Error generation explanation: {e}")
         return None
 
+
+async def generate_explanation_async(question, correct_answer, correct_option_text, api_key, client=None):
+    """
+    async version of generate_explanation - uses the shared AsyncAnthropic client
+    """
+    connection = client if client is not None else get_async_client(api_key)
+
+    try:
+        with await api_slot_async(PRIORITY_EXPLANATION, tokens=EXPLANATION_MAX_TOKENS), METRICS.span("quiz_api_call", call="explanation", model=QUIZ_MODEL):
+            message = await connection.messages.create(
+                model = QUIZ_MODEL,
+                max_tokens = EXPLANATION_MAX_TOKENS,
+                temperature = 0.7,
+                system = EXPLANATION_SYSTEM_BLOCKS,
+                messages = [{"role": "user", "content": build_explanation_prompt(question, correct_answer, correct_option_text)}]
+            )
+        record_usage(message.usage, "explanation")
+        return message.content[0].text.strip()
+
+    except Exception as e:
+        print(f" Error generation explanation: {e}")
+        return None
+
+
+def explanation_key(question, correct_answer, correct_option_text):
+    """
+    stable hash for an explanation request - same question + answer = same explanation, so it can be memoized
+    """
+    raw = json.dumps([question, correct_answer, correct_option_text])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def generate_explanations(requests, api_key, client=None, max_workers=5):
+    """
+    generate several explanations at the same time instead of one after another
+    - requests: list of (key, question, correct_answer, correct_option_text) tuples
+    - yields (key, explanation) as each one finishes (fastest first), explanation is None if it failed
+    """
+    if len(requests) == 0:
+        return
+    connection = client if client is not None else get_client(api_key) # one pooled client shared by all threads
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(requests))) as pool:
+        futures = {}
+        for key, question, correct_answer, correct_option_text in requests:
+            future = pool.submit(generate_explanation, question, correct_answer, correct_option_text, api_key, connection)
+            futures[future] = key
+
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
 # test code - body
 if __name__ == "__main__":
     # only runs if this file is executed directly
@@ -97,7 +97,8 @@ def get_detailed_results(questions, user_answers):
                     "options": {"A": "...", "B": "...", "C": "...", "D": "..."},
                     "user_answer": "A",
                     "correct_answer": "A",
-                    "is_correct": True
+                    "is_correct": True,
+                    "explanation": "Because..." (or None if the quiz was generated without explanations)
                 },
                 ...
             ]
@@ -113,7 +114,8 @@ def get_detailed_results(questions, user_answers):
             "options": question_dict["options"],
             "user_answer": user_ans,
             "correct_answer": correct_ans,
-            "is_correct": user_ans == correct_ans
+            "is_correct": user_ans == correct_ans,
+            "explanation": question_dict.get("explanation") # only there when generated inline with the quiz
         }
 
         results.append(result_detailed)
@@ -178,5 +180,5 @@ if __name__ == "__main__":
 
         # get detailed results
         details = get_detailed_results(questions_list, fake_user_answers)
-        print(f"Detailed Results Example: \n Question: {details[0]['question_text']}\n Answer Choices: {details[0]["options"]}\n User Answer: {details[0]['user_answer']}\n Correct Answer: {details[0]['correct_answer']}\n Is Correct: {details[0]['is_correct']}")
+        print(f"Detailed Results Example: \n Question: {details[0]['question_text']}\n Answer Choices: {details[0]['options']}\n User Answer: {details[0]['user_answer']}\n Correct Answer: {details[0]['correct_answer']}\n Is Correct: {details[0]['is_correct']}")
         
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+Quiz Model Module
+- Compact in-memory quiz and result objects for per-session storage (st.session_state).
+- Question / Quiz use __slots__, keep options as a tuple in A-D order and the answer as an index,
+  and intern their text - sessions served the same cached or bank quiz share one copy of every string.
+- QuizResult keeps only the answers (one byte per question) and a reference to its Quiz. The score and
+  the get_detailed_results dicts are built when asked for instead of being stored next to the quiz.
+- to_dict() / from_dict() convert losslessly to the dict format the rest of the code uses
+  (quiz_generator, quiz_grader, results_store, the service), so those functions keep working unchanged.
+
+Tiandra M Taylor
+"""
+
+# imports
+import sys
+
+from quiz_grader import calculate_score, get_detailed_results
+
+OPTION_LETTERS = ("A", "B", "C", "D") # the only label objects - questions store indexes into this
+LETTER_INDEX = {letter: idx for idx, letter in enumerate(OPTION_LETTERS)}
+NO_ANSWER = 255 # answer byte for an unanswered question
+QUESTION_FIELDS = ("question", "options", "correct_answer", "explanation")
+
+
+class Question:
+    """
+    One multiple choice question
+    - text, options (tuple of 4 strings, A-D), answer (0-3), explanation (str or None)
+    - extra: any other keys the question dict had (None if there were none) - kept so to_dict() is lossless
+    """
+
+    __slots__ = ("text", "options", "answer", "explanation", "extra")
+
+    def __init__(self, text, options, answer, explanation=None, extra=None):
+        self.text = text
+        self.options = options
+        self.answer = answer
+        self.explanation = explanation
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, question_dict):
+        """ from a validated question dict ({"question", "options", "correct_answer", "explanation"?}) """
+        answer = LETTER_INDEX.get(question_dict["correct_answer"])
+        if answer is None:
+            raise ValueError(f"Correct answer must be one of {OPTION_LETTERS}, got {question_dict['correct_answer']!r}")
+        options = question_dict["options"]
+        explanation = question_dict.get("explanation")
+        extra = {key: value for key, value in question_dict.items() if key not in QUESTION_FIELDS} or None
+        # str() first - a model reply can have numbers as options (validate_question only checks the keys)
+        return cls(
+            sys.intern(str(question_dict["question"])),
+            tuple(sys.intern(str(options[letter])) for letter in OPTION_LETTERS),
+            answer,
+            sys.intern(str(explanation)) if explanation is not None else None,
+            extra
+        )
+
+    def to_dict(self):
+        question_dict = {
+            "question": self.text,
+            "options": dict(zip(OPTION_LETTERS, self.options)),
+            "correct_answer": OPTION_LETTERS[self.answer]
+        }
+        if self.explanation is not None:
+            question_dict["explanation"] = self.explanation
+        if self.extra is not None:
+            question_dict.update(self.extra)
+        return question_dict
+
+    @property
+    def correct_letter(self):
+        return OPTION_LETTERS[self.answer]
+
+    def option_text(self, letter):
+        return self.options[LETTER_INDEX[letter]]
+
+
+class Quiz:
+    """
+    A quiz: topic + tuple of Questions
+    - extra: other top level keys (e.g. "bank_ids") - kept by reference, None if there were none
+    """
+
+    __slots__ = ("topic", "questions", "extra")
+
+    def __init__(self, topic, questions, extra=None):
+        self.topic = topic
+        self.questions = questions
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, quiz_data):
+        extra = {key: value for key, value in quiz_data.items() if key not in ("topic", "questions")} or None
+        topic = quiz_data.get("topic")
+        return cls(sys.intern(topic) if isinstance(topic, str) else topic,
+                   tuple(Question.from_dict(question_dict) for question_dict in quiz_data["questions"]), extra)
+
+    def to_dict(self):
+        quiz_data = {"topic": self.topic, "questions": [question.to_dict() for question in self.questions]}
+        if self.extra is not None:
+            quiz_data.update(self.extra)
+        return quiz_data
+
+    def __len__(self):
+        return len(self.questions)
+
+    def get(self, key, default=None):
+        """ extra top level field, e.g. quiz.get("bank_ids", []) """
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+
+    def correct_letters(self):
+        return [question.correct_letter for question in self.questions]
+
+
+class QuizResult:
+    """
+    A graded attempt - references its Quiz, stores one answer byte per question
+    - score() / details() give the same dicts as quiz_grader.calculate_score / get_detailed_results
+    - rows() yields (number, question, user letter, is_correct) for drawing without building dicts
+    """
+
+    __slots__ = ("quiz", "answers")
+
+    def __init__(self, quiz, answers):
+        self.quiz = quiz
+        self.answers = answers
+
+    @classmethod
+    def grade(cls, quiz, user_answers):
+        """ from a list of answer letters ("A"-"D", anything else counts as unanswered) in question order """
+        if len(user_answers) != len(quiz.questions):
+            raise ValueError(f"Expected {len(quiz.questions)} answers, got {len(user_answers)}")
+        return cls(quiz, bytes(LETTER_INDEX.get(letter, NO_ANSWER) for letter in user_answers))
+
+    @classmethod
+    def from_dict(cls, quiz, results):
+        """ from a get_detailed_results list for this quiz """
+        return cls.grade(quiz, [result["user_answer"] for result in results])
+
+    def user_letters(self):
+        return [OPTION_LETTERS[answer] if answer != NO_ANSWER else None for answer in self.answers]
+
+    @property
+    def correct_count(self):
+        return sum(1 for question, answer in zip(self.quiz.questions, self.answers) if question.answer == answer)
+
+    def score(self):
+        return calculate_score(self.user_letters(), self.quiz.correct_letters())
+
+    def details(self):
+        return get_detailed_results([question.to_dict() for question in self.quiz.questions], self.user_letters())
+
+    def to_dict(self):
+        return {"score": self.score(), "results": self.details()}
+
+    def rows(self):
+        for idx, (question, answer) in enumerate(zip(self.quiz.questions, self.answers), 1):
+            yield idx, question, OPTION_LETTERS[answer] if answer != NO_ANSWER else None, question.answer == answer
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    import json
+    import tracemalloc
+
+    def make_quiz(num_questions):
+        return {"topic": "Photosynthesis", "bank_ids": list(range(num_questions)), "questions": [{
+            "question": f"Which statement about step {idx} of the light dependent reactions of photosynthesis is correct?",
+            "options": {letter: f"Option {letter}: a plausible sounding statement about step {idx} and its products" for letter in OPTION_LETTERS},
+            "correct_answer": OPTION_LETTERS[idx % 4],
+            "explanation": f"Step {idx} happens in the thylakoid membrane, which is why this option is the right one."
+        } for idx in range(num_questions)]}
+
+    quiz_dict = make_quiz(5)
+    assert Quiz.from_dict(quiz_dict).to_dict() == quiz_dict
+    letters = ["A", "C", "C", "D", "A"]
+    result = QuizResult.grade(Quiz.from_dict(quiz_dict), letters)
+    assert result.score() == calculate_score(letters, [q["correct_answer"] for q in quiz_dict["questions"]])
+    assert result.details() == get_detailed_results(quiz_dict["questions"], letters)
+    print("Round trip, score and details match the dict functions.")
+
+    # per-session memory: every session gets its own decoded copy (like QuizCache.get) of the same quiz
+    for num_questions in (5, 50):
+        payload = json.dumps(make_quiz(num_questions))
+        letters = [OPTION_LETTERS[idx % 3] for idx in range(num_questions)]
+        for layout in ("dicts", "model"):
+            tracemalloc.start()
+            sessions = []
+            for _ in range(1000):
+                quiz_data = json.loads(payload)
+                if layout == "dicts":
+                    # quiz + user_answers + score + results side by side, as session state held them
+                    questions = quiz_data["questions"]
+                    sessions.append((quiz_data, {idx: letter for idx, letter in enumerate(letters, 1)},
+                                     calculate_score(letters, [q["correct_answer"] for q in questions]),
+                                     get_detailed_results(questions, letters)))
+                else:
+                    sessions.append(QuizResult.grade(Quiz.from_dict(quiz_data), letters))
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{num_questions:>3} questions, {layout}: {current / 1000 / 1024:.1f} KiB per session")
+            del sessions
@@ -0,0 +1,193 @@
+"""
+Quiz Parser Module
+- Handles turning raw model text into quiz data (code fence cleanup, incremental parsing of streamed JSON).
+
+Tiandra M Taylor
+"""
+
+# imports
+import json
+
+OPTION_LETTERS = ["A", "B", "C", "D"]
+
+
+# functions
+def strip_code_fences(response_text):
+    """
+    remove markdown code blocks if any - just in case
+    """
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]  # Remove ```json
+    if response_text.startswith("```"):
+        response_text = response_text[3:]  # Remove ```
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]  # Remove trailing ```
+    return response_text.strip()
+
+
+class QuestionStreamParser:
+    """
+    Incremental parser for a streamed quiz response
+    - feed() it text chunks as they arrive, it returns every question that is now complete
+    - the questions are the elements of the first array in the response, e.g. {"questions": [ {...}, {...} ]}
+    - anything before the opening brace (like ```json) is skipped
+    - each character is only scanned once, so feeding the whole response chunk by chunk is O(n)
+    - skip_invalid=True drops elements that aren't valid JSON instead of raising (used for salvaging)
+    """
+
+    def __init__(self, skip_invalid=False):
+        self.skip_invalid = skip_invalid
+        self.skipped = 0          # malformed elements dropped (skip_invalid only)
+        self._buffer = ""
+        self._pos = 0             # next character to scan
+        self._depth = 0           # current {} / [] nesting depth
+        self._array_depth = None  # depth inside the questions array once it has opened
+        self._element_start = None
+        self._in_string = False
+        self._escaped = False
+        self.done = False         # True once the questions array has closed
+        self.count = 0            # questions parsed so far
+
+    def feed(self, chunk):
+        """
+        add text to the buffer
+        Needs to return:
+            list of question objects (dicts, or lists in the compact format) completed by this chunk
+        """
+        completed = []
+        if self.done:
+            return completed
+
+        self._buffer += chunk
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0 and char not in "{[":
+                pass # still in front of the JSON (code fence, whitespace...)
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "[":
+                    self._array_depth = 1 # response is just the array
+                elif self._array_depth is None and self._depth == 1 and char == "[":
+                    self._array_depth = 2 # first array inside the top level object
+                elif self._array_depth is not None and self._depth == self._array_depth:
+                    self._element_start = pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._array_depth is not None and self._depth == self._array_depth and self._element_start is not None:
+                    try:
+                        completed.append(json.loads(buffer[self._element_start:pos + 1]))
+                        self.count += 1
+                    except json.JSONDecodeError:
+                        if self.skip_invalid == False:
+                            raise
+                        self.skipped += 1
+                    self._element_start = None
+                elif self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self.done = True # questions array closed - nothing else to collect
+                    pos += 1
+                    break
+            pos += 1
+
+        # drop text that can't be part of a future question so the buffer doesn't grow forever
+        keep_from = self._element_start if self._element_start is not None else pos
+        self._buffer = buffer[keep_from:]
+        self._pos = pos - keep_from
+        if self._element_start is not None:
+            self._element_start = 0
+        return completed
+
+
+def salvage_questions(response_text):
+    """
+    get every usable question out of a response, even when the JSON as a whole is broken
+    - valid JSON: the questions list as is
+    - truncated / malformed JSON: every question object that is complete and parses on its own,
+      anything cut off at the end or malformed in the middle is dropped
+    Needs to return:
+        list of question objects (can be empty)
+    """
+    try:
+        data = json.loads(response_text)
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            for value in data.values():
+                if isinstance(value, list):
+                    return value
+        return []
+    except json.JSONDecodeError:
+        pass
+
+    parser = QuestionStreamParser(skip_invalid=True)
+    return parser.feed(response_text)
+
+def decode_compact_question(item):
+    """
+    expand one question from the compact wire format into the normal question dict
+    - compact: ["Question text", "Option A", "Option B", "Option C", "Option D", answer index 0-3, "explanation" (optional)]
+    - normal: {"question": ..., "options": {"A": ..., ...}, "correct_answer": "A", "explanation": ...}
+    - dicts (normal format) and anything malformed come back unchanged - validate_question rejects the bad ones
+    - text fields are str()'d - the model sends numeric options ("What is 2 + 2?" -> [3, 4, 5, 6]) as bare numbers
+    """
+    if not isinstance(item, list) or len(item) not in (6, 7):
+        return item
+
+    answer = item[5]
+    if isinstance(answer, int) and not isinstance(answer, bool) and 0 <= answer < len(OPTION_LETTERS):
+        answer = OPTION_LETTERS[answer]
+
+    question_dict = {
+        "question": str(item[0]),
+        "options": {letter: str(option) for letter, option in zip(OPTION_LETTERS, item[1:5])},
+        "correct_answer": answer
+    }
+    if len(item) == 7 and item[6] is not None:
+        question_dict["explanation"] = str(item[6])
+    return question_dict
+
+
+def encode_compact_question(question_dict):
+    """
+    opposite of decode_compact_question - normal question dict to the compact list
+    """
+    item = [question_dict["question"]]
+    item.extend(question_dict["options"][letter] for letter in OPTION_LETTERS)
+    item.append(OPTION_LETTERS.index(question_dict["correct_answer"]))
+    if "explanation" in question_dict:
+        item.append(question_dict["explanation"])
+    return item
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    fake_response = '```json\n{"questions": [{"question": "What is {2 + 2}?", "options": {"A": "3", "B": "4", "C": "5", "D": "6"}, "correct_answer": "B"}, {"question": "Say \\"hi\\"", "options": {"A": "hi", "B": "yo", "C": "hey", "D": "sup"}, "correct_answer": "A"}]}\n```'
+
+    parser = QuestionStreamParser()
+    for start in range(0, len(fake_response), 7): # feed it in small chunks like a stream would
+        for question in parser.feed(fake_response[start:start + 7]):
+            print(f"Question {parser.count} complete: {question['question']}")
+    print(f"Done: {parser.done}, total questions: {parser.count}")
+    print(f"Stripped: {strip_code_fences(fake_response)[:40]}...")
+
+    # cut off half way through the second question - the first one can still be used
+    truncated = strip_code_fences(fake_response)[:150]
+    print(f"Salvaged from truncated response: {len(salvage_questions(truncated))} question(s)")
+
+    # compact format round trip
+    first_question = salvage_questions(strip_code_fences(fake_response))[0]
+    compact = encode_compact_question(first_question)
+    print(f"Compact: {json.dumps(compact)}")
+    print(f"Round trip matches: {decode_compact_question(compact) == first_question}")
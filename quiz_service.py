@@ -0,0 +1,297 @@
+"""
+Quiz Service Module
+- Headless HTTP (ASGI) entry point for integrations like an LMS - no Streamlit needed.
+- Runs on one event loop with the async Anthropic client, so one process can handle
+  hundreds of quiz generations at the same time.
+
+Run with:
+    uvicorn quiz_service:app --port 8000
+
+Endpoints (JSON in, JSON out):
+    GET  /health
+    POST /generate  {"topic": "...", "include_explanations": true, "num_questions": 5, "exclude_ids": [bank ids already seen],
+                     "exclude_snapshot_ids": [snapshot ids already seen]}
+    POST /grade     {"quiz": {...}, "user_answers": ["A", "C", ...]}
+    POST /explain   {"question": "...", "correct_answer": "B", "correct_option_text": "..."}
+    GET  /stats?topic=Photosynthesis   (item statistics from graded submissions)
+    GET  /metrics   (Prometheus text - needs QUIZ_METRICS=prometheus)
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import json
+import asyncio
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+
+from quiz_generator import generate_quiz_async, generate_explanation_async, validate_question, NUM_QUESTIONS
+from quiz_grader import validate_inputs, calculate_score, get_detailed_results
+from quiz_cache import QuizCache
+from topic_normalizer import TopicNormalizer
+from client_provider import aclose_clients
+from singleflight import SingleFlight
+from results_store import ResultsStore
+from question_bank import QuestionBank
+from hedging import Hedger
+from metrics import METRICS, configure_from_env
+from concurrency_limiter import get_api_limiter
+from quiz_snapshot import open_snapshot
+
+MAX_BODY_BYTES = 1024 * 1024 # requests are small JSON documents
+MAX_QUESTIONS = 100 # longest quiz /generate will build
+
+# load api key from .env file
+load_dotenv()
+API_KEY = os.getenv("ANTHROPIC_API_KEY")
+
+QUIZ_CACHE = QuizCache(
+    max_entries=int(os.getenv("QUIZ_CACHE_MAX_ENTRIES", "256")),
+    ttl_seconds=int(os.getenv("QUIZ_CACHE_TTL_SECONDS", "3600")),
+    db_path=os.getenv("QUIZ_CACHE_DB", "quiz_cache.db"),
+    variants=int(os.getenv("QUIZ_CACHE_VARIANTS", "3"))
+)
+RESULTS_STORE = ResultsStore(os.getenv("QUIZ_RESULTS_DB", "results.db"))
+QUESTION_BANK = QuestionBank(os.getenv("QUIZ_BANK_DB", "question_bank.db"))
+SNAPSHOT = open_snapshot(os.getenv("QUIZ_SNAPSHOT")) # memory-mapped pre-built quizzes - None if not set
+TOPIC_NORMALIZER = None # optional typo matching for requested topics (QUIZ_TOPIC_THRESHOLD, e.g. 0.7)
+if os.getenv("QUIZ_TOPIC_THRESHOLD"):
+    TOPIC_NORMALIZER = TopicNormalizer(threshold=float(os.getenv("QUIZ_TOPIC_THRESHOLD")))
+    if SNAPSHOT is not None:
+        TOPIC_NORMALIZER.seed(SNAPSHOT.topics())
+    TOPIC_NORMALIZER.seed(QUESTION_BANK.topics())
+PROMETHEUS = configure_from_env() # QUIZ_METRICS=prometheus,jsonl - spans / counters are no-ops without it
+COALESCER = SingleFlight() # identical topics requested at the same time share one generation
+HEDGER = None # optional hedged requests for slow calls (QUIZ_HEDGE=1)
+if os.getenv("QUIZ_HEDGE", "0") == "1":
+    HEDGER = Hedger(
+        percentile=float(os.getenv("QUIZ_HEDGE_PERCENTILE", "0.95")),
+        max_in_flight=int(os.getenv("QUIZ_HEDGE_MAX_IN_FLIGHT", "2")),
+        hedge_model=os.getenv("QUIZ_HEDGE_MODEL") or None
+    )
+
+
+class RequestError(Exception):
+    """ bad request from the client - turned into a 4xx JSON response """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# functions
+def require_fields(payload, *fields):
+    """ make sure every field is in the request body """
+    if not isinstance(payload, dict):
+        raise RequestError(400, "Request body must be a JSON object")
+    for field in fields:
+        if field not in payload:
+            raise RequestError(400, f"Missing '{field}' field")
+
+
+async def handle_health(payload, query):
+    health = {"status": "ok", "cache": QUIZ_CACHE.stats(), "coalescing": COALESCER.stats(), "bank": QUESTION_BANK.stats()}
+    if TOPIC_NORMALIZER is not None:
+        health["topics"] = TOPIC_NORMALIZER.stats()
+    if HEDGER is not None:
+        health["hedging"] = HEDGER.stats()
+    if SNAPSHOT is not None:
+        health["snapshot"] = SNAPSHOT.stats()
+    if get_api_limiter() is not None:
+        health["limiter"] = get_api_limiter().stats() # current limit, calls in flight, queue depth per priority
+    return 200, health
+
+
+async def handle_generate(payload, query):
+    require_fields(payload, "topic")
+    topic = payload["topic"]
+    if not isinstance(topic, str) or topic.strip() == "":
+        raise RequestError(400, "'topic' must be a non-empty string")
+    exclude_ids = payload.get("exclude_ids", [])
+    if not isinstance(exclude_ids, list):
+        raise RequestError(400, "'exclude_ids' must be a list")
+    exclude_snapshot_ids = payload.get("exclude_snapshot_ids", [])
+    if not isinstance(exclude_snapshot_ids, list):
+        raise RequestError(400, "'exclude_snapshot_ids' must be a list")
+    include_explanations = bool(payload.get("include_explanations", False))
+    num_questions = payload.get("num_questions", NUM_QUESTIONS)
+    if not isinstance(num_questions, int) or isinstance(num_questions, bool) or not 1 <= num_questions <= MAX_QUESTIONS:
+        raise RequestError(400, f"'num_questions' must be a whole number from 1 to {MAX_QUESTIONS}")
+    if TOPIC_NORMALIZER is not None:
+        topic = TOPIC_NORMALIZER.match_topic(topic) # a typo of a known topic becomes that topic
+
+    # served from the question bank when it has enough questions the caller hasn't seen
+    quiz = await asyncio.to_thread(QUESTION_BANK.assemble_quiz, topic, num_questions, exclude_ids=exclude_ids,
+                                   require_explanations=include_explanations)
+    if quiz != None:
+        return 200, quiz
+
+    # then a pre-built quiz from the snapshot - decoded straight from the mapped file, no API call
+    if SNAPSHOT is not None:
+        quiz = SNAPSHOT.pick(topic, num_questions, exclude_ids=set(exclude_snapshot_ids))
+        if quiz != None and (include_explanations == False or all("explanation" in question_dict for question_dict in quiz["questions"])):
+            quiz["bank_ids"] = await asyncio.to_thread(QUESTION_BANK.add_quiz, quiz)
+            return 200, quiz
+
+    quiz = await generate_quiz_async(
+        topic,
+        API_KEY,
+        cache=QUIZ_CACHE,
+        coalescer=COALESCER,
+        hedger=HEDGER,
+        include_explanations=include_explanations,
+        num_questions=num_questions
+    )
+    if quiz == None:
+        return 502, {"error": "Failed to generate quiz. Please try again."}
+    quiz["bank_ids"] = await asyncio.to_thread(QUESTION_BANK.add_quiz, quiz)
+    return 200, quiz
+
+
+async def handle_grade(payload, query):
+    require_fields(payload, "quiz", "user_answers")
+    quiz = payload["quiz"]
+    user_answers = payload["user_answers"]
+
+    if not isinstance(quiz, dict) or not isinstance(user_answers, list):
+        raise RequestError(400, "'quiz' must be an object and 'user_answers' a list")
+    is_valid, error_msg, questions_list = validate_inputs(quiz, user_answers)
+    if is_valid == False:
+        raise RequestError(400, error_msg)
+    for idx, question_dict in enumerate(questions_list, 1):
+        is_valid, error_msg = validate_question(question_dict, idx)
+        if is_valid == False:
+            raise RequestError(400, error_msg)
+
+    correct_answers_list = [q["correct_answer"] for q in questions_list]
+    with METRICS.span("quiz_grade", source="service"):
+        score = calculate_score(user_answers, correct_answers_list)
+        details = get_detailed_results(questions_list, user_answers)
+    RESULTS_STORE.record(quiz, details, score) # queued - never waits on disk
+    return 200, {"score": score, "results": details}
+
+
+async def handle_stats(payload, query):
+    topic = query.get("topic", [None])[0]
+    if topic is None or topic.strip() == "":
+        raise RequestError(400, "Missing 'topic' query parameter")
+    # aggregate reads are small, but still keep disk access off the event loop
+    return 200, {
+        "summary": await asyncio.to_thread(RESULTS_STORE.topic_summary, topic),
+        "score_distribution": await asyncio.to_thread(RESULTS_STORE.score_distribution, topic),
+        "questions": await asyncio.to_thread(RESULTS_STORE.question_stats, topic)
+    }
+
+
+async def handle_explain(payload, query):
+    require_fields(payload, "question", "correct_answer", "correct_option_text")
+    explanation = await generate_explanation_async(
+        payload["question"],
+        payload["correct_answer"],
+        payload["correct_option_text"],
+        API_KEY
+    )
+    if explanation == None:
+        return 502, {"error": "Failed to generate explanation."}
+    return 200, {"explanation": explanation}
+
+
+async def handle_metrics(payload, query):
+    if PROMETHEUS is None:
+        raise RequestError(404, "Metrics are off - set QUIZ_METRICS=prometheus")
+    return 200, PROMETHEUS.render() # plain text, not JSON
+
+
+# (method, path) -> handler(payload, query) - payload is the JSON body (POST), query the parsed query string
+ROUTES = {
+    ("GET", "/health"): handle_health,
+    ("POST", "/generate"): handle_generate,
+    ("POST", "/grade"): handle_grade,
+    ("POST", "/explain"): handle_explain,
+    ("GET", "/stats"): handle_stats,
+    ("GET", "/metrics"): handle_metrics,
+}
+
+
+async def read_body(receive):
+    """ read the whole request body (it can arrive in several chunks) """
+    body = b""
+    while True:
+        event = await receive()
+        body += event.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise RequestError(413, "Request body too large")
+        if not event.get("more_body", False):
+            return body
+
+
+async def send_json(send, status, data):
+    """ JSON response - a str body (the /metrics text) is sent as text/plain as is """
+    if isinstance(data, str):
+        body, content_type = data.encode("utf-8"), b"text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(data).encode("utf-8"), b"application/json"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive, send):
+    """ startup / shutdown events from the server - close pooled clients on shutdown """
+    while True:
+        event = await receive()
+        if event["type"] == "lifespan.startup":
+            if API_KEY == None or API_KEY.strip() == "":
+                await send({"type": "lifespan.startup.failed", "message": "ANTHROPIC_API_KEY is not set"})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif event["type"] == "lifespan.shutdown":
+            await aclose_clients()
+            QUIZ_CACHE.close()
+            RESULTS_STORE.close()
+            QUESTION_BANK.close()
+            if SNAPSHOT is not None:
+                SNAPSHOT.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ ASGI application """
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        known_path = any(path == scope["path"] for _, path in ROUTES)
+        if known_path:
+            await send_json(send, 405, {"error": "Method not allowed"})
+        else:
+            await send_json(send, 404, {"error": "Not found"})
+        return
+
+    try:
+        payload = None
+        if scope["method"] == "POST":
+            body = await read_body(receive)
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                raise RequestError(400, "Request body is not valid JSON")
+        query = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+        status, data = await handler(payload, query)
+    except RequestError as req_err:
+        status, data = req_err.status, {"error": req_err.message}
+    except Exception as e:
+        print(f" Error handling {scope['path']}: {type(e)}, {e}")
+        status, data = 500, {"error": "Internal server error"}
+
+    await send_json(send, status, data)
@@ -0,0 +1,334 @@
+"""
+Quiz Snapshot Module
+- Handles a read-only, memory-mapped file of pre-built, validated quizzes (e.g. bulk_generate.py output),
+  so a server process can serve them right after startup without regenerating or re-parsing anything.
+- The file is offset-indexed: a quiz table gives every quiz's byte range, and an open-addressing hash
+  index maps a topic key straight to its run of quizzes. Opening one only reads the 64 byte header -
+  the rest is paged in by the OS as it's touched, and the pages are shared by every process that maps it.
+- Quizzes are stored as compact JSON and only decoded when one is picked, into the usual quiz dict.
+- Topic keys are canonical_form(topic) on write and on lookup - a pure function of the topic, so a file
+  written by one process is found by the same keys in every other.
+
+File layout (little endian):
+    header      magic, version, quiz / topic / bucket counts, offsets of the tables below
+    records     one compact JSON quiz after another, in the order they were written
+    quiz table  per quiz: record offset (u64), record length (u32), question count (u32) - grouped by topic
+    topic table per topic: name offset (u64), name length (u32), first quiz (u32), quiz count (u32), pad
+    names       topic keys (topic_normalizer.canonical_form), utf-8
+    buckets     per bucket: topic hash (u64, 0 = empty), topic index (u32), pad - power of two, <= half full
+
+Use:
+    python quiz_snapshot.py quizzes.jsonl quizzes.qsnap      # build from a JSONL file of quizzes
+    snapshot = QuizSnapshot("quizzes.qsnap")
+    quiz = snapshot.pick("Photosynthesis", 5, exclude_ids=seen)
+
+Tiandra M Taylor
+"""
+
+# imports
+import os
+import mmap
+import json
+import struct
+import random
+import hashlib
+import threading
+
+from topic_normalizer import canonical_form
+
+MAGIC = b"QUIZSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQQQ")   # magic, version, topic count, quiz count, bucket count, then table offsets
+QUIZ_ENTRY = struct.Struct("<QII")      # record offset, record length, question count
+TOPIC_ENTRY = struct.Struct("<QIIII")   # name offset, name length, first quiz, quiz count, pad
+BUCKET = struct.Struct("<QII")          # topic hash, topic index, pad
+
+
+# functions
+def topic_hash(topic_key):
+    """ 64 bit hash of a topic key, the same in every process - never 0 (0 marks an empty bucket) """
+    value = int.from_bytes(hashlib.blake2b(topic_key.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1
+
+
+def write_snapshot(quizzes, path):
+    """
+    write quizzes to a snapshot file
+    - quizzes: any iterable of quiz dicts ({"topic", "questions"}) - streamed, only their offsets stay in memory
+    - quizzes that fail validate_quiz are skipped, keys like "bank_ids" are dropped
+    - written to path + ".tmp" then renamed, so processes never map a half written file
+    Needs to return:
+        number of quizzes written
+    """
+    from quiz_generator import validate_quiz # only the writer needs it (and the anthropic import behind it)
+
+    topic_entries = {} # topic key -> list of (offset, length, question count)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as snapshot_file:
+        snapshot_file.write(b"\0" * HEADER.size) # real header once the tables are written
+        for quiz_data in quizzes:
+            if not isinstance(quiz_data, dict) or "topic" not in quiz_data:
+                continue
+            is_valid, _ = validate_quiz(quiz_data, num_questions=None)
+            if is_valid == False:
+                continue
+            record = json.dumps({"topic": quiz_data["topic"], "questions": quiz_data["questions"]},
+                                separators=(",", ":")).encode("utf-8")
+            topic_entries.setdefault(canonical_form(quiz_data["topic"]), []).append(
+                (snapshot_file.tell(), len(record), len(quiz_data["questions"])))
+            snapshot_file.write(record)
+
+        # quiz table - each topic's quizzes side by side, so a topic is one contiguous run
+        align(snapshot_file)
+        quiz_table_offset = snapshot_file.tell()
+        topic_runs = []
+        quiz_count = 0
+        for topic_key, entries in topic_entries.items():
+            topic_runs.append((topic_key, quiz_count, len(entries)))
+            for entry in entries:
+                snapshot_file.write(QUIZ_ENTRY.pack(*entry))
+            quiz_count += len(entries)
+
+        # topic table + names
+        names = []
+        name_spans = []
+        names_length = 0
+        for topic_key, _, _ in topic_runs:
+            encoded = topic_key.encode("utf-8")
+            name_spans.append((names_length, len(encoded)))
+            names.append(encoded)
+            names_length += len(encoded)
+        topic_table_offset = snapshot_file.tell()
+        names_offset = topic_table_offset + TOPIC_ENTRY.size * len(topic_runs)
+        for (name_offset, name_length), (_, first_quiz, count) in zip(name_spans, topic_runs):
+            snapshot_file.write(TOPIC_ENTRY.pack(names_offset + name_offset, name_length, first_quiz, count, 0))
+        snapshot_file.write(b"".join(names))
+
+        # hash index - linear probing, at most half full so a lookup is one or two buckets
+        bucket_count = 1
+        while bucket_count < len(topic_runs) * 2:
+            bucket_count *= 2
+        buckets = [(0, 0)] * bucket_count
+        for topic_index, (topic_key, _, _) in enumerate(topic_runs):
+            hashed = topic_hash(topic_key)
+            slot = hashed & (bucket_count - 1)
+            while buckets[slot][0] != 0:
+                slot = (slot + 1) & (bucket_count - 1)
+            buckets[slot] = (hashed, topic_index)
+        align(snapshot_file)
+        buckets_offset = snapshot_file.tell()
+        for hashed, topic_index in buckets:
+            snapshot_file.write(BUCKET.pack(hashed, topic_index, 0))
+
+        snapshot_file.seek(0)
+        snapshot_file.write(HEADER.pack(MAGIC, VERSION, len(topic_runs), quiz_count, bucket_count,
+                                        HEADER.size, quiz_table_offset, topic_table_offset, buckets_offset))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(tmp_path, path)
+    return quiz_count
+
+
+def align(snapshot_file, size=8):
+    """ pad the file to a multiple of size - keeps the tables 8 byte aligned """
+    padding = -snapshot_file.tell() % size
+    if padding:
+        snapshot_file.write(b"\0" * padding)
+
+
+def read_jsonl(path):
+    """ quiz dicts from a JSONL file (bulk_generate.py output), one at a time - bad lines are skipped """
+    with open(path, encoding="utf-8") as jsonl_file:
+        for line in jsonl_file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def open_snapshot(path):
+    """
+    open a snapshot if the path is set and the file exists
+    Needs to return:
+        QuizSnapshot, or None (no path, missing file or not a snapshot file)
+    """
+    if path == None or path.strip() == "" or os.path.exists(path) == False:
+        return None
+    try:
+        return QuizSnapshot(path)
+    except (OSError, ValueError) as e:
+        print(f" Could not open quiz snapshot {path}: {e}")
+        return None
+
+
+class QuizSnapshot:
+    """
+    Read-only view of a snapshot file
+    - opening it maps the file and reads the header, nothing else
+    - count(topic), quiz_ids(topic), get(quiz_id), pick(topic, num_questions, exclude_ids), topics()
+    - quizzes come back as new dicts every time (callers can change them), with "snapshot_id" set
+    - safe to share between threads, and cheap to open once per worker process
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as snapshot_file:
+            if os.fstat(snapshot_file.fileno()).st_size < HEADER.size:
+                raise ValueError("File is too small to be a quiz snapshot")
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self._topic_count, self._quiz_count, self._bucket_count,
+         _, self._quiz_table, self._topic_table, self._buckets) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError("Not a quiz snapshot file")
+        if version != VERSION:
+            self._map.close()
+            raise ValueError(f"Unsupported quiz snapshot version {version}")
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._counters = {"served": 0, "misses": 0}
+
+    def __len__(self):
+        return self._quiz_count
+
+    def count(self, topic):
+        """ quizzes stored for this topic """
+        return len(self.quiz_ids(topic))
+
+    def quiz_ids(self, topic):
+        """ ids of this topic's quizzes (a range - nothing is read but one bucket and one topic entry) """
+        topic_index = self._find_topic(canonical_form(topic))
+        if topic_index is None:
+            return range(0)
+        _, _, first_quiz, count, _ = TOPIC_ENTRY.unpack_from(self._map, self._topic_table + topic_index * TOPIC_ENTRY.size)
+        return range(first_quiz, first_quiz + count)
+
+    def question_count(self, quiz_id):
+        """ questions in one quiz - from the quiz table, without decoding the quiz """
+        return QUIZ_ENTRY.unpack_from(self._map, self._quiz_table + quiz_id * QUIZ_ENTRY.size)[2]
+
+    def get(self, quiz_id):
+        """ decode one quiz - a fresh dict with "snapshot_id" set """
+        if not 0 <= quiz_id < self._quiz_count:
+            raise IndexError(f"No quiz {quiz_id} in the snapshot")
+        offset, length, _ = QUIZ_ENTRY.unpack_from(self._map, self._quiz_table + quiz_id * QUIZ_ENTRY.size)
+        quiz_data = json.loads(self._map[offset:offset + length])
+        quiz_data["snapshot_id"] = quiz_id
+        return quiz_data
+
+    def pick(self, topic, num_questions=5, exclude_ids=None):
+        """
+        a random quiz for the topic with exactly num_questions questions, skipping exclude_ids
+        (e.g. snapshot ids this user already got)
+        Needs to return:
+            quiz dict (with "snapshot_id"), or None if there isn't one left
+        """
+        quiz_ids = self.quiz_ids(topic)
+        exclude_ids = exclude_ids or ()
+        if len(quiz_ids) > 0:
+            with self._lock:
+                start = self._random.randrange(len(quiz_ids))
+            # walk the topic's run from a random point - only the quiz table is read until one fits
+            for step in range(len(quiz_ids)):
+                quiz_id = quiz_ids[(start + step) % len(quiz_ids)]
+                if quiz_id not in exclude_ids and self.question_count(quiz_id) == num_questions:
+                    with self._lock:
+                        self._counters["served"] += 1
+                    quiz_data = self.get(quiz_id)
+                    quiz_data["topic"] = topic # the caller's wording, like QuestionBank.assemble_quiz
+                    return quiz_data
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def topics(self):
+        """ every topic key in the snapshot (e.g. to seed a TopicNormalizer) """
+        topic_keys = []
+        for topic_index in range(self._topic_count):
+            name_offset, name_length, _, _, _ = TOPIC_ENTRY.unpack_from(self._map, self._topic_table + topic_index * TOPIC_ENTRY.size)
+            topic_keys.append(self._map[name_offset:name_offset + name_length].decode("utf-8"))
+        return topic_keys
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, quizzes=self._quiz_count, topics=self._topic_count,
+                        file_bytes=len(self._map))
+
+    def close(self):
+        self._map.close()
+
+    # helpers
+    def _find_topic(self, topic_key):
+        if self._bucket_count == 0:
+            return None
+        hashed = topic_hash(topic_key)
+        encoded = topic_key.encode("utf-8")
+        slot = hashed & (self._bucket_count - 1)
+        for _ in range(self._bucket_count):
+            bucket_hash, topic_index, _ = BUCKET.unpack_from(self._map, self._buckets + slot * BUCKET.size)
+            if bucket_hash == 0:
+                return None
+            if bucket_hash == hashed:
+                name_offset, name_length, _, _, _ = TOPIC_ENTRY.unpack_from(self._map, self._topic_table + topic_index * TOPIC_ENTRY.size)
+                if self._map[name_offset:name_offset + name_length] == encoded: # hashes can collide, names can't
+                    return topic_index
+            slot = (slot + 1) & (self._bucket_count - 1)
+        return None
+
+
+# run from the command line
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+
+    if len(sys.argv) == 3:
+        # build a snapshot from a JSONL file of quizzes
+        start = time.perf_counter()
+        written = write_snapshot(read_jsonl(sys.argv[1]), sys.argv[2])
+        print(f"Wrote {written} quizzes to {sys.argv[2]} in {time.perf_counter() - start:.1f}s")
+        sys.exit(0)
+
+    # test code - 200k quizzes over 20k topics, then time open / lookup / pick against parsing the JSONL
+    def make_quiz(topic_idx, quiz_idx):
+        return {"topic": f"Topic {topic_idx}", "questions": [{
+            "question": f"Question {idx} of quiz {quiz_idx} about topic {topic_idx}?",
+            "options": {letter: f"Option {letter} for question {idx}" for letter in "ABCD"},
+            "correct_answer": "ABCD"[idx % 4],
+            "explanation": "Because it follows from the definition."
+        } for idx in range(5)]}
+
+    folder = tempfile.mkdtemp()
+    jsonl_path = os.path.join(folder, "quizzes.jsonl")
+    snapshot_path = os.path.join(folder, "quizzes.qsnap")
+    with open(jsonl_path, "w", encoding="utf-8") as jsonl_file:
+        for quiz_idx in range(200000):
+            jsonl_file.write(json.dumps(make_quiz(quiz_idx % 20000, quiz_idx)) + "\n")
+
+    start = time.perf_counter()
+    written = write_snapshot(read_jsonl(jsonl_path), snapshot_path)
+    print(f"Wrote {written} quizzes ({os.path.getsize(snapshot_path) / 1024 / 1024:.0f} MiB) in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    by_topic = {}
+    for quiz_data in read_jsonl(jsonl_path):
+        by_topic.setdefault(canonical_form(quiz_data["topic"]), []).append(quiz_data)
+    print(f"Startup, parsing the JSONL: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    start = time.perf_counter()
+    snapshot = QuizSnapshot(snapshot_path)
+    print(f"Startup, opening the snapshot: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    assert snapshot.count("topic 7") == 10 and snapshot.count("no such topic") == 0
+    quiz = snapshot.pick("Topic 7", 5)
+    topic_7 = by_topic[canonical_form("Topic 7")]
+    assert quiz["questions"] == topic_7[[q["questions"] for q in topic_7].index(quiz["questions"])]["questions"]
+    seen = set(snapshot.quiz_ids("topic 7"))
+    assert snapshot.pick("topic 7", 5, exclude_ids=seen) is None and snapshot.pick("topic 7", 8) is None
+
+    start = time.perf_counter()
+    for idx in range(10000):
+        snapshot.pick(f"topic {idx % 20000}", 5)
+    print(f"Pick (lookup + decode one quiz): {(time.perf_counter() - start) / 10000 * 1e6:.0f} µs average")
+    print(f"Stats: {snapshot.stats()}")
+    snapshot.close()
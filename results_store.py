@@ -0,0 +1,340 @@
+"""
+Results Store Module
+- Handles saving graded submissions and keeping running item statistics for difficulty analytics.
+- SQLite in WAL mode with a write-behind queue: record() only puts the result on a queue,
+  a background thread writes batches, so the UI thread never waits on disk.
+- Aggregates (attempts, percent correct, distractor counts, score distribution per topic) are
+  updated incrementally with each batch - reading them never rescans the submission history.
+
+Tiandra M Taylor
+"""
+
+# imports
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import threading
+
+from quiz_cache import normalize_topic
+
+OPTION_LETTERS = ["A", "B", "C", "D"]
+
+
+# functions
+def question_id(question_text, options, correct_answer):
+    """
+    stable id for a question - same text, options and answer = same stats row
+    """
+    raw = json.dumps([question_text, [options.get(letter) for letter in OPTION_LETTERS], correct_answer])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResultsStore:
+    """
+    Persistent results + incrementally maintained item statistics
+    - record() is non blocking - if the queue is full the result is dropped and counted (stats()["dropped"])
+    - the writer thread commits a batch every batch_size results or flush_interval seconds, whichever first
+    - each batch is pre-aggregated in memory, so a batch of N submissions is one UPSERT per distinct question
+    - a batch that fails to write is logged and dropped - the writer keeps going, flush() never hangs on it
+    - after close(), record() drops (and counts) results and flush() returns straight away
+    """
+
+    def __init__(self, db_path="results.db", batch_size=200, flush_interval=1.0, max_queue=100000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._counters = {"recorded": 0, "written": 0, "dropped": 0, "batches": 0}
+        self._counter_lock = threading.Lock()
+        self._close_lock = threading.Lock() # close() vs flush() / record() putting items on the queue
+        self._closed = False
+
+        self._create_tables()
+        self._writer = threading.Thread(target=self._write_loop, name="results-store-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, quiz_data, results, score):
+        """
+        queue one graded submission (quiz dict, get_detailed_results list, calculate_score dict)
+        """
+        submission = {
+            "topic": normalize_topic(quiz_data.get("topic", "")),
+            "correct_count": score["correct_count"],
+            "total_questions": score["total_questions"],
+            "answers": [
+                (question_id(result["question_text"], result["options"], result["correct_answer"]),
+                 result["question_text"], result["correct_answer"], result["user_answer"], result["is_correct"])
+                for result in results
+            ],
+            "created_at": time.time()
+        }
+        with self._close_lock:
+            if self._closed:
+                self._count("dropped")
+                return
+            try:
+                self._queue.put_nowait(submission)
+                self._count("recorded")
+            except queue.Full:
+                self._count("dropped")
+
+    def flush(self, timeout=None):
+        """
+        block until everything recorded so far has been written (tests / shutdown)
+        Needs to return:
+            True once written, False on timeout or when the store is closed (nothing left to wait for)
+        """
+        done = threading.Event()
+        with self._close_lock:
+            if self._closed or self._writer.is_alive() == False:
+                return False
+            self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """ write what's left and stop the writer thread - safe to call more than once """
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None) # after everything already queued, so that gets written first
+        self._writer.join()
+
+    def stats(self):
+        """ recorded / written / dropped counters + current queue depth """
+        with self._counter_lock:
+            stats = dict(self._counters)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    # query API - reads the aggregate tables only
+    def question_stats(self, topic=None):
+        """
+        per question aggregates, hardest first
+        Needs to return:
+            list of dicts - question_id, topic, question_text, correct_answer, attempts, percent_correct, option_counts
+        """
+        query = "SELECT question_id, topic, question_text, correct_answer, attempts, correct, count_a, count_b, count_c, count_d FROM question_stats"
+        params = []
+        if topic is not None:
+            query += " WHERE topic = ?"
+            params.append(normalize_topic(topic))
+        query += " ORDER BY CAST(correct AS REAL) / attempts"
+        with self._reader() as db:
+            rows = db.execute(query, params).fetchall()
+        stats = []
+        for row in rows:
+            stats.append({
+                "question_id": row[0],
+                "topic": row[1],
+                "question_text": row[2],
+                "correct_answer": row[3],
+                "attempts": row[4],
+                "percent_correct": 100.0 * row[5] / row[4] if row[4] else 0.0,
+                "option_counts": dict(zip(OPTION_LETTERS, row[6:10]))
+            })
+        return stats
+
+    def score_distribution(self, topic):
+        """
+        number of submissions per score for a topic
+        Needs to return:
+            dict {"total_questions": n, "counts": {correct_count: submissions}}  (one entry per quiz length seen)
+        """
+        with self._reader() as db:
+            rows = db.execute(
+                "SELECT total_questions, correct_count, submissions FROM score_distribution WHERE topic = ? ORDER BY total_questions, correct_count",
+                (normalize_topic(topic),)
+            ).fetchall()
+        distribution = {}
+        for total_questions, correct_count, submissions in rows:
+            distribution.setdefault(total_questions, {})[correct_count] = submissions
+        return distribution
+
+    def topic_summary(self, topic):
+        """ submissions and average score for a topic """
+        with self._reader() as db:
+            row = db.execute(
+                "SELECT SUM(submissions), SUM(submissions * correct_count * 1.0 / total_questions) FROM score_distribution WHERE topic = ?",
+                (normalize_topic(topic),)
+            ).fetchone()
+        submissions = row[0] or 0
+        mean = 100.0 * row[1] / submissions if submissions else 0.0
+        return {"topic": normalize_topic(topic), "submissions": submissions, "mean_score_percentage": mean}
+
+    # helpers
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL") # readers don't block the writer and vice versa
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _reader(self):
+        # short lived connection per query - sqlite connections can't be shared across threads
+        return _ClosingConnection(self._connect())
+
+    def _create_tables(self):
+        db = self._connect()
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS submissions (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                correct_count INTEGER NOT NULL,
+                total_questions INTEGER NOT NULL,
+                answers_json TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS question_stats (
+                question_id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                question_text TEXT NOT NULL,
+                correct_answer TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                count_a INTEGER NOT NULL DEFAULT 0,
+                count_b INTEGER NOT NULL DEFAULT 0,
+                count_c INTEGER NOT NULL DEFAULT 0,
+                count_d INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_question_stats_topic ON question_stats (topic);
+            CREATE TABLE IF NOT EXISTS score_distribution (
+                topic TEXT NOT NULL,
+                total_questions INTEGER NOT NULL,
+                correct_count INTEGER NOT NULL,
+                submissions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (topic, total_questions, correct_count)
+            );
+            """
+        )
+        db.commit()
+        db.close()
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    def _write_loop(self):
+        db = self._connect()
+        batch = []
+        waiters = []
+        deadline = None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = "timeout"
+
+            if item is None:
+                running = False
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item != "timeout":
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            # write when the batch is full, the interval is up, someone is waiting on flush(), or shutting down
+            if len(batch) >= self.batch_size or item == "timeout" or len(waiters) > 0 or running == False:
+                if len(batch) > 0:
+                    try:
+                        self._write_batch(db, batch)
+                    except Exception as err: # any failure loses this batch only - the thread has to keep running
+                        self._count("dropped", len(batch))
+                        print(f" Results store write failed ({len(batch)} results lost): {type(err).__name__}: {err}")
+                batch = []
+                deadline = None
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+        db.close()
+
+    def _write_batch(self, db, batch):
+        # collapse the batch in memory first - one row update per question, not per answer
+        question_rows = {}   # question_id -> [topic, text, answer, attempts, correct, a, b, c, d]
+        score_rows = {}      # (topic, total, correct) -> submissions
+        submission_rows = []
+        for submission in batch:
+            topic = submission["topic"]
+            submission_rows.append((topic, submission["correct_count"], submission["total_questions"],
+                                    json.dumps([answer[3] for answer in submission["answers"]]), submission["created_at"]))
+            score_key = (topic, submission["total_questions"], submission["correct_count"])
+            score_rows[score_key] = score_rows.get(score_key, 0) + 1
+            for qid, text, correct_answer, user_answer, is_correct in submission["answers"]:
+                row = question_rows.get(qid)
+                if row is None:
+                    row = question_rows[qid] = [topic, text, correct_answer, 0, 0, 0, 0, 0, 0]
+                row[3] += 1
+                row[4] += 1 if is_correct else 0
+                if user_answer in OPTION_LETTERS:
+                    row[5 + OPTION_LETTERS.index(user_answer)] += 1
+
+        with db: # one transaction per batch
+            db.executemany(
+                "INSERT INTO submissions (topic, correct_count, total_questions, answers_json, created_at) VALUES (?, ?, ?, ?, ?)",
+                submission_rows
+            )
+            db.executemany(
+                """INSERT INTO question_stats (question_id, topic, question_text, correct_answer, attempts, correct, count_a, count_b, count_c, count_d)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(question_id) DO UPDATE SET
+                       attempts = attempts + excluded.attempts,
+                       correct = correct + excluded.correct,
+                       count_a = count_a + excluded.count_a,
+                       count_b = count_b + excluded.count_b,
+                       count_c = count_c + excluded.count_c,
+                       count_d = count_d + excluded.count_d""",
+                [(qid, *row) for qid, row in question_rows.items()]
+            )
+            db.executemany(
+                """INSERT INTO score_distribution (topic, total_questions, correct_count, submissions) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(topic, total_questions, correct_count) DO UPDATE SET submissions = submissions + excluded.submissions""",
+                [(*key, submissions) for key, submissions in score_rows.items()]
+            )
+        self._count("written", len(batch))
+        self._count("batches")
+
+
+class _ClosingConnection:
+    """ `with` helper that closes the sqlite connection afterwards (sqlite3's own `with` only commits) """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, *exc_info):
+        self.db.close()
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    import os
+    import tempfile
+    from quiz_grader import calculate_score, get_detailed_results
+
+    fake_quiz = {
+        "topic": "Test Topic",
+        "questions": [
+            {"question": "What is 2 + 2?", "options": {"A": "3", "B": "4", "C": "5", "D": "6"}, "correct_answer": "B"},
+            {"question": "What color is the sky?", "options": {"A": "Blue", "B": "Green", "C": "Red", "D": "Yellow"}, "correct_answer": "A"}
+        ]
+    }
+    store = ResultsStore(os.path.join(tempfile.mkdtemp(), "results.db"))
+    for user_answers in (["B", "A"], ["C", "A"], ["B", "D"], ["A", "A"]):
+        details = get_detailed_results(fake_quiz["questions"], user_answers)
+        score = calculate_score(user_answers, [q["correct_answer"] for q in fake_quiz["questions"]])
+        store.record(fake_quiz, details, score)
+    store.flush()
+
+    for stat in store.question_stats("test topic"):
+        print(f"{stat['question_text']}: {stat['percent_correct']:.0f}% correct, picks {stat['option_counts']}")
+    print(f"Score distribution: {store.score_distribution('Test Topic')}")
+    print(f"Summary: {store.topic_summary('Test Topic')}, store: {store.stats()}")
+    store.close()
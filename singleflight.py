@@ -0,0 +1,161 @@
+"""
+Single Flight Module
+- Handles coalescing of identical in-flight requests: when 30 students ask for the same
+  topic at the same moment, only one generation runs and everyone shares its result (or its failure).
+- Works for threads (Streamlit sessions) and asyncio callers, and they can share the same flight.
+
+Tiandra M Taylor
+"""
+
+# imports
+import asyncio
+import copy
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+
+class SingleFlight:
+    """
+    Request coalescer keyed by anything hashable (e.g. the quiz cache key)
+    - the first caller for a key is the leader and does the work, callers that arrive
+      while it is running wait and get a copy of the leader's result
+    - the leader keeps the object it made, the future holds a separate copy that nobody gets directly -
+      so the leader changing its result (e.g. setting quiz["bank_ids"]) can't race with a follower copying it
+    - a concurrent.futures.Future is shared between them, so thread callers block on it and
+      async callers await it without blocking the event loop
+    - stats() reports how many calls ran and how many were coalesced
+    """
+
+    def __init__(self, copy_result=True):
+        self.copy_result = copy_result # followers get a deep copy so nobody mutates a shared quiz
+        self._lock = threading.Lock()
+        self._flights = {} # key -> Future
+        self._counters = {"executions": 0, "coalesced": 0, "failures": 0}
+
+    def lead_or_join(self, key):
+        """
+        low level entry point (used when the work isn't a single call, e.g. streaming)
+        Needs to return:
+            tuple (is_leader: bool, future) - the leader must call finish() exactly once
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return False, future
+            future = Future()
+            self._flights[key] = future
+            self._counters["executions"] += 1
+            return True, future
+
+    def finish(self, key, future, result=None, error=None):
+        """
+        leader reports its result (or exception) - wakes every waiting follower
+        - the result is copied first, the leader's own object is never handed out
+        """
+        if error is None:
+            result = self._share(result)
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+            if error is not None:
+                self._counters["failures"] += 1
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass # already cancelled / done - the leader still returns its own result
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        run fn(*args, **kwargs) once for all threads asking for the same key at the same time
+        """
+        is_leader, future = self.lead_or_join(key)
+        if is_leader == False:
+            return self._share(future.result())
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        """
+        async version of do() - await coro_fn(*args, **kwargs) once per key
+        """
+        is_leader, future = self.lead_or_join(key)
+        if is_leader == False:
+            # shield: a cancelled follower (timeout, client gone) only drops its own wrapper - the shared
+            # future stays alive for the leader and every other follower
+            return self._share(await asyncio.shield(asyncio.wrap_future(future)))
+
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result=result)
+        return result
+
+    def wait(self, future, timeout=None):
+        """ follower side of lead_or_join() for threads """
+        return self._share(future.result(timeout))
+
+    def stats(self):
+        """ executions / coalesced / failures counters + flights running right now """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._flights)
+            return stats
+
+    def _share(self, result):
+        if self.copy_result:
+            return copy.deepcopy(result)
+        return result
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    import time
+
+    flight = SingleFlight()
+
+    def slow_generate(topic):
+        time.sleep(0.2) # pretend this is the API call
+        return {"topic": topic, "questions": []}
+
+    threads = [threading.Thread(target=flight.do, args=("photosynthesis", slow_generate, "Photosynthesis")) for _ in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"30 threads: {flight.stats()}")
+
+    async def slow_generate_async(topic):
+        await asyncio.sleep(0.2)
+        return {"topic": topic, "questions": []}
+
+    async def main():
+        await asyncio.gather(*[flight.do_async("rome", slow_generate_async, "Ancient Rome") for _ in range(30)])
+
+    asyncio.run(main())
+    print(f"+30 async callers: {flight.stats()}")
+
+    # a follower that gives up (wait_for timeout) mustn't cancel the flight for the leader or other followers
+    async def cancelled_follower():
+        leader = asyncio.ensure_future(flight.do_async("cells", slow_generate_async, "Cells"))
+        await asyncio.sleep(0)
+        impatient = asyncio.wait_for(flight.do_async("cells", slow_generate_async, "Cells"), 0.05)
+        patient = flight.do_async("cells", slow_generate_async, "Cells")
+        return await asyncio.gather(leader, impatient, patient, return_exceptions=True)
+
+    leader_result, impatient_result, patient_result = asyncio.run(cancelled_follower())
+    assert isinstance(impatient_result, asyncio.TimeoutError), impatient_result
+    assert leader_result == patient_result == {"topic": "Cells", "questions": []}, (leader_result, patient_result)
+    print(f"Cancelled follower: leader and the other follower still got the quiz - {flight.stats()}")
@@ -0,0 +1,286 @@
+"""
+Topic Normalizer Module
+- Handles turning the many ways people type a topic ("Photosynthesis", "photosynthesis ",
+  "Photosynthesis basics", "photosynthesis!") into one canonical key, so the quiz cache and
+  the question bank actually get reused.
+- Exact step (canonical_form - what quiz_cache.normalize_topic uses): fold case/accents/punctuation,
+  drop filler words, strip plurals, sort the words. A pure function of the topic - the same key in
+  every process, whatever was seen before - and canonical_form(canonical_form(t)) == canonical_form(t).
+- Fuzzy step (opt-in, TopicNormalizer): character trigram index over the topics seen so far, so a typo
+  of a known topic ("photosynthsis") is answered with that topic's spelling. Only used at the app /
+  service boundary, before any key is made - keys themselves never depend on it.
+
+Tiandra M Taylor
+"""
+
+# imports
+import re
+import math
+import bisect
+import threading
+import unicodedata
+
+# words that don't change what the quiz is about
+FILLER_WORDS = {
+    "a", "an", "the", "of", "and", "in", "on", "to", "for", "about", "quiz", "basic", "basics",
+    "intro", "introduction", "introductory", "overview", "fundamentals", "101", "beginner", "beginners"
+}
+NO_STRIP_ENDINGS = ("ss", "is", "us", "ics") # "class", "photosynthesis", "virus", "physics"
+ROMAN_NUMERAL = re.compile(r"^m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$")
+SHORT_TOKEN = 3 # words this short ("uk", "us", "c++") must match exactly in a fuzzy match
+
+
+# functions
+def fold_topic(topic):
+    """
+    lowercase, strip accents, punctuation -> spaces, collapse whitespace
+    - "+" and "#" are kept, so "C++" and "C#" stay apart
+    """
+    text = unicodedata.normalize("NFKD", str(topic))
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join(re.sub(r"[^\w\s+#]", " ", text).split())
+
+
+def stem_word(word):
+    """
+    plurals only ("romes" -> "rome", "boxes" -> "box", "cities" -> "city") - -ing / -ed / -ation change
+    what a topic means too often ("speed", "programming") to strip
+    - repeated until nothing changes, so a stemmed word stems to itself
+    """
+    while True:
+        stemmed = strip_plural(word)
+        if stemmed == word:
+            return word
+        word = stemmed
+
+
+def strip_plural(word):
+    if len(word) <= 4 or not word.isalpha() or word.endswith(NO_STRIP_ENDINGS) or not word.endswith("s"):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("es") and word[:-2].endswith(("s", "x", "z", "ch", "sh")):
+        return word[:-2]
+    return word[:-1]
+
+
+def canonical_form(topic):
+    """
+    exact canonical key - folded, filler words dropped, stemmed, words sorted
+    - falls back to the folded text if the topic was only filler words (e.g. "Basics")
+    """
+    folded = fold_topic(topic)
+    words = [stem_word(word) for word in folded.split() if word not in FILLER_WORDS]
+    if len(words) == 0:
+        return folded
+    return " ".join(sorted(set(words)))
+
+
+def trigrams(text):
+    """ character trigrams, padded so short topics still get a few """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def is_typo_variant(form, other):
+    """
+    could two canonical forms be the same topic with a typo? - the guard behind every fuzzy match
+    - same number of words; numbers, roman numerals and short words identical ("World War II" / "World War I",
+      "Henry VII" / "Henry VIII", "UK history" / "US history" never match)
+    - every other word pairs up with one that starts with the same 2 letters and is at most 1 edit away
+      (2 for words of 8+ letters) - "macroeconomics" / "microeconomics", "inorganic" / "organic" never match
+    """
+    words = form.split()
+    other_words = other.split()
+    if len(words) != len(other_words):
+        return False
+    exact = sorted(word for word in words if _must_match(word))
+    if exact != sorted(word for word in other_words if _must_match(word)):
+        return False
+    remaining = [word for word in other_words if not _must_match(word)]
+    for word in words:
+        if _must_match(word):
+            continue
+        allowed = 2 if len(word) >= 8 else 1
+        partner = next((candidate for candidate in remaining
+                        if candidate[:2] == word[:2] and edit_distance(word, candidate, allowed) <= allowed), None)
+        if partner is None:
+            return False
+        remaining.remove(partner)
+    return True
+
+
+def edit_distance(word, other, limit):
+    """ Levenshtein distance, stopping early once it's known to be over limit (then returns limit + 1) """
+    if abs(len(word) - len(other)) > limit:
+        return limit + 1
+    previous = list(range(len(other) + 1))
+    for i, char in enumerate(word, 1):
+        current = [i]
+        for j, other_char in enumerate(other, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other_char)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class TopicNormalizer:
+    """
+    Typo-tolerant matching against topics seen before - opt-in, for the app / service boundary
+    - match_topic(topic) -> the spelling to use from here on: the topic itself, unless it is a typo of a
+      known topic (trigram Jaccard >= threshold and is_typo_variant), then that topic's spelling
+    - resolve(topic) -> (key, confidence)
+        confidence 1.0 for an exact canonical match or a brand new topic,
+        otherwise the trigram Jaccard similarity of the fuzzy match
+    - keys are never changed by it: canonical_form(match_topic(t)) is always a key canonical_form gives
+    - thread safe, lookups only touch the trigrams of the query (inverted index)
+    """
+
+    def __init__(self, threshold=0.7, max_topics=100000):
+        self.threshold = threshold
+        self.max_topics = max_topics
+        self._lock = threading.Lock()
+        self._keys = {}            # canonical form -> canonical key (its own or a fuzzy match's)
+        self._spellings = {}       # canonical key -> a topic spelling that gives that key
+        self._topics = []          # topic id -> (canonical form, trigram count, numbers)
+        self._index = {}           # trigram -> sorted list of topic ids
+        self._counters = {"exact": 0, "fuzzy": 0, "new": 0}
+
+    def resolve(self, topic, register=True):
+        """
+        canonical key for a topic
+        Needs to return:
+            tuple (key, confidence)
+        """
+        form = canonical_form(topic)
+        with self._lock:
+            key = self._keys.get(form)
+            if key is not None:
+                self._counters["exact"] += 1
+                return key, 1.0
+
+            match, similarity = self._best_match(form)
+            if match is not None:
+                self._counters["fuzzy"] += 1
+                if register and len(self._keys) < 2 * self.max_topics:
+                    self._keys[form] = match # next time this spelling is an exact hit
+                return match, similarity
+
+            self._counters["new"] += 1
+            if register:
+                self._add(form, topic)
+            return form, 1.0
+
+    def match_topic(self, topic):
+        """
+        the topic spelling to pass on (to the generator, cache, bank ...) - a typo of a known topic comes
+        back as that topic's spelling, anything else unchanged
+        """
+        key, _ = self.resolve(topic)
+        if key == canonical_form(topic):
+            return topic
+        with self._lock:
+            return self._spellings.get(key, key)
+
+    def seed(self, keys):
+        """
+        register known keys (e.g. topics already in the question bank) - added as they are, no fuzzy
+        matching between them, so seeding is one index insert per key
+        """
+        with self._lock:
+            for key in keys:
+                form = canonical_form(key)
+                if form not in self._keys:
+                    self._add(form, key)
+
+    def __len__(self):
+        return len(self._topics)
+
+    def stats(self):
+        """ exact / fuzzy / new counters + number of known topics """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["topics"] = len(self._topics)
+            return stats
+
+    # helpers
+    def _add(self, form, spelling):
+        # caller holds the lock - a full index just stops learning new topics
+        if len(self._keys) < 2 * self.max_topics:
+            self._keys[form] = form
+            self._spellings[form] = spelling
+        if len(self._topics) >= self.max_topics:
+            return
+        topic_id = len(self._topics)
+        grams = trigrams(form)
+        self._topics.append((form, len(grams), _numbers(form)))
+        for gram in grams:
+            self._index.setdefault(gram, []).append(topic_id)
+
+    def _best_match(self, form):
+        # caller holds the lock
+        # prefix filter: a topic with Jaccard >= threshold shares at least ceil(threshold * n) of our
+        # n trigrams, so it must contain one of the (n - that + 1) rarest ones - only those postings are scanned
+        postings = sorted((self._index.get(gram, []) for gram in trigrams(form)), key=len)
+        gram_count = len(postings)
+        prefix_size = gram_count - math.ceil(self.threshold * gram_count) + 1
+        prefix_counts = {}
+        for posting in postings[:prefix_size]:
+            for topic_id in posting:
+                prefix_counts[topic_id] = prefix_counts.get(topic_id, 0) + 1
+
+        numbers = _numbers(form)
+        # size filter: Jaccard >= t needs t * n <= m <= n / t
+        min_grams = self.threshold * gram_count
+        max_grams = gram_count / self.threshold if self.threshold > 0 else math.inf
+        best_id = None
+        best_similarity = 0.0
+        for topic_id, overlap in prefix_counts.items():
+            _, topic_gram_count, topic_numbers = self._topics[topic_id]
+            if topic_numbers != numbers or topic_gram_count < min_grams or topic_gram_count > max_grams:
+                continue
+            # overlap filter: even matching every remaining trigram can't reach the threshold
+            needed = self.threshold / (1 + self.threshold) * (gram_count + topic_gram_count)
+            if overlap + gram_count - prefix_size < needed:
+                continue
+            # postings are sorted by id, so membership is a binary search
+            for posting in postings[prefix_size:]:
+                position = bisect.bisect_left(posting, topic_id)
+                if position < len(posting) and posting[position] == topic_id:
+                    overlap += 1
+            similarity = overlap / (gram_count + topic_gram_count - overlap)
+            if similarity >= self.threshold and is_typo_variant(form, self._topics[topic_id][0]) == False:
+                continue
+            # ties go to the smaller key, not to whichever topic arrived first
+            if similarity > best_similarity or (similarity == best_similarity and best_id is not None
+                                                and self._topics[topic_id][0] < self._topics[best_id][0]):
+                best_id = topic_id
+                best_similarity = similarity
+
+        if best_id is None or best_similarity < self.threshold:
+            return None, best_similarity
+        return self._topics[best_id][0], best_similarity
+
+
+def _numbers(form):
+    return tuple(word for word in form.split() if word.isdigit() or ROMAN_NUMERAL.match(word))
+
+
+def _must_match(word):
+    return len(word) <= SHORT_TOKEN or word.isdigit() or ROMAN_NUMERAL.match(word) is not None or not word.isalpha()
+
+
+# test code - body
+if __name__ == "__main__":
+    # only runs if this file is executed directly
+    normalizer = TopicNormalizer()
+    for topic in ["Photosynthesis", "photosynthesis ", "Photosynthesis basics", "PHOTOSYNTHESIS!", "photosynthsis",
+                  "Ancient Rome", "the history of ancient rome", "ancient romes", "World War 1", "World War 2",
+                  "Python Programming", "programming in python", "World War I", "World War II", "Organic Chemistry",
+                  "Inorganic Chemistry", "Microeconomics", "Macroeconomics", "US history", "UK history",
+                  "Henry VIII", "Henry VII", "C++", "C#", "speed", "Speeds"]:
+        print(f"{topic!r:35} -> {normalizer.resolve(topic)}  match_topic: {normalizer.match_topic(topic)!r}")
+    print(f"Stats: {normalizer.stats()}")
+    for topic in ["speed", "cities", "boxes", "Programming in Python", "glasses"]:
+        assert canonical_form(canonical_form(topic)) == canonical_form(topic), topic